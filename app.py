@@ -28,6 +28,22 @@ app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'dev-secret-key-change-
 from backend.models import db
 db.init_app(app)
 
+# Маршруты проверки ИНН
+from backend.routes.fns_routes import fns_bp
+app.register_blueprint(fns_bp)
+
+# Повторы POST с заголовком Idempotency-Key
+from backend.routes.idempotency import idempotent
+
+# Служебные маршруты - по токену в заголовке X-Api-Token
+from backend.routes.auth import token_required
+
+# Карточки партнёров из кэша; записи сбрасываются после коммита изменений партнёра
+from backend.models import Partner
+from backend.routes.partner_cache import cached_partner_response
+from backend.services.partner_cache import get_partner_cache
+get_partner_cache().track(db.session, Partner)
+
 # ==================== РОТЫ API ====================
 
 @app.route('/')
@@ -63,9 +79,14 @@ def health_check():
         db_status = 'disconnected'
     
     # Проверка API ФНС
+    fns_circuit = None
     try:
-        from backend.services.fns_service import fns_service
-        fns_status = 'available' if fns_service.api_key else 'unavailable'
+        from backend.services.fns_service import get_fns_service
+        fns_service = get_fns_service()
+        fns_status = 'available' if fns_service.available else 'unavailable'
+        fns_circuit = fns_service.circuit_breaker.get_stats()
+        if fns_status == 'available' and fns_circuit['state'] != 'closed':
+            fns_status = 'degraded'
     except:
         fns_status = 'unavailable'
     
@@ -75,12 +96,14 @@ def health_check():
         'components': {
             'database': db_status,
             'fns_api': fns_status,
+            'fns_circuit_breaker': fns_circuit,
             'api_server': 'running'
         }
     })
 
 
 @app.route('/api/v1/partners/register', methods=['POST'])
+@idempotent('partners:register')
 def register_partner():
     """Регистрация нового партнера"""
     try:
@@ -96,16 +119,33 @@ def register_partner():
                     'error': f'Не заполнено обязательное поле: {field}'
                 }), 400
         
-        # Проверка ИНН через API ФНС
-        from backend.services.fns_service import fns_service
-        inn_result = fns_service.check_inn(data['inn'])
+        # Проверка ИНН в фоне: ответ 202 со ссылкой на статус
+        if _registration_async():
+            return _register_partner_async(data)
+        
+        # Проверка ИНН через API ФНС (и резервные источники)
+        from backend.services.company_providers import get_company_verifier
+        inn_result = get_company_verifier().check_inn(data['inn'])
         
         if not inn_result['success']:
-            return jsonify({
+            response = jsonify({
                 'success': False,
                 'error': 'Ошибка верификации ИНН',
                 'details': inn_result.get('error')
-            }), 400
+            })
+            # Временный сбой проверки (таймаут, цепь разомкнута, лимит) - 503:
+            # такой ответ не сохраняется по Idempotency-Key, повтор проверит ИНН заново.
+            # Ключ API не указан или отклонён - 500: повтор клиента не поможет
+            from backend.services.fns_service import is_config_failure, is_temporary_failure
+            if is_temporary_failure(inn_result):
+                response.status_code = 503
+                response.headers['Retry-After'] = str(int(float(os.getenv('REGISTRATION_RETRY_DELAY', 60))))
+            elif is_config_failure(inn_result):
+                logger.error(f"Проверка ИНН не настроена: {inn_result.get('error')}")
+                response.status_code = 500
+            else:
+                response.status_code = 400
+            return response
         
         # Проверяем, не зарегистрирован ли уже этот ИНН
         existing_partner = Partner.query.filter_by(inn=data['inn']).first()
@@ -125,14 +165,15 @@ def register_partner():
             phone=data['phone'],
             email=data['email'],
             verification_data=inn_result.get('data'),
+            verification_date=datetime.utcnow(),
+            verification_method=inn_result.get('provider', 'fns_api'),
             verification_status='pending_documents',
             status='registration_in_progress',
             registration_stage='inn_verified'
         )
         
         # Генерируем код партнера
-        from datetime import datetime
-        partner.partner_code = f"P-{datetime.now().strftime('%y%m%d')}{Partner.query.count() + 1:04d}"
+        partner.partner_code = get_code_allocator().next_code()
         
         db.session.add(partner)
         db.session.commit()
@@ -167,27 +208,155 @@ def register_partner():
         }), 500
 
 
+def _registration_async():
+    """Асинхронная регистрация: REGISTRATION_ASYNC=true или заголовок Prefer: respond-async"""
+    if 'respond-async' in request.headers.get('Prefer', '').lower():
+        return True
+    return os.getenv('REGISTRATION_ASYNC', 'False').lower() == 'true'
+
+
+def _register_partner_async(data):
+    """Сохранение партнёра до проверки ИНН и постановка проверки в очередь"""
+    from sqlalchemy.exc import IntegrityError
+    from backend.models import Partner
+    from backend.services.fns_service import FNSService
+    from backend.services.registration_pipeline import STAGE_FAILED, STAGE_PENDING, VERIFICATION_PENDING
+    
+    # Формат ИНН проверяется сразу, без обращения к API
+    is_valid, error_message = FNSService.validate_inn_format(data['inn'])
+    if not is_valid:
+        return jsonify({
+            'success': False,
+            'error': 'Ошибка верификации ИНН',
+            'details': error_message
+        }), 400
+    
+    # Повторная заявка после неудачной проверки заменяет прежнюю
+    partner = Partner.query.filter_by(inn=data['inn']).first()
+    if partner and partner.registration_stage != STAGE_FAILED:
+        return jsonify({
+            'success': False,
+            'error': 'Компания с таким ИНН уже зарегистрирована',
+            'partner_code': partner.partner_code
+        }), 409
+    if partner is None:
+        partner = Partner(partner_code=get_code_allocator().next_code())
+        db.session.add(partner)
+    
+    partner.company_name = data['company_name']
+    partner.legal_form = data.get('legal_form', 'ООО')
+    partner.inn = data['inn']
+    partner.contact_person = data['contact_person']
+    partner.phone = data['phone']
+    partner.email = data['email']
+    partner.verification_data = None
+    partner.verification_status = VERIFICATION_PENDING
+    partner.status = 'registration_in_progress'
+    partner.registration_stage = STAGE_PENDING
+    
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Одновременная заявка с тем же ИНН или email
+        db.session.rollback()
+        existing = Partner.query.filter_by(inn=data['inn']).first()
+        return jsonify({
+            'success': False,
+            'error': 'Компания с таким ИНН или email уже зарегистрирована',
+            'partner_code': existing.partner_code if existing else None
+        }), 409
+    
+    get_registration_pipeline().submit(partner.id)
+    logger.info(f"Партнер {partner.partner_code} ожидает проверки ИНН")
+    
+    status_url = f"/api/v1/partners/{partner.partner_code}"
+    response = jsonify({
+        'success': True,
+        'partner': partner.to_dict(),
+        'message': 'Заявка принята, ИНН проверяется',
+        'status_url': status_url
+    })
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    response.headers['Retry-After'] = '2'
+    return response
+
+
+@app.route('/api/v1/partners/registration/stats', methods=['GET'])
+def registration_stats():
+    """Очередь и время асинхронной проверки регистраций"""
+    return jsonify(get_registration_pipeline().get_stats())
+
+
+@app.route('/api/v1/partners/import', methods=['POST'])
+@token_required('PARTNERS_IMPORT_TOKEN')
+def import_partners():
+    """
+    Массовый импорт партнёров из CSV или JSONL
+
+    Файл - поле file формы или тело запроса; формат - ?format=csv|jsonl
+    или по расширению файла. ?dry_run=true - только проверка строк.
+    Размер тела - не больше PARTNER_IMPORT_MAX_BYTES.
+    """
+    import io
+    from werkzeug.exceptions import RequestEntityTooLarge
+    from backend.models import Partner
+    from backend.services.partner_import import PartnerImporter, detect_format, iter_rows
+
+    max_bytes = int(os.getenv('PARTNER_IMPORT_MAX_BYTES', 50 * 1024 * 1024))
+    too_large = jsonify({
+        'success': False,
+        'error': f'Файл больше {max_bytes} байт, разбейте его или используйте scripts/import_partners.py'
+    }), 413
+    if request.content_length is not None and request.content_length > max_bytes:
+        return too_large
+    # Тело без Content-Length (chunked) обрывается на этом размере
+    request.max_content_length = max_bytes
+
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    fmt = request.args.get('format') or detect_format(
+        upload.filename if upload else '', request.content_type or ''
+    )
+    dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+
+    try:
+        lines = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        importer = PartnerImporter(db.engine, Partner.__table__, get_code_allocator(), dry_run=dry_run)
+        report = importer.run(iter_rows(lines, fmt))
+    except RequestEntityTooLarge:
+        return too_large
+    except UnicodeDecodeError:
+        return jsonify({
+            'success': False,
+            'error': 'Файл должен быть в кодировке UTF-8'
+        }), 400
+    except Exception as e:
+        logger.error(f"Ошибка импорта партнёров: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Внутренняя ошибка сервера',
+            'details': str(e)
+        }), 500
+
+    max_errors = int(os.getenv('PARTNER_IMPORT_MAX_REPORTED_ERRORS', 1000))
+    return jsonify(dict(report.to_dict(max_errors), success=True))
+
+
 @app.route('/api/v1/partners/<partner_code>', methods=['GET'])
 def get_partner(partner_code):
     """Получение информации о партнере по коду"""
     try:
-        partner = Partner.query.filter_by(partner_code=partner_code).first()
+        # Из кэша с ETag: неизменившийся статус - 304 без запроса к базе
+        response = cached_partner_response(partner_code, _load_partner, _partner_payload)
         
-        if not partner:
+        if response is None:
             return jsonify({
                 'success': False,
                 'error': 'Партнер не найден'
             }), 404
         
-        return jsonify({
-            'success': True,
-            'partner': partner.to_dict(),
-            'registration_progress': {
-                'stage': partner.registration_stage,
-                'status': partner.verification_status,
-                'completed': partner.status == 'active'
-            }
-        })
+        return response
         
     except Exception as e:
         logger.error(f"Ошибка получения партнера {partner_code}: {e}")
@@ -337,6 +506,25 @@ def handle_tilda_webhook():
 
 # ==================== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ====================
 
+def _load_partner(partner_code):
+    return Partner.query.filter_by(partner_code=partner_code).first()
+
+
+def _partner_payload(partner):
+    """Карточка партнёра с ходом регистрации"""
+    return {
+        'success': True,
+        'partner': partner.to_dict(),
+        'registration_progress': {
+            'stage': partner.registration_stage,
+            'status': partner.verification_status,
+            'completed': partner.status == 'active',
+            'error': (partner.verification_data or {}).get('error')
+            if partner.registration_stage == 'inn_verification_failed' else None
+        }
+    }
+
+
 def process_bot_message(user_id, bot_id, message, context):
     """Обработка сообщений от ботов"""
     # Заглушка - будет реализована позже
@@ -350,11 +538,57 @@ def process_bot_message(user_id, bot_id, message, context):
 # Импорт для функции health_check
 from datetime import datetime
 
+_code_allocator = None
+
+
+def get_code_allocator():
+    """Выдача кодов партнёров, создаётся при первой регистрации в процессе"""
+    global _code_allocator
+    if _code_allocator is None:
+        from backend.models import CodeSequence, Partner
+        from backend.services.partner_codes import count_start, create_code_allocator
+        # Нумерация продолжает прежнюю (count + 1); COUNT - только при создании счётчика
+        _code_allocator = create_code_allocator(
+            db.engine, CodeSequence.__table__, start=count_start(db.engine, Partner.__table__)
+        )
+    return _code_allocator
+
+
+_registration_pipeline = None
+
+
+def get_registration_pipeline():
+    """Очередь проверки ИНН асинхронных регистраций"""
+    global _registration_pipeline
+    if _registration_pipeline is None:
+        from backend.models import Partner
+        from backend.services.registration_pipeline import RegistrationPipeline
+        _registration_pipeline = RegistrationPipeline(app, db.session, Partner)
+        app.extensions['registration_pipeline'] = _registration_pipeline
+    return _registration_pipeline
+
+
+@app.before_request
+def _resume_registrations():
+    """Регистрации, проверка которых прервалась рестартом: в каждом процессе после fork"""
+    try:
+        get_registration_pipeline().resume_pending_once()
+    except Exception as e:
+        logger.error(f"Ошибка возобновления проверки регистраций: {e}")
+
 # Создаем таблицы при запуске
 with app.app_context():
     db.create_all()
     logger.info("База данных инициализирована")
 
+# Фоновая перепроверка партнёров по реестру ФНС идёт отдельным процессом
+# (scripts/reverify_partners.py), а не в каждом воркере; здесь - только метрики
+from backend.models import Partner, VerificationLog
+from backend.services.reverification_scheduler import ReverificationScheduler
+app.extensions['reverification_scheduler'] = ReverificationScheduler(
+    db.session, Partner, log_model=VerificationLog
+)
+
 # ==================== ЗАПУСК ПРИЛОЖЕНИЯ ====================
 
 if __name__ == '__main__':
@@ -79,6 +79,15 @@ class Partner(db.Model):
         }
 
 
+class CodeSequence(db.Model):
+    """Счётчики кодов (partner_code), выдаются воркерам блоками"""
+    
+    __tablename__ = 'code_sequences'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False)
+
+
 class VerificationLog(db.Model):
     """Лог верификационных запросов"""
     
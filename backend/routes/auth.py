@@ -0,0 +1,47 @@
+"""
+Доступ к служебным маршрутам по токену в заголовке
+"""
+
+import functools
+import hmac
+import logging
+import os
+
+from flask import jsonify, request
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = 'X-Api-Token'
+
+
+def token_required(env_var: str, header: str = TOKEN_HEADER):
+    """
+    Маршрут доступен только с токеном из переменной окружения env_var
+
+    Токен передаётся в заголовке header, как секрет вебхука Protalk
+    в X-Webhook-Secret. Без настроенного токена маршрут закрыт (503),
+    с неверным токеном - 401.
+
+    Args:
+        env_var: Переменная окружения с токеном
+        header: Заголовок запроса с токеном
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            expected = os.getenv(env_var)
+            if not expected:
+                logger.warning(f"{request.path}: не задан {env_var}, маршрут закрыт")
+                return jsonify({
+                    'success': False,
+                    'error': 'Маршрут не настроен'
+                }), 503
+            if not hmac.compare_digest(request.headers.get(header, '').encode(), expected.encode()):
+                logger.warning(f"{request.path}: неверный токен в {header}")
+                return jsonify({
+                    'success': False,
+                    'error': 'Неверный токен доступа'
+                }), 401
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,140 @@
+"""
+Маршруты проверки ИНН через API ФНС
+"""
+
+import codecs
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+
+from backend.routes.auth import token_required
+from backend.services.company_providers import get_company_verifier
+from backend.services.fns_service import get_fns_service
+
+fns_bp = Blueprint('fns', __name__)
+
+_CELL_SEPARATOR = re.compile(r'[,;\t]')
+_HEADER_CELLS = {'inn', 'инн'}
+
+
+def _iter_inns(lines):
+    """ИНН из строк файла: первая колонка CSV или строка целиком, без заголовка и пустых строк"""
+    for line in lines:
+        cell = _CELL_SEPARATOR.split(line, 1)[0].strip().strip('"')
+        if cell and cell.lower() not in _HEADER_CELLS:
+            yield cell
+
+
+def _iter_stream_lines(stream, close=False):
+    """Строки бинарного потока без чтения его целиком"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='replace')
+    buffer = ''
+    try:
+        for block in iter(lambda: stream.read(64 * 1024), b''):
+            buffer += decoder.decode(block)
+            *lines, buffer = buffer.split('\n')
+            yield from lines
+        buffer += decoder.decode(b'', final=True)
+        if buffer:
+            yield buffer
+    finally:
+        if close:
+            stream.close()
+
+
+def _spool_upload(storage):
+    """
+    Копия загруженного файла
+
+    Flask закрывает файлы запроса, когда обработчик возвращает ответ, то есть
+    до отдачи потокового ответа. Большие файлы копируются на диск.
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    shutil.copyfileobj(storage.stream, spooled)
+    spooled.seek(0)
+    return spooled
+
+
+def _request_inns():
+    """
+    ИНН из запроса
+
+    Поддерживаются JSON (список или {"inns": [...]}), файл в поле file
+    (multipart) и текст/CSV в теле запроса. Файл и тело читаются построчно.
+    """
+    if 'file' in request.files:
+        return _iter_inns(_iter_stream_lines(_spool_upload(request.files['file']), close=True))
+
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('inns')
+        if not isinstance(data, list):
+            return None
+        return (str(inn).strip() for inn in data)
+
+    return _iter_inns(_iter_stream_lines(request.stream))
+
+
+@fns_bp.route('/api/v1/fns/bulk-verify', methods=['POST'])
+@token_required('FNS_BULK_VERIFY_TOKEN')
+def bulk_verify():
+    """
+    Потоковая массовая проверка ИНН
+
+    Ответ в формате NDJSON: по строке на каждый ИНН по мере готовности
+    (сначала ошибки формата и найденные в кэше, затем ответы API), последняя
+    строка - {"summary": {...}}. Сверх оставшегося дневного лимита ИНН
+    в API не отправляются. Размер пачки (chunk_size) ограничен FNS_BULK_MAX_CHUNK.
+    Доступ - с токеном FNS_BULK_VERIFY_TOKEN в заголовке X-Api-Token.
+    """
+    inns = _request_inns()
+    if inns is None:
+        return jsonify({'error': 'Ожидается список ИНН или поле inns'}), 400
+
+    service = get_fns_service()
+    max_chunk = int(os.getenv('FNS_BULK_MAX_CHUNK', 1000))
+    chunk_size = min(max(1, request.args.get('chunk_size', 500, type=int)), max_chunk)
+
+    def generate():
+        started_at = time.perf_counter()
+        summary = {'total': 0, 'successful': 0, 'cached': 0, 'skipped_by_limit': 0}
+
+        for result in service.batch_check_iter(inns, chunk_size=chunk_size):
+            summary['total'] += 1
+            summary['successful'] += result['success']
+            summary['cached'] += result['cached']
+            summary['skipped_by_limit'] += result.get('skipped', False)
+            yield json.dumps(result, ensure_ascii=False) + '\n'
+
+        summary['failed'] = summary['total'] - summary['successful']
+        summary['wall_time_ms'] = round((time.perf_counter() - started_at) * 1000, 2)
+        summary['usage_today'] = service.quota.used_today()
+        summary['daily_limit'] = service.daily_limit
+        yield json.dumps({'summary': summary}, ensure_ascii=False) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+    )
+
+
+@fns_bp.route('/api/v1/fns/reverification/stats', methods=['GET'])
+def reverification_stats():
+    """Метрики фоновой перепроверки партнёров: пропускная способность и очередь"""
+    scheduler = current_app.extensions.get('reverification_scheduler')
+    if scheduler is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(scheduler.get_stats(), enabled=True))
+
+
+@fns_bp.route('/api/v1/fns/providers/stats', methods=['GET'])
+def providers_stats():
+    """Источники проверки ИНН: ответы, p95, хеджирование, лимит и расходы"""
+    return jsonify(get_company_verifier().get_stats())
@@ -0,0 +1,73 @@
+"""
+Заголовок Idempotency-Key для POST-маршрутов
+"""
+
+import functools
+
+from flask import current_app, jsonify, request
+
+from backend.services.idempotency import (
+    IdempotencyConflict, IdempotencyInProgress, StoredResponse, get_idempotency_store, request_fingerprint
+)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Заголовки ответа, которые сохраняются вместе с телом
+_STORED_HEADERS = ('Content-Type', 'Location', 'Retry-After')
+
+
+def idempotent(scope: str, get_store=get_idempotency_store):
+    """
+    Повтор запроса с тем же Idempotency-Key получает сохранённый ответ
+
+    Без заголовка маршрут работает как обычно. Повтор с другим телом
+    запроса - 422, не дождались выполняющегося запроса - 409.
+
+    Args:
+        scope: Пространство ключей маршрута
+        get_store: Хранилище ответов
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({
+                    'success': False,
+                    'error': f'{IDEMPOTENCY_HEADER} длиннее {MAX_KEY_LENGTH} символов'
+                }), 400
+
+            def execute():
+                response = current_app.make_response(view(*args, **kwargs))
+                return StoredResponse(
+                    status=response.status_code,
+                    body=response.get_data(as_text=True),
+                    headers={name: response.headers[name] for name in _STORED_HEADERS if name in response.headers}
+                )
+
+            fingerprint = request_fingerprint(request.method, request.path, request.get_data())
+            try:
+                stored, replayed = get_store().run(f"{scope}:{key}", fingerprint, execute)
+            except IdempotencyConflict:
+                return jsonify({
+                    'success': False,
+                    'error': f'{IDEMPOTENCY_HEADER} уже использован для другого запроса'
+                }), 422
+            except IdempotencyInProgress:
+                response = jsonify({
+                    'success': False,
+                    'error': 'Запрос с этим ключом ещё выполняется, повторите позже'
+                })
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+
+            response = current_app.response_class(stored.body, status=stored.status, headers=stored.headers)
+            if replayed:
+                response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        return wrapper
+    return decorator
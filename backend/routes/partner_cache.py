@@ -0,0 +1,42 @@
+"""
+Ответ с карточкой партнёра из кэша с ETag и If-None-Match
+"""
+
+from typing import Callable, Dict, Optional
+
+from flask import current_app, request
+
+from backend.services.partner_cache import PartnerCache, get_partner_cache, make_etag
+
+
+def cached_partner_response(partner_code: str, load_partner: Callable, to_payload: Callable[[object], Dict],
+                            cache: Optional[PartnerCache] = None):
+    """
+    Карточка партнёра: 200 с ETag или 304, если у клиента та же версия
+
+    При попадании в кэш база не читается.
+
+    Args:
+        partner_code: Код партнёра
+        load_partner: Партнёр по коду из базы (None - не найден)
+        to_payload: Тело ответа для партнёра
+        cache: Кэш карточек (по умолчанию общий)
+
+    Returns:
+        Response или None, если партнёр не найден
+    """
+    def load():
+        partner = load_partner(partner_code)
+        if partner is None:
+            return None
+        return make_etag(partner), current_app.json.dumps(to_payload(partner))
+
+    entry = (cache or get_partner_cache()).get_or_load(partner_code, load)
+    if entry is None:
+        return None
+
+    response = current_app.response_class(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    # Клиент может хранить ответ, но перед использованием сверяет ETag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
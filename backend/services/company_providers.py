@@ -0,0 +1,441 @@
+"""
+Источники данных о компаниях по ИНН и хеджированная проверка
+
+Каждый источник (API ФНС, Контур.Фокус) возвращает результат в формате
+FNSService.check_inn с данными в общем нормализованном виде (см.
+CompanyInfo.from_normalized). HedgedVerifier опрашивает источники по порядку:
+если первый не ответил за своё p95, параллельно запускается следующий,
+и возвращается первый окончательный ответ.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import requests
+
+from backend.services.fns_quota import (
+    PRIORITY_INTERACTIVE, InMemoryQuotaLimiter, QuotaLimiter, RedisQuotaLimiter, validate_priority
+)
+from backend.services.fns_service import (
+    ERROR_CONFIG, ERROR_TEMPORARY, NOT_FOUND_ERROR, CompanyInfo, FNSService, get_fns_service
+)
+from backend.services.fns_transport import RetryPolicy, build_session
+
+logger = logging.getLogger(__name__)
+
+
+class CompanyProvider:
+    """
+    Базовый источник данных о компании
+
+    Ведёт счётчики ответов, задержки успешных сетевых ответов (для p95)
+    и учёт расходов: стоимость запроса * использовано лимита за день.
+    """
+
+    name = ""
+
+    def __init__(self, cost: float = 0.0, quota: Optional[QuotaLimiter] = None, latency_window: int = 200):
+        """
+        Args:
+            cost: Стоимость одного запроса к источнику (руб.)
+            quota: Дневной лимит запросов к источнику (None - без учёта)
+            latency_window: Сколько последних задержек хранить для p95
+        """
+        self.cost = cost
+        self._quota = quota
+        self._latencies = deque(maxlen=latency_window)
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'successful': 0, 'not_found': 0, 'errors': 0, 'hedged': 0, 'wins': 0}
+
+    @property
+    def quota(self) -> Optional[QuotaLimiter]:
+        return self._quota
+
+    @property
+    def available(self) -> bool:
+        """Можно ли обращаться к источнику (настроен ли ключ и т.п.)"""
+        return True
+
+    def has_quota(self, priority: str = PRIORITY_INTERACTIVE) -> bool:
+        return self.quota is None or self.quota.remaining(priority) > 0
+
+    def lookup(self, inn: str, priority: str = PRIORITY_INTERACTIVE) -> Dict:
+        """Результат проверки в формате FNSService.check_inn"""
+        raise NotImplementedError
+
+    def count(self, counter: str):
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+    def record(self, result: Dict, latency: float):
+        """Учёт ответа; задержка запоминается только для ответов из сети"""
+        if result['success']:
+            counter = 'successful'
+        elif result.get('error') == NOT_FOUND_ERROR:
+            counter = 'not_found'
+        else:
+            counter = 'errors'
+        from_network = counter != 'errors' and not result.get('cached') and \
+            (result.get('data') or {}).get('source') != 'egr_index'
+        with self._stats_lock:
+            self.stats['requests'] += 1
+            self.stats[counter] += 1
+            if from_network:
+                self._latencies.append(latency)
+
+    def p95(self, min_samples: int = 20) -> Optional[float]:
+        """p95 задержки ответа (сек); None, пока выборка меньше min_samples"""
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)]
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        p95 = self.p95(min_samples=1)
+        stats.update({
+            'available': self.available,
+            'cost_per_request': self.cost,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None,
+        })
+        if self.quota is not None:
+            used_today = self.quota.used_today()
+            stats.update({
+                'used_today': used_today,
+                'daily_limit': self.quota.daily_limit,
+                'remaining': self.quota.remaining(),
+                'spent_today': round(used_today * self.cost, 2),
+            })
+        return stats
+
+
+class FNSProvider(CompanyProvider):
+    """API ФНС через FNSService: кэш, индекс ЕГР, лимит и circuit breaker сервиса"""
+
+    name = "fns_api"
+
+    def __init__(self, service: Optional[FNSService] = None, cost: Optional[float] = None):
+        super().__init__(cost if cost is not None else float(os.getenv('FNS_API_COST', 0)))
+        self.service = service or get_fns_service()
+
+    @property
+    def quota(self) -> QuotaLimiter:
+        return self.service.quota
+
+    def has_quota(self, priority: str = PRIORITY_INTERACTIVE) -> bool:
+        # Кэш и индекс ЕГР отвечают и без лимита
+        return True
+
+    def lookup(self, inn: str, priority: str = PRIORITY_INTERACTIVE) -> Dict:
+        return self.service.check_inn(inn, priority=priority)
+
+
+def _kontur_address(parsed: Dict) -> str:
+    """Адрес из parsedAddressRF Контур.Фокуса"""
+    parts = [parsed.get("zipCode", "")]
+    for key in ("regionName", "district", "city", "settlement", "street", "house", "bulk", "flat"):
+        value = parsed.get(key) or {}
+        parts.append(" ".join(filter(None, (value.get("topoShortName"), value.get("topoValue")))))
+    return ", ".join(filter(None, parts))
+
+
+def normalize_kontur(item: Dict, inn: str) -> Dict:
+    """Запись req Контур.Фокуса в формате нормализованного ответа ФНС"""
+    normalized = {
+        "inn": inn,
+        "org_type": "Юридическое лицо" if len(inn) == 10 else "Индивидуальный предприниматель",
+        "verification_date": datetime.now().isoformat(),
+        "source": "kontur"
+    }
+
+    status = {}
+    if item.get("UL"):
+        ul = item["UL"]
+        name = ul.get("legalName") or {}
+        status = ul.get("status") or {}
+        heads = ul.get("heads") or [{}]
+        normalized.update({
+            "company_name": (name.get("full") or name.get("short", "")).strip(),
+            "short_name": name.get("short", ""),
+            "ogrn": item.get("ogrn", ""),
+            "ogrn_date": ul.get("registrationDate", ""),
+            "status": status.get("statusString", ""),
+            "address": _kontur_address((ul.get("legalAddress") or {}).get("parsedAddressRF") or {}),
+            "director": heads[0].get("fio", ""),
+        })
+    elif item.get("IP"):
+        ip = item["IP"]
+        status = ip.get("status") or {}
+        normalized.update({
+            "full_name": ip.get("fio", "").strip(),
+            "ogrn_ip": item.get("ogrn", ""),
+            "ogrn_ip_date": ip.get("registrationDate", ""),
+            "status": status.get("statusString", "Действующий"),
+        })
+    else:
+        normalized["raw_data"] = item
+        normalized["is_active"] = False
+        return normalized
+
+    normalized["is_active"] = not (status.get("dissolved") or status.get("dissolving"))
+    return normalized
+
+
+class KonturProvider(CompanyProvider):
+    """Контур.Фокус (метод req)"""
+
+    name = "kontur"
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 cost: Optional[float] = None, daily_limit: Optional[int] = None,
+                 redis_client=None, timeout: Optional[float] = None):
+        daily_limit = daily_limit if daily_limit is not None else int(os.getenv('KONTUR_API_DAILY_LIMIT', 100))
+        if redis_client is not None:
+            quota = RedisQuotaLimiter(redis_client, daily_limit, prefix="kontur:quota")
+        else:
+            quota = InMemoryQuotaLimiter(daily_limit)
+        super().__init__(cost if cost is not None else float(os.getenv('KONTUR_API_COST', 0)), quota)
+
+        self.api_key = api_key if api_key is not None else os.getenv('KONTUR_API_KEY', '')
+        self.base_url = (base_url or os.getenv('KONTUR_API_BASE_URL', 'https://api-focus.kontur.ru/api3')).rstrip('/')
+        self.timeout = timeout or float(os.getenv('KONTUR_API_TIMEOUT', 10))
+        self.session = build_session()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def _error(self, inn: str, error: str, error_type: Optional[str] = ERROR_TEMPORARY) -> Dict:
+        result = {
+            "success": False,
+            "error": error,
+            "inn": inn,
+            "cached": False
+        }
+        if error_type:
+            result["error_type"] = error_type
+        return result
+
+    def lookup(self, inn: str, priority: str = PRIORITY_INTERACTIVE) -> Dict:
+        if not self.available:
+            return self._error(inn, "Контур.Фокус недоступен: не указан ключ API", ERROR_CONFIG)
+
+        decision = self.quota.try_acquire(priority=priority)
+        if not decision.allowed:
+            logger.warning(f"Достигнут дневной лимит Контур.Фокуса: {decision.used}/{self.quota.daily_limit}")
+            return self._error(inn, "Достигнут дневной лимит проверок через Контур.Фокус")
+
+        try:
+            response = self.session.get(
+                f"{self.base_url}/req",
+                params={"inn": inn},
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout
+            )
+        except requests.exceptions.Timeout:
+            logger.error(f"Таймаут Контур.Фокуса для ИНН: {inn}")
+            return self._error(inn, "Таймаут при обращении к Контур.Фокусу")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Ошибка сети Контур.Фокуса для ИНН {inn}: {str(e)}")
+            return self._error(inn, f"Ошибка сети: {str(e)}")
+
+        if response.status_code != 200:
+            logger.error(f"Ошибка Контур.Фокуса: {response.status_code} - {response.text}")
+            if response.status_code in (401, 403):
+                error_type = ERROR_CONFIG
+            elif RetryPolicy.is_retryable(response.status_code):
+                error_type = ERROR_TEMPORARY
+            else:
+                error_type = None
+            return self._error(inn, f"Ошибка Контур.Фокуса: {response.status_code}", error_type)
+
+        try:
+            items = response.json()
+        except ValueError:
+            return self._error(inn, "Некорректный ответ Контур.Фокуса")
+
+        if not items:
+            return self._error(inn, NOT_FOUND_ERROR, None)
+        return {
+            "success": True,
+            "data": normalize_kontur(items[0], inn),
+            "inn": inn,
+            "cached": False
+        }
+
+
+class HedgedVerifier:
+    """
+    Проверка ИНН через несколько источников
+
+    Источники опрашиваются в порядке списка. Если текущий не ответил за
+    своё p95 (пока статистики мало - за HEDGE_DEFAULT_DELAY), параллельно
+    запускается следующий. Окончательный ответ - успех или "не найден";
+    при ошибке источника сразу запрашивается следующий. Запрос, который
+    не успел, не отменяется: его ответ учитывается в статистике источника.
+    """
+
+    def __init__(self, providers: List[CompanyProvider], default_delay: Optional[float] = None,
+                 min_delay: Optional[float] = None, min_samples: int = 20, max_workers: Optional[int] = None):
+        """
+        Args:
+            providers: Источники в порядке предпочтения
+            default_delay: Задержка хеджирования, пока у источника мало замеров (сек)
+            min_delay: Нижняя граница задержки хеджирования (сек)
+            min_samples: Сколько замеров нужно для p95
+            max_workers: Потоков для одновременных запросов к источникам
+        """
+        self.providers = providers
+        self.default_delay = default_delay if default_delay is not None else float(
+            os.getenv('HEDGE_DEFAULT_DELAY', 2.0))
+        self.min_delay = min_delay if min_delay is not None else float(os.getenv('HEDGE_MIN_DELAY', 0.05))
+        self.min_samples = min_samples
+        self.max_workers = max_workers or int(os.getenv('HEDGE_MAX_WORKERS', 16))
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Пул потоков процесса (после fork создаётся заново)"""
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='company-provider')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def hedge_delay(self, provider: CompanyProvider) -> float:
+        """Сколько ждать ответа источника до запуска следующего"""
+        p95 = provider.p95(self.min_samples)
+        return max(self.min_delay, p95 if p95 is not None else self.default_delay)
+
+    def _call(self, provider: CompanyProvider, inn: str, priority: str) -> Dict:
+        started_at = time.perf_counter()
+        try:
+            result = provider.lookup(inn, priority)
+        except Exception as e:
+            logger.error(f"Ошибка источника {provider.name} для ИНН {inn}: {str(e)}")
+            result = {
+                "success": False,
+                "error": f"Внутренняя ошибка: {str(e)}",
+                "inn": inn,
+                "cached": False
+            }
+        provider.record(result, time.perf_counter() - started_at)
+        return result
+
+    @staticmethod
+    def _is_final(result: Dict) -> bool:
+        return result['success'] or result.get('error') == NOT_FOUND_ERROR
+
+    def check_inn(self, inn: str, priority: str = PRIORITY_INTERACTIVE) -> Dict:
+        """
+        Проверка ИНН
+
+        Returns:
+            Dict: Результат в формате FNSService.check_inn с полем provider -
+                имя ответившего источника (для Partner.verification_method)
+        """
+        validate_priority(priority)
+        # Проверка формата не зависит от состояния сервиса
+        is_valid, error_message = FNSService.validate_inn_format(inn)
+        if not is_valid:
+            return {
+                "success": False,
+                "error": error_message,
+                "inn": inn,
+                "cached": False
+            }
+
+        queue = [p for p in self.providers if p.available and p.has_quota(priority)]
+        if not queue:
+            return {
+                "success": False,
+                "error": "Нет доступных источников проверки ИНН",
+                "error_type": ERROR_TEMPORARY,
+                "inn": inn,
+                "cached": False
+            }
+
+        executor = self._get_executor()
+        futures = {}
+        hedge_at = None
+        last_result = None
+
+        def launch(hedged: bool):
+            nonlocal hedge_at
+            provider = queue.pop(0)
+            if hedged:
+                provider.count('hedged')
+                logger.info(f"ИНН {inn}: запущен резервный источник {provider.name}")
+            futures[executor.submit(self._call, provider, inn, priority)] = provider
+            hedge_at = time.monotonic() + self.hedge_delay(provider) if queue else None
+
+        launch(hedged=False)
+        while futures:
+            timeout = max(0.0, hedge_at - time.monotonic()) if hedge_at is not None else None
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                launch(hedged=True)
+                continue
+
+            for future in done:
+                provider = futures.pop(future)
+                result = dict(future.result(), provider=provider.name)
+                if self._is_final(result):
+                    provider.count('wins')
+                    return result
+                last_result = result
+
+            if not futures and queue:
+                launch(hedged=False)
+
+        return last_result
+
+    def check_company(self, inn: str, priority: str = PRIORITY_INTERACTIVE) -> Optional[CompanyInfo]:
+        """Данные компании в общем виде или None"""
+        result = self.check_inn(inn, priority)
+        return CompanyInfo.from_normalized(result['data']) if result['success'] else None
+
+    def get_stats(self) -> Dict:
+        return {
+            provider.name: dict(provider.get_stats(), hedge_delay_ms=round(self.hedge_delay(provider) * 1000, 1))
+            for provider in self.providers
+        }
+
+
+_verifier: Optional[HedgedVerifier] = None
+_verifier_lock = threading.Lock()
+
+
+def get_company_verifier() -> HedgedVerifier:
+    """
+    Общий HedgedVerifier процесса
+
+    Порядок источников - COMPANY_PROVIDERS (по умолчанию "fns_api,kontur");
+    Контур.Фокус без KONTUR_API_KEY пропускается.
+    """
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                service = get_fns_service()
+                factories = {
+                    FNSProvider.name: lambda: FNSProvider(service),
+                    KonturProvider.name: lambda: KonturProvider(redis_client=service.redis_client),
+                }
+                names = [n.strip() for n in os.getenv('COMPANY_PROVIDERS', 'fns_api,kontur').split(',') if n.strip()]
+                unknown = set(names) - set(factories)
+                if unknown:
+                    raise ValueError(f"Неизвестные источники проверки ИНН: {', '.join(sorted(unknown))}")
+                _verifier = HedgedVerifier([factories[name]() for name in names])
+    return _verifier
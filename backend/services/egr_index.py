@@ -0,0 +1,308 @@
+"""
+Локальный индекс ЕГРЮЛ/ЕГРИП из открытых выгрузок ФНС
+
+Выгрузки (XML или CSV) читаются потоком и складываются в SQLite-файл
+с таблицей по ИНН. FNSService смотрит в индекс до платного API.
+Записи хранятся в формате ответа API (НаимЮЛ, ОГРН, ФИО, ...), поэтому
+проходят через ту же нормализацию.
+"""
+
+import csv
+import logging
+import os
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Dict, IO, Iterable, Iterator, Optional, Tuple
+
+from backend.services.fns_codec import decode_value, get_codec
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS companies (
+    inn TEXT PRIMARY KEY,
+    record BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Колонки CSV -> поля ответа API
+CSV_FIELDS = {
+    "company_name": "НаимЮЛ",
+    "short_name": "СокрНаимЮЛ",
+    "ogrn": "ОГРН",
+    "ogrn_date": "ДатаОГРН",
+    "full_name": "ФИО",
+    "ogrn_ip": "ОГРНИП",
+    "ogrn_ip_date": "ДатаОГРНИП",
+    "status": "Статус",
+    "address": "Адрес",
+    "okved": "ОКВЭД",
+    "okved_desc": "ТекстОКВЭД",
+    "director": "Руководитель",
+    "authorized_capital": "УстКап",
+}
+
+
+def _local_name(tag: str) -> str:
+    """Имя элемента без пространства имён"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _find(element, name: str):
+    for child in element.iter():
+        if _local_name(child.tag) == name:
+            return child
+    return None
+
+
+def _attr(element, name: str, attribute: str) -> str:
+    found = _find(element, name)
+    return found.get(attribute, "") if found is not None else ""
+
+
+def _full_name(element) -> str:
+    if element is None:
+        return ""
+    return " ".join(filter(None, (element.get("Фамилия"), element.get("Имя"), element.get("Отчество"))))
+
+
+def _address(element) -> str:
+    """Адрес из вложенных элементов СвАдресЮЛ: индекс, регион, улица, дом"""
+    if element is None:
+        return ""
+    parts, house = [], []
+    for child in element.iter():
+        attrs = child.attrib
+        if "Индекс" in attrs:
+            parts.append(attrs["Индекс"])
+        for kind in ("Регион", "Район", "Город", "НаселПункт", "Улица"):
+            if f"Наим{kind}" in attrs:
+                parts.append(" ".join(filter(None, (attrs.get(f"Тип{kind}"), attrs[f"Наим{kind}"]))))
+        house.extend(attrs[key] for key in ("Дом", "Корпус", "Кварт") if attrs.get(key))
+    return ", ".join(parts + house)
+
+
+def _legal_entity(element) -> Tuple[str, Dict]:
+    """Запись по элементу СвЮЛ"""
+    director = _find(element, "СведДолжнФЛ")
+    record = {
+        "НаимЮЛ": _attr(element, "СвНаимЮЛ", "НаимЮЛПолн"),
+        "СокрНаимЮЛ": _attr(element, "СвНаимЮЛСокр", "НаимСокр"),
+        "ОГРН": element.get("ОГРН", ""),
+        "ДатаОГРН": element.get("ДатаОГРН", ""),
+        "Статус": "Прекращено" if _find(element, "СвПрекрЮЛ") is not None else "Действующее",
+        "Адрес": _address(_find(element, "СвАдресЮЛ")),
+        "ОКВЭД": _attr(element, "СвОКВЭДОсн", "КодОКВЭД"),
+        "ТекстОКВЭД": _attr(element, "СвОКВЭДОсн", "НаимОКВЭД"),
+        "Руководитель": _full_name(_find(director, "СвФЛ")) if director is not None else "",
+        "УстКап": _attr(element, "СвУстКап", "СумКап"),
+    }
+    return element.get("ИНН", ""), record
+
+
+def _entrepreneur(element) -> Tuple[str, Dict]:
+    """Запись по элементу СвИП"""
+    record = {
+        "ФИО": _full_name(_find(element, "ФИОРус")),
+        "ОГРНИП": element.get("ОГРНИП", ""),
+        "ДатаОГРНИП": element.get("ДатаОГРНИП", ""),
+        "Статус": "Прекратил деятельность" if _find(element, "СвПрекрИП") is not None else "Действующий",
+        "ОКВЭД": _attr(element, "СвОКВЭДОсн", "КодОКВЭД"),
+        "ТекстОКВЭД": _attr(element, "СвОКВЭДОсн", "НаимОКВЭД"),
+    }
+    return element.get("ИННФЛ", ""), record
+
+
+_XML_RECORDS = {"СвЮЛ": _legal_entity, "СвИП": _entrepreneur}
+
+
+def iter_xml_records(source) -> Iterator[Tuple[str, Dict]]:
+    """
+    Записи из XML-выгрузки ЕГРЮЛ/ЕГРИП
+
+    Файл читается потоком: каждый СвЮЛ/СвИП разбирается по событию end
+    и сразу удаляется из дерева, поэтому память не растёт с размером файла.
+    """
+    context = ET.iterparse(source, events=("start", "end"))
+    _, root = next(context)
+    for event, element in context:
+        if event != "end":
+            continue
+        parse = _XML_RECORDS.get(_local_name(element.tag))
+        if parse is None:
+            continue
+        inn, record = parse(element)
+        if inn:
+            yield inn, record
+        root.clear()
+
+
+def iter_csv_records(source: IO[str], delimiter: str = ";") -> Iterator[Tuple[str, Dict]]:
+    """
+    Записи из CSV-выгрузки с колонкой inn и колонками из CSV_FIELDS
+
+    Пустые значения не сохраняются.
+    """
+    for row in csv.DictReader(source, delimiter=delimiter):
+        inn = (row.get("inn") or "").strip()
+        if not inn:
+            continue
+        record = {
+            CSV_FIELDS[column]: value.strip()
+            for column, value in row.items()
+            if column in CSV_FIELDS and value and value.strip()
+        }
+        yield inn, record
+
+
+def build_index(path: str, records: Iterable[Tuple[str, Dict]], source: str = "",
+                batch_size: int = 10000, progress=None) -> int:
+    """
+    Построение индекса из потока записей
+
+    Индекс пишется во временный файл и заменяет старый одной операцией
+    rename, поэтому читатели не видят недостроенный индекс.
+
+    Args:
+        path: Путь к файлу индекса
+        records: Пары (ИНН, запись в формате API)
+        source: Описание выгрузки для статистики
+        batch_size: Записей в одной пачке вставки
+        progress: Вызывается после каждой пачки с числом прочитанных записей
+
+    Returns:
+        int: Количество записей в индексе
+    """
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    codec = get_codec()
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(_SCHEMA)
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+
+        batch = []
+        processed = 0
+        for inn, record in records:
+            batch.append((inn, codec.encode(record)))
+            if len(batch) >= batch_size:
+                conn.executemany("INSERT OR REPLACE INTO companies VALUES (?, ?)", batch)
+                processed += len(batch)
+                batch.clear()
+                if progress:
+                    progress(processed)
+        if batch:
+            conn.executemany("INSERT OR REPLACE INTO companies VALUES (?, ?)", batch)
+
+        count = conn.execute("SELECT count(*) FROM companies").fetchone()[0]
+        conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+            ("imported_at", datetime.now().isoformat()),
+            ("source", source),
+            ("records", str(count)),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, path)
+    logger.info(f"Индекс ЕГР построен: {count} записей, {path}")
+    return count
+
+
+class EGRIndex:
+    """
+    Чтение индекса ЕГРЮЛ/ЕГРИП
+
+    У каждого потока своё соединение только для чтения. После замены
+    файла импортёром соединения открываются заново.
+    """
+
+    def __init__(self, path: str, max_age_days: float = 45):
+        self.path = path
+        self.max_age_days = max_age_days
+        self._local = threading.local()
+        self._meta_lock = threading.Lock()
+        self._meta: Dict[str, str] = {}
+        self._meta_mtime = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.mtime != mtime:
+            if conn is not None:
+                conn.close()
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+            self._local.mtime = mtime
+        return conn
+
+    def _load_meta(self) -> Dict[str, str]:
+        conn = self._connection()
+        if conn is None:
+            return {}
+        with self._meta_lock:
+            if self._meta_mtime != self._local.mtime:
+                self._meta = dict(conn.execute("SELECT key, value FROM meta"))
+                self._meta_mtime = self._local.mtime
+            return self._meta
+
+    def imported_at(self) -> Optional[str]:
+        """Время загрузки выгрузки в индекс (ISO, None - индекса нет)"""
+        return self._load_meta().get("imported_at")
+
+    def age_days(self) -> Optional[float]:
+        """Возраст индекса в днях (None - индекса нет)"""
+        imported_at = self.imported_at()
+        if not imported_at:
+            return None
+        return (datetime.now() - datetime.fromisoformat(imported_at)).total_seconds() / 86400
+
+    def is_fresh(self) -> bool:
+        age = self.age_days()
+        return age is not None and age <= self.max_age_days
+
+    def lookup(self, inn: str) -> Optional[Dict]:
+        """Запись в формате ответа API или None"""
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute("SELECT record FROM companies WHERE inn = ?", (inn,)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка чтения индекса ЕГР: {e}")
+            return None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return decode_value(row[0])
+
+    def get_stats(self) -> Dict:
+        meta = self._load_meta()
+        age = self.age_days()
+        return {
+            "enabled": bool(meta),
+            "path": self.path,
+            "records": int(meta.get("records", 0)),
+            "source": meta.get("source", ""),
+            "imported_at": meta.get("imported_at"),
+            "age_days": round(age, 2) if age is not None else None,
+            "fresh": self.is_fresh(),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
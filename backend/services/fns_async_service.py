@@ -0,0 +1,289 @@
+"""
+Асинхронный клиент API ФНС
+Для развёртываний на asyncio: сотни проверок ИНН в одном event loop
+"""
+
+import asyncio
+import functools
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - зависит от окружения
+    aiohttp = None
+
+from backend.services.fns_quota import (
+    PRIORITY_BATCH, PRIORITY_INTERACTIVE, REASON_RATE, QuotaDecision, validate_priority
+)
+from backend.services.fns_service import FNSService, get_fns_service
+
+logger = logging.getLogger(__name__)
+
+# Исход запроса из пакета: отправлен в API или почему пропущен
+DISPATCH_API = 'api'
+DISPATCH_LIMIT = 'limit'
+DISPATCH_CIRCUIT_OPEN = 'circuit_open'
+DISPATCH_UNAVAILABLE = 'unavailable'
+
+
+class AsyncFNSService:
+    """
+    Асинхронный аналог FNSService.check_inn / batch_check
+
+    Валидация, кэш, учёт лимита и нормализация берутся из синхронного
+    сервиса, поэтому контракт ответа и семантика кэша/лимита совпадают.
+    Асинхронным сделан HTTP запрос к API; обращения синхронного сервиса
+    к Redis (кэш, индекс ЕГР, лимит) и разбор ответа выполняются в пуле
+    потоков loop.run_in_executor, чтобы не блокировать event loop.
+    """
+
+    def __init__(self, service: Optional[FNSService] = None, max_concurrency: int = 100):
+        if aiohttp is None:
+            raise ImportError("Для AsyncFNSService требуется пакет aiohttp")
+
+        self.service = service or get_fns_service()
+        self.max_concurrency = max_concurrency
+        self._session: Optional["aiohttp.ClientSession"] = None
+        self._inflight: Dict[str, "asyncio.Future"] = {}
+
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        """Ленивое создание HTTP сессии в текущем event loop"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.service.request_timeout)
+            )
+        return self._session
+
+    async def close(self):
+        """Закрытие HTTP сессии"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @staticmethod
+    async def _run_blocking(fn, *args, **kwargs):
+        """Блокирующий вызов синхронного сервиса в пуле потоков event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+    async def _reserve_quota(self, priority: str = PRIORITY_INTERACTIVE) -> QuotaDecision:
+        """
+        Резервирование запроса в лимите
+
+        Проверка и увеличение счётчика атомарны в лимитере, поэтому
+        конкурентные корутины не могут превысить лимит. При лимите
+        в секунду ожидание идёт без блокировки event loop.
+        """
+        deadline = time.monotonic() + self.service.rate_wait
+        while True:
+            decision = await self._run_blocking(self.service.quota.try_acquire, priority=priority)
+            if decision.allowed or decision.reason != REASON_RATE:
+                return decision
+            wait = min(decision.retry_after, deadline - time.monotonic())
+            if wait <= 0:
+                return decision
+            await asyncio.sleep(wait)
+
+    async def check_inn(self, inn: str, force_refresh: bool = False,
+                        priority: str = PRIORITY_INTERACTIVE) -> Dict:
+        """
+        Проверка ИНН через API ФНС
+
+        Args:
+            inn: ИНН для проверки
+            force_refresh: Игнорировать кэш и сделать новый запрос
+            priority: Класс трафика для учёта лимита
+
+        Returns:
+            Dict: Результат проверки (как у FNSService.check_inn)
+        """
+        validate_priority(priority)
+        is_valid, error_message = self.service.validate_inn_format(inn)
+        if not is_valid:
+            return {
+                "success": False,
+                "error": error_message,
+                "inn": inn,
+                "cached": False
+            }
+
+        if not force_refresh:
+            local_result = await self._run_blocking(self.service._local_result, inn)
+            if local_result:
+                logger.info(f"ИНН {inn} найден в {'кэше' if local_result['cached'] else 'индексе ЕГР'}")
+                return local_result
+
+        return await self._coalesced_request(inn, priority)
+
+    async def _coalesced_request(self, inn: str, priority: str = PRIORITY_INTERACTIVE) -> Dict:
+        """Запрос к API, общий для одновременных проверок одного ИНН"""
+        inflight = self._inflight.get(inn)
+        if inflight is not None:
+            logger.info(f"ИНН {inn}: использован результат одновременного запроса")
+            return dict(await asyncio.shield(inflight))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[inn] = future
+        try:
+            if not self.service.available:
+                result = self.service._unavailable_result(inn)
+            elif not self.service.circuit_breaker.allow_request():
+                result = await self._run_blocking(self.service._circuit_open_result, inn)
+            else:
+                decision = await self._reserve_quota(priority)
+                if not decision.allowed:
+                    self.service.circuit_breaker.release()
+                    result = self.service._quota_error(inn, decision)
+                else:
+                    result = await self._request_api(inn)
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[inn]
+            if not future.done():
+                future.cancel()
+
+    async def _request_api(self, inn: str) -> Dict:
+        """Запрос к API ФНС (лимит уже зарезервирован)"""
+        started_at = time.perf_counter()
+        try:
+            session = await self._get_session()
+            url = f"{self.service.base_url}/egr"
+            params = {
+                "req": inn,
+                "key": self.service.api_key
+            }
+
+            logger.info(f"Асинхронный запрос к API ФНС для ИНН: {inn}")
+
+            timeout = aiohttp.ClientTimeout(total=self.service.circuit_breaker.timeout())
+            async with session.get(url, params=params, timeout=timeout) as response:
+                body = await response.read()
+                self.service._record_call(started_at, response.status)
+                return await self._run_blocking(self.service._handle_api_response, inn, response.status, body)
+
+        except asyncio.TimeoutError:
+            self.service._record_call(started_at)
+            logger.error(f"Таймаут при проверке ИНН: {inn}")
+            return await self._run_blocking(self.service._transient_error, inn,
+                                            "Таймаут при обращении к серверу ФНС")
+        except aiohttp.ClientError as e:
+            self.service._record_call(started_at)
+            logger.error(f"Ошибка сети при проверке ИНН {inn}: {str(e)}")
+            return await self._run_blocking(self.service._transient_error, inn, f"Ошибка сети: {str(e)}")
+        except Exception as e:
+            self.service.circuit_breaker.release()
+            logger.error(f"Неожиданная ошибка при проверке ИНН {inn}: {str(e)}")
+            return {
+                "success": False,
+                "error": f"Внутренняя ошибка: {str(e)}",
+                "inn": inn,
+                "cached": False
+            }
+
+    async def _timed_request(self, inn: str, semaphore: asyncio.Semaphore,
+                             priority: str = PRIORITY_INTERACTIVE) -> Tuple[Dict, str]:
+        """
+        Запрос к API с ограничением конкурентности и замером времени
+
+        Returns:
+            Tuple[Dict, str]: (результат, исход: DISPATCH_API - запрос отправлен
+                в API, иначе причина пропуска)
+        """
+        async with semaphore:
+            started_at = time.perf_counter()
+            if not self.service.available:
+                return dict(self.service._unavailable_result(inn), latency_ms=0.0), DISPATCH_UNAVAILABLE
+            if not self.service.circuit_breaker.allow_request():
+                result = await self._run_blocking(self.service._circuit_open_result, inn)
+                return dict(result, latency_ms=0.0), DISPATCH_CIRCUIT_OPEN
+            decision = await self._reserve_quota(priority)
+            if not decision.allowed:
+                self.service.circuit_breaker.release()
+                return dict(self.service._quota_error(inn, decision), latency_ms=0.0), DISPATCH_LIMIT
+            result = await self._request_api(inn)
+            result["latency_ms"] = round((time.perf_counter() - started_at) * 1000, 2)
+            return result, DISPATCH_API
+
+    def _resolve_locally(self, inns: List[str]) -> Tuple[Dict[str, Dict], int, int]:
+        """Формат, кэш и индекс ЕГР без обращений к API (блокирующий, в пуле потоков)"""
+        resolved: Dict[str, Dict] = {}
+        cache_hits = 0
+        index_hits = 0
+        for inn in dict.fromkeys(inns):
+            lookup_started = time.perf_counter()
+            is_valid, error_message = self.service.validate_inn_format(inn)
+            if not is_valid:
+                result = {
+                    "success": False,
+                    "error": error_message,
+                    "inn": inn,
+                    "cached": False
+                }
+            else:
+                result = self.service._local_result(inn)
+                if not result:
+                    continue
+                if result["cached"]:
+                    cache_hits += 1
+                else:
+                    index_hits += 1
+            result["latency_ms"] = round((time.perf_counter() - lookup_started) * 1000, 2)
+            resolved[inn] = result
+        return resolved, cache_hits, index_hits
+
+    async def batch_check(self, inns: List[str], max_concurrency: Optional[int] = None,
+                          priority: str = PRIORITY_BATCH) -> Dict:
+        """
+        Массовая проверка ИНН
+
+        Как и в синхронной версии, сначала без сетевых запросов отрабатываются
+        ошибки формата, попадания в кэш и в индекс ЕГР, повторяющиеся ИНН
+        запрашиваются один раз. Лимит соблюдается за счёт атомарного резервирования.
+
+        Args:
+            inns: Список ИНН для проверки
+            max_concurrency: Максимум одновременных запросов к API
+            priority: Класс трафика для учёта лимита
+
+        Returns:
+            Dict: Результаты проверки (как у FNSService.batch_check)
+        """
+        validate_priority(priority)
+        started_at = time.perf_counter()
+
+        # Этап 1: формат, кэш и индекс ЕГР, без обращений к API
+        resolved, cache_hits, index_hits = await self._run_blocking(self._resolve_locally, inns)
+
+        # Этап 2: конкурентные запросы к API
+        pending = [inn for inn in dict.fromkeys(inns) if inn not in resolved]
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+        fetched = await asyncio.gather(*(self._timed_request(inn, semaphore, priority) for inn in pending))
+        resolved.update((inn, result) for inn, (result, _) in zip(pending, fetched))
+
+        results = [dict(resolved[inn]) for inn in inns]
+        successful = sum(1 for result in results if result["success"])
+        dispatched = [outcome for _, outcome in fetched]
+
+        return {
+            "total": len(inns),
+            "successful": successful,
+            "failed": len(inns) - successful,
+            "cache_hits": cache_hits,
+            "index_hits": index_hits,
+            "api_requests": dispatched.count(DISPATCH_API),
+            "skipped_by_limit": dispatched.count(DISPATCH_LIMIT),
+            "skipped_by_circuit": dispatched.count(DISPATCH_CIRCUIT_OPEN),
+            "skipped_unavailable": dispatched.count(DISPATCH_UNAVAILABLE),
+            "wall_time_ms": round((time.perf_counter() - started_at) * 1000, 2),
+            "results": results,
+            "usage_today": await self._run_blocking(self.service.quota.used_today),
+            "daily_limit": self.service.daily_limit
+        }
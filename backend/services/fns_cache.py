@@ -0,0 +1,269 @@
+"""
+Двухуровневый кэш результатов проверки ИНН
+L1 - in-process TTL-LRU, L2 - Redis
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from backend.services.fns_codec import CacheCodec, JsonCodec, binary_client
+
+logger = logging.getLogger(__name__)
+
+
+class TTLLRUCache:
+    """
+    In-process кэш с ограничением по размеру и времени жизни
+
+    При переполнении вытесняется давно не использованная запись.
+    Значения хранятся как есть и не должны изменяться вызывающим кодом.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Получение значения (None - нет или истекло)"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = item
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Сохранение значения; ttl не может превышать ttl кэша"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (value, self._clock() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict:
+        """Счетчики попаданий, промахов и вытеснений"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class TwoTierCache:
+    """
+    Кэш L1 (память процесса) перед L2 (Redis)
+
+    Запись идёт в оба уровня, чтение - сначала из L1. При попадании в L2
+    запись поднимается в L1 на время не больше оставшегося TTL в Redis,
+    поэтому L1 не отдаёт данные дольше, чем они живут в Redis.
+    Без Redis L1 остаётся единственным уровнем. Формат записей в Redis
+    задаёт codec; записи прежнего формата (JSON) читаются любым кодеком.
+    """
+
+    def __init__(self, l1: TTLLRUCache, redis_client=None, codec: Optional[CacheCodec] = None):
+        self.l1 = l1
+        self.codec = codec or JsonCodec()
+        if redis_client is not None and self.codec.binary:
+            redis_client = binary_client(redis_client)
+        self.redis_client = redis_client
+
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.l1.get(key)
+        if value is not None or not self.redis_client:
+            return value
+
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            raw, pttl = pipe.execute()
+        except Exception as e:
+            self.l2_errors += 1
+            logger.error(f"Ошибка чтения из Redis: {e}")
+            return None
+
+        if not raw:
+            self.l2_misses += 1
+            return None
+
+        self.l2_hits += 1
+        try:
+            value = self.codec.decode(raw)
+        except Exception as e:
+            self.l2_errors += 1
+            logger.error(f"Ошибка декодирования записи кэша {key}: {e}")
+            return None
+        if pttl and pttl > 0:
+            self.l1.set(key, value, pttl / 1000)
+        return value
+
+    def set(self, key: str, value: Any, ttl: int):
+        if self.redis_client:
+            try:
+                self.redis_client.setex(key, ttl, self.codec.encode(value))
+            except Exception as e:
+                self.l2_errors += 1
+                logger.error(f"Ошибка записи в Redis: {e}")
+        self.l1.set(key, value, ttl)
+
+    def delete(self, key: str):
+        self.l1.delete(key)
+        if self.redis_client:
+            self.redis_client.delete(key)
+
+    def get_stats(self) -> Dict:
+        return {
+            "l1": self.l1.get_stats(),
+            "l2": {
+                "enabled": bool(self.redis_client),
+                "codec": self.codec.name,
+                "hits": self.l2_hits,
+                "misses": self.l2_misses,
+                "errors": self.l2_errors
+            }
+        }
+
+
+class CacheNamespace:
+    """
+    Поколения ключей кэша в Redis
+
+    Ключ записи включает номер поколения, поэтому полная инвалидация -
+    это один INCR: записи старого поколения перестают читаться сразу,
+    а удаляются потом постепенно через SCAN/UNLINK пачками, не блокируя
+    Redis. Другие воркеры узнают о новом поколении не позже чем через
+    refresh_interval секунд.
+    """
+
+    def __init__(self, redis_client=None, prefix: str = "fns:cache", refresh_interval: float = 5,
+                 clock: Callable[[], float] = time.monotonic):
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.generation_key = f"{prefix}:generation"
+        self.refresh_interval = refresh_interval
+        self._clock = clock
+        self._generation = 0
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        """Текущее поколение (из Redis не чаще раза в refresh_interval)"""
+        if not self.redis_client:
+            return self._generation
+
+        now = self._clock()
+        if self._checked_at is None or now - self._checked_at >= self.refresh_interval:
+            try:
+                self._generation = int(self.redis_client.get(self.generation_key) or 0)
+                self._checked_at = now
+            except Exception as e:
+                logger.error(f"Ошибка чтения поколения кэша: {e}")
+        return self._generation
+
+    def key(self, suffix: str) -> str:
+        return f"{self.prefix}:{self.generation()}:{suffix}"
+
+    def invalidate(self) -> int:
+        """Переход на новое поколение; возвращает его номер"""
+        with self._lock:
+            if self.redis_client:
+                self._generation = int(self.redis_client.incr(self.generation_key))
+                self._checked_at = self._clock()
+            else:
+                self._generation += 1
+            return self._generation
+
+    def purge(self, batch_size: int = 500, progress: Optional[Callable[[int, int], None]] = None,
+              extra_patterns: Iterable[str] = ()) -> Dict:
+        """
+        Удаление записей неактуальных поколений пачками
+
+        Args:
+            batch_size: Размер пачки SCAN и UNLINK
+            progress: Вызывается после каждой пачки с (удалено всего, номер пачки)
+            extra_patterns: Дополнительные шаблоны ключей (например, старый формат)
+
+        Returns:
+            Dict: Количество удалённых ключей и пачек
+        """
+        if not self.redis_client:
+            return {"deleted": 0, "batches": 0}
+
+        current = f"{self.prefix}:{self.generation()}:"
+        deleted = 0
+        batches = 0
+        batch = []
+
+        def flush():
+            nonlocal deleted, batches
+            try:
+                deleted += self.redis_client.unlink(*batch)
+            except Exception:
+                # Redis < 4.0 без UNLINK
+                deleted += self.redis_client.delete(*batch)
+            batches += 1
+            batch.clear()
+            if progress:
+                progress(deleted, batches)
+
+        for pattern in (f"{self.prefix}:*", *extra_patterns):
+            for key in self.redis_client.scan_iter(match=pattern, count=batch_size):
+                if isinstance(key, bytes):
+                    key = key.decode()
+                if key.startswith(current) or key == self.generation_key:
+                    continue
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    flush()
+        if batch:
+            flush()
+
+        return {"deleted": deleted, "batches": batches}
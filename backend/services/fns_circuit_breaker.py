@@ -0,0 +1,162 @@
+"""
+Circuit breaker и адаптивный таймаут для API ФНС
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи по доле ошибок в скользящем окне
+
+    closed - запросы идут, ведётся статистика задержек и ошибок;
+    open - запросы не отправляются open_seconds секунд;
+    half_open - пропускается пробный запрос, по его исходу цепь
+    замыкается или снова размыкается.
+
+    Таймаут запроса выводится из наблюдаемого p99 задержки.
+    """
+
+    def __init__(self, window_size: int = 200, window_seconds: float = 300,
+                 failure_rate: float = 0.5, min_requests: int = 10,
+                 consecutive_failures: int = 5, open_seconds: float = 30,
+                 min_timeout: float = 2.0, max_timeout: float = 15.0,
+                 timeout_multiplier: float = 3.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.window_seconds = window_seconds
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.consecutive_failures = consecutive_failures
+        self.open_seconds = open_seconds
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self._clock = clock
+
+        self._samples: deque = deque(maxlen=window_size)
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._failures_in_row = 0
+        self.rejected = 0
+
+    def _prune(self, now: float):
+        while self._samples and now - self._samples[0][0] > self.window_seconds:
+            self._samples.popleft()
+
+    def _open(self, now: float):
+        self._state = STATE_OPEN
+        self._opened_at = now
+        self._probe_in_flight = False
+        logger.warning("Circuit breaker API ФНС разомкнут")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == STATE_OPEN and self._clock() - self._opened_at >= self.open_seconds:
+                return STATE_HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Можно ли отправить запрос; в half_open пропускается один пробный"""
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_OPEN:
+                if self._clock() - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self._state = STATE_HALF_OPEN
+            if self._probe_in_flight:
+                self.rejected += 1
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def release(self):
+        """Пробный запрос не состоялся (например, отказ лимитера)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self, latency: float):
+        with self._lock:
+            now = self._clock()
+            self._samples.append((now, latency, True))
+            self._failures_in_row = 0
+            if self._state != STATE_CLOSED:
+                self._state = STATE_CLOSED
+                self._probe_in_flight = False
+                self._samples.clear()
+                self._samples.append((now, latency, True))
+                logger.info("Circuit breaker API ФНС замкнут")
+
+    def record_failure(self, latency: float):
+        with self._lock:
+            now = self._clock()
+            self._samples.append((now, latency, False))
+            self._failures_in_row += 1
+            if self._state != STATE_CLOSED:
+                self._open(now)
+                return
+
+            self._prune(now)
+            failures = sum(1 for _, _, ok in self._samples if not ok)
+            if (self._failures_in_row >= self.consecutive_failures
+                    or (len(self._samples) >= self.min_requests
+                        and failures / len(self._samples) >= self.failure_rate)):
+                self._open(now)
+
+    def _percentile(self, latencies, q: float) -> float:
+        if not latencies:
+            return 0.0
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+    def timeout(self) -> float:
+        """
+        Таймаут запроса: p99 успешных запросов * timeout_multiplier
+
+        Пока статистики мало, используется max_timeout.
+        """
+        with self._lock:
+            self._prune(self._clock())
+            latencies = [latency for _, latency, ok in self._samples if ok]
+        if len(latencies) < self.min_requests:
+            return self.max_timeout
+        p99 = self._percentile(latencies, 0.99)
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    def get_stats(self) -> Dict:
+        """Состояние для /health и статистики"""
+        state = self.state
+        with self._lock:
+            now = self._clock()
+            self._prune(now)
+            samples = list(self._samples)
+            opened_at = self._opened_at
+        latencies = [latency for _, latency, ok in samples if ok]
+        failures = sum(1 for _, _, ok in samples if not ok)
+        return {
+            "state": state,
+            "requests": len(samples),
+            "error_rate": round(failures / len(samples), 4) if samples else 0.0,
+            "p50_ms": round(self._percentile(latencies, 0.5) * 1000, 1),
+            "p99_ms": round(self._percentile(latencies, 0.99) * 1000, 1),
+            "timeout_s": round(self.timeout(), 2),
+            "rejected": self.rejected,
+            "retry_in_s": round(max(0.0, self.open_seconds - (now - opened_at)), 1)
+            if state == STATE_OPEN else 0.0
+        }
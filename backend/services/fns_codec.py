@@ -0,0 +1,161 @@
+"""
+Кодеки записей кэша ФНС в Redis
+
+Формат записи: заголовок из двух байт (версия формата, способ сжатия)
+и полезная нагрузка. Записи старого формата - JSON-текст без заголовка -
+по-прежнему читаются, поэтому менять кодек можно без очистки кэша.
+"""
+
+import json
+import logging
+import zlib
+from typing import Any, Union
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - зависит от окружения
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - зависит от окружения
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Версии формата (первый байт заголовка)
+FORMAT_MSGPACK = 1
+
+# Способы сжатия (второй байт заголовка)
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+_COMPRESSION_IDS = {
+    None: COMPRESSION_NONE,
+    "none": COMPRESSION_NONE,
+    "zlib": COMPRESSION_ZLIB,
+    "zstd": COMPRESSION_ZSTD,
+}
+
+
+class CacheCodec:
+    """Преобразование записи кэша в байты и обратно"""
+
+    name = ""
+    # Нужен ли Redis-клиент без decode_responses
+    binary = False
+
+    def encode(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, raw: Union[bytes, str]) -> Any:
+        return decode_value(raw)
+
+
+class JsonCodec(CacheCodec):
+    """Прежний формат: JSON-текст без заголовка"""
+
+    name = "json"
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+class MsgpackCodec(CacheCodec):
+    """
+    msgpack со сжатием записей больше threshold байт
+
+    Мелкие записи (ИНН не найден, ошибки) не сжимаются: на них
+    заголовок сжатия дороже выигрыша.
+    """
+
+    name = "msgpack"
+    binary = True
+
+    def __init__(self, compression: str = "zlib", threshold: int = 512, level: int = 6):
+        if msgpack is None:
+            raise ImportError("Для кодека msgpack установите пакет msgpack")
+        if compression not in _COMPRESSION_IDS:
+            raise ValueError(f"Неизвестный способ сжатия: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("Для сжатия zstd установите пакет zstandard")
+
+        self.compression = _COMPRESSION_IDS[compression]
+        self.threshold = threshold
+        self.level = level
+        self._zstd = zstandard.ZstdCompressor(level=level) if self.compression == COMPRESSION_ZSTD else None
+
+    def encode(self, value: Any) -> bytes:
+        payload = msgpack.packb(value, use_bin_type=True)
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and len(payload) > self.threshold:
+            if self.compression == COMPRESSION_ZLIB:
+                payload = zlib.compress(payload, self.level)
+            else:
+                payload = self._zstd.compress(payload)
+            compression = self.compression
+        return bytes((FORMAT_MSGPACK, compression)) + payload
+
+
+def decode_value(raw: Union[bytes, str]) -> Any:
+    """
+    Чтение записи любого поддерживаемого формата
+
+    Формат определяется по первому байту: JSON начинается с '{' или '[',
+    остальные записи - с номера версии формата.
+    """
+    if isinstance(raw, str):
+        return json.loads(raw)
+    if raw[:1] in (b"{", b"["):
+        return json.loads(raw.decode("utf-8"))
+
+    version, compression = raw[0], raw[1]
+    if version != FORMAT_MSGPACK:
+        raise ValueError(f"Неизвестная версия формата записи кэша: {version}")
+    if msgpack is None:
+        raise ImportError("Для чтения записей msgpack установите пакет msgpack")
+
+    payload = raw[2:]
+    if compression == COMPRESSION_ZLIB:
+        payload = zlib.decompress(payload)
+    elif compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise ImportError("Для чтения записей zstd установите пакет zstandard")
+        payload = zstandard.ZstdDecompressor().decompress(payload)
+    elif compression != COMPRESSION_NONE:
+        raise ValueError(f"Неизвестный способ сжатия записи кэша: {compression}")
+    return msgpack.unpackb(payload, raw=False)
+
+
+def get_codec(name: str = "msgpack", compression: str = "zlib", threshold: int = 512) -> CacheCodec:
+    """
+    Кодек по имени из настроек
+
+    Если нужного пакета нет, используется JSON, чтобы кэш продолжал работать.
+    """
+    if name == "json":
+        return JsonCodec()
+    if name != "msgpack":
+        raise ValueError(f"Неизвестный кодек кэша: {name}")
+    try:
+        return MsgpackCodec(compression=compression, threshold=threshold)
+    except ImportError as e:
+        logger.warning(f"{e}; кэш ФНС использует JSON")
+        return JsonCodec()
+
+
+def binary_client(redis_client):
+    """
+    Клиент Redis на тех же настройках, но без decode_responses
+
+    Бинарные записи нельзя читать клиентом, декодирующим ответы в str.
+    """
+    pool = redis_client.connection_pool
+    kwargs = dict(pool.connection_kwargs)
+    if not kwargs.get("decode_responses"):
+        return redis_client
+    kwargs["decode_responses"] = False
+    return redis_client.__class__(
+        connection_pool=pool.__class__(connection_class=pool.connection_class, **kwargs)
+    )
@@ -0,0 +1,294 @@
+"""
+Учёт дневного лимита запросов к API ФНС
+Атомарный счётчик в Redis и детерминированный in-process вариант
+
+Лимит делится между классами трафика. Классу выше по приоритету
+гарантируется доля дневного лимита: классы ниже не могут занять её
+неиспользованную часть. Ближе к полуночи резерв уменьшается до нуля
+и отдаётся остальным классам.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Причины отказа
+REASON_DAILY = "daily_limit"
+REASON_RATE = "rate_limit"
+REASON_RESERVED = "reserved"
+
+# Классы трафика, от высшего приоритета к низшему
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITY_BACKGROUND = "background"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BACKGROUND)
+
+
+def validate_priority(priority: str) -> str:
+    """Проверка класса трафика"""
+    if priority not in PRIORITIES:
+        raise ValueError(f"Неизвестный приоритет: {priority}. Допустимые: {', '.join(PRIORITIES)}")
+    return priority
+
+
+@dataclass
+class QuotaDecision:
+    """Результат попытки занять запросы в лимите"""
+    allowed: bool
+    used: int
+    reason: str = ""
+    retry_after: float = 0.0
+
+
+class QuotaLimiter:
+    """
+    Базовый лимитер: дневной лимит плюс необязательный лимит в секунду
+
+    Счётчик дня хранится под ключом с датой, поэтому в полночь он
+    обнуляется сам, без отдельного сброса. Кроме общего счётчика ведутся
+    счётчики по классам трафика: запрос класса не пропускается, если он
+    займёт неиспользованный резерв классов выше по приоритету.
+    """
+
+    def __init__(self, daily_limit: int, rate_per_second: float = 0, burst: Optional[int] = None,
+                 today: Callable[[], date] = lambda: datetime.now().date(),
+                 reserves: Optional[Dict[str, float]] = None, lend_from_hour: Optional[float] = None,
+                 now: Callable[[], datetime] = datetime.now):
+        """
+        Args:
+            reserves: Гарантированная доля дневного лимита по классам, например
+                {"interactive": 0.3, "batch": 0.1}
+            lend_from_hour: С какого часа резерв линейно уменьшается до нуля
+                к полуночи (None - резерв действует весь день)
+        """
+        self.daily_limit = daily_limit
+        self.rate_per_second = rate_per_second
+        self.burst = burst or max(1, int(rate_per_second))
+        self._today = today
+        self.reserves = {validate_priority(priority): share for priority, share in (reserves or {}).items()}
+        self.lend_from_hour = lend_from_hour
+        self._now = now
+
+    def try_acquire(self, n: int = 1, priority: str = PRIORITY_INTERACTIVE) -> QuotaDecision:
+        raise NotImplementedError
+
+    def used_today(self) -> int:
+        raise NotImplementedError
+
+    def used_by_priority(self) -> Dict[str, int]:
+        """Использовано сегодня по классам трафика"""
+        raise NotImplementedError
+
+    def lend_factor(self) -> float:
+        """Доля резерва, действующая сейчас: 1 до lend_from_hour, затем до 0 к полуночи"""
+        if self.lend_from_hour is None:
+            return 1.0
+        moment = self._now()
+        hours = moment.hour + moment.minute / 60 + moment.second / 3600
+        if hours < self.lend_from_hour:
+            return 1.0
+        return max(0.0, (24 - hours) / (24 - self.lend_from_hour))
+
+    def reserved(self) -> Dict[str, int]:
+        """Резерв классов в запросах с учётом времени суток"""
+        factor = self.lend_factor()
+        return {
+            priority: int(self.daily_limit * share * factor)
+            for priority, share in self.reserves.items()
+        }
+
+    def _higher_reserves(self, priority: str) -> Dict[str, int]:
+        """Резервы классов выше priority"""
+        higher = PRIORITIES[:PRIORITIES.index(validate_priority(priority))]
+        return {p: reserve for p, reserve in self.reserved().items() if p in higher and reserve > 0}
+
+    def remaining(self, priority: str = PRIORITY_INTERACTIVE) -> int:
+        """Сколько запросов ещё может занять класс priority"""
+        used_by_priority = self.used_by_priority()
+        headroom = sum(
+            max(0, reserve - used_by_priority.get(p, 0))
+            for p, reserve in self._higher_reserves(priority).items()
+        )
+        return max(0, self.daily_limit - self.used_today() - headroom)
+
+    def today(self) -> str:
+        return self._today().isoformat()
+
+    def acquire(self, n: int = 1, timeout: float = 0.0, priority: str = PRIORITY_INTERACTIVE) -> QuotaDecision:
+        """
+        Занять n запросов, при лимите в секунду подождать не дольше timeout
+
+        Исчерпанный дневной лимит и резерв других классов не ждут.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            decision = self.try_acquire(n, priority)
+            if decision.allowed or decision.reason != REASON_RATE:
+                break
+            wait = min(decision.retry_after, deadline - time.monotonic())
+            if wait <= 0:
+                break
+            time.sleep(wait)
+
+        if decision.allowed and decision.used >= self.daily_limit * 0.8:
+            logger.warning(f"Использовано {decision.used} из {self.daily_limit} запросов к API ФНС")
+        return decision
+
+
+class InMemoryQuotaLimiter(QuotaLimiter):
+    """Лимитер в памяти процесса (без Redis и для тестов)"""
+
+    def __init__(self, daily_limit: int, rate_per_second: float = 0, burst: Optional[int] = None,
+                 today: Callable[[], date] = lambda: datetime.now().date(),
+                 clock: Callable[[], float] = time.monotonic, **kwargs):
+        super().__init__(daily_limit, rate_per_second, burst, today, **kwargs)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._day = None
+        self._used = 0
+        self._used_by_priority: Dict[str, int] = {}
+        self._tokens = float(self.burst)
+        self._tokens_ts = clock()
+
+    def _roll_day(self):
+        day = self.today()
+        if day != self._day:
+            self._day = day
+            self._used = 0
+            self._used_by_priority = {}
+
+    def try_acquire(self, n: int = 1, priority: str = PRIORITY_INTERACTIVE) -> QuotaDecision:
+        higher_reserves = self._higher_reserves(priority)
+        with self._lock:
+            self._roll_day()
+            if self._used + n > self.daily_limit:
+                return QuotaDecision(False, self._used, REASON_DAILY)
+
+            headroom = sum(
+                max(0, reserve - self._used_by_priority.get(p, 0))
+                for p, reserve in higher_reserves.items()
+            )
+            if self._used + n + headroom > self.daily_limit:
+                return QuotaDecision(False, self._used, REASON_RESERVED)
+
+            if self.rate_per_second > 0:
+                now = self._clock()
+                tokens = min(self.burst, self._tokens + (now - self._tokens_ts) * self.rate_per_second)
+                self._tokens_ts = now
+                if tokens < n:
+                    self._tokens = tokens
+                    return QuotaDecision(False, self._used, REASON_RATE,
+                                         (n - tokens) / self.rate_per_second)
+                self._tokens = tokens - n
+
+            self._used += n
+            self._used_by_priority[priority] = self._used_by_priority.get(priority, 0) + n
+            return QuotaDecision(True, self._used)
+
+    def used_today(self) -> int:
+        with self._lock:
+            self._roll_day()
+            return self._used
+
+    def used_by_priority(self) -> Dict[str, int]:
+        with self._lock:
+            self._roll_day()
+            return {priority: self._used_by_priority.get(priority, 0) for priority in PRIORITIES}
+
+
+# KEYS[1] - счётчик дня, KEYS[2] - ведро токенов, KEYS[3] - счётчик дня класса,
+# KEYS[4..] - счётчики дня классов выше по приоритету
+# ARGV: n, дневной лимит, TTL счётчика дня, запросов в секунду, ёмкость ведра,
+# затем резервы классов из KEYS[4..]
+_ACQUIRE_SCRIPT = """
+local n = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local used = tonumber(redis.call('get', KEYS[1]) or '0')
+if used + n > limit then
+    return {0, used, 'daily_limit', '0'}
+end
+
+local headroom = 0
+for i = 4, #KEYS do
+    local class_used = tonumber(redis.call('get', KEYS[i]) or '0')
+    headroom = headroom + math.max(0, tonumber(ARGV[i + 2]) - class_used)
+end
+if used + n + headroom > limit then
+    return {0, used, 'reserved', '0'}
+end
+
+local rate = tonumber(ARGV[4])
+if rate > 0 then
+    local burst = tonumber(ARGV[5])
+    local t = redis.call('time')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local bucket = redis.call('hmget', KEYS[2], 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    if tokens < n then
+        redis.call('hset', KEYS[2], 'tokens', tostring(tokens), 'ts', tostring(now))
+        return {0, used, 'rate_limit', tostring((n - tokens) / rate)}
+    end
+    redis.call('hset', KEYS[2], 'tokens', tostring(tokens - n), 'ts', tostring(now))
+    redis.call('expire', KEYS[2], math.ceil(burst / rate) + 1)
+end
+
+used = redis.call('incrby', KEYS[1], n)
+if used == n then
+    redis.call('expire', KEYS[1], tonumber(ARGV[3]))
+end
+if redis.call('incrby', KEYS[3], n) == n then
+    redis.call('expire', KEYS[3], tonumber(ARGV[3]))
+end
+return {1, used, '', '0'}
+"""
+
+
+class RedisQuotaLimiter(QuotaLimiter):
+    """
+    Общий для всех воркеров лимитер на Lua-скрипте
+
+    Проверка резервов и увеличение счётчиков выполняются одним скриптом,
+    поэтому одновременные воркеры не теряют обновления и не превышают лимит.
+    """
+
+    DAY_KEY_TTL = 2 * 86400
+
+    def __init__(self, redis_client, daily_limit: int, rate_per_second: float = 0,
+                 burst: Optional[int] = None, prefix: str = "fns:quota",
+                 today: Callable[[], date] = lambda: datetime.now().date(), **kwargs):
+        super().__init__(daily_limit, rate_per_second, burst, today, **kwargs)
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self._acquire = redis_client.register_script(_ACQUIRE_SCRIPT)
+
+    def _day_key(self) -> str:
+        return f"{self.prefix}:day:{self.today()}"
+
+    def _class_key(self, priority: str) -> str:
+        return f"{self._day_key()}:{priority}"
+
+    def try_acquire(self, n: int = 1, priority: str = PRIORITY_INTERACTIVE) -> QuotaDecision:
+        higher_reserves = self._higher_reserves(priority)
+        allowed, used, reason, retry_after = self._acquire(
+            keys=[self._day_key(), f"{self.prefix}:rate", self._class_key(priority)]
+            + [self._class_key(p) for p in higher_reserves],
+            args=[n, self.daily_limit, self.DAY_KEY_TTL, self.rate_per_second, self.burst]
+            + list(higher_reserves.values())
+        )
+        if isinstance(reason, bytes):
+            reason = reason.decode()
+        return QuotaDecision(bool(allowed), int(used), reason, float(retry_after))
+
+    def used_today(self) -> int:
+        return int(self.redis_client.get(self._day_key()) or 0)
+
+    def used_by_priority(self) -> Dict[str, int]:
+        values = self.redis_client.mget([self._class_key(priority) for priority in PRIORITIES])
+        return {priority: int(value or 0) for priority, value in zip(PRIORITIES, values)}
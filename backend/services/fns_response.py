@@ -0,0 +1,242 @@
+"""
+Разбор ответов API ФНС (метод egr)
+
+Из ответа извлекаются только поля, которые попадают в нормализованные
+данные: история изменений и прочие большие вложенные блоки не собираются
+в объекты Python. Тела больше stream_min_bytes разбираются потоком
+по событиям ijson; небольшие (и все - без пакета ijson) - через json
+с последующим отбором полей: на малых телах json.loads быстрее,
+а выигрыша по памяти нет.
+
+Ответ может содержать несколько записей по одному ИНН (например, ИП,
+который прекращал и снова начинал деятельность). Основной считается
+действующая запись с самой поздней датой регистрации, остальные
+кратко сохраняются в other_records.
+"""
+
+import io
+import json
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+try:
+    import ijson
+except ImportError:  # pragma: no cover - зависит от окружения
+    ijson = None
+
+# Поля ответа -> поля нормализованных данных
+LEGAL_ENTITY_FIELDS = {
+    "НаимЮЛ": "company_name",
+    "СокрНаимЮЛ": "short_name",
+    "ОГРН": "ogrn",
+    "ДатаОГРН": "ogrn_date",
+    "Статус": "status",
+    "Адрес": "address",
+    "ОКВЭД": "okved",
+    "ТекстОКВЭД": "okved_desc",
+    "Руководитель": "director",
+    "Учредители": "founders",
+    "УстКап": "authorized_capital",
+}
+ENTREPRENEUR_FIELDS = {
+    "ФИО": "full_name",
+    "ОГРНИП": "ogrn_ip",
+    "ДатаОГРНИП": "ogrn_ip_date",
+    "Статус": "status",
+    "Адрес": "address",
+    "ОКВЭД": "okved",
+    "ТекстОКВЭД": "okved_desc",
+}
+MAPPED_FIELDS = frozenset(LEGAL_ENTITY_FIELDS) | frozenset(ENTREPRENEUR_FIELDS)
+
+# Обёртки записей: {"items": [{"ЮЛ": {...}}, ...]}
+_WRAPPER_KEYS = frozenset(("items", "ЮЛ", "ИП"))
+# Пути ijson, по которым лежат записи
+_WRAPPED_PREFIXES = frozenset(("items.item.ЮЛ", "items.item.ИП"))
+_RECORD_PREFIXES = frozenset(("", "item", "items.item")) | _WRAPPED_PREFIXES
+_SCALAR_EVENTS = frozenset(("string", "number", "boolean", "null"))
+
+# Ключ записи неизвестного формата: имена её полей
+UNMAPPED = "_unmapped"
+
+# Размер тела, начиная с которого оно разбирается потоком
+DEFAULT_STREAM_MIN_BYTES = 1024 * 1024
+
+
+def _build_value(events, event: str, value):
+    """Значение поля из потока событий; вложенные объекты собираются целиком"""
+    if event in _SCALAR_EVENTS:
+        return value
+    builder = ijson.ObjectBuilder()
+    builder.event(event, value)
+    depth = 1
+    for _, event, value in events:
+        builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+            if depth == 0:
+                break
+    return builder.value
+
+
+def _iter_stream(body: bytes) -> Iterator[Dict]:
+    """
+    Записи ответа по событиям ijson: собираются только поля из MAPPED_FIELDS
+
+    Записями считаются те же объекты, что и в records_from_data: прочие
+    ключи обёрток (например, "Count" рядом с "items" или ключ рядом с "ЮЛ")
+    записей не образуют.
+    """
+    events = ijson.parse(io.BytesIO(body), use_float=True)
+    # Открытые объекты: путь, поля, имена прочих полей, вложенные ЮЛ/ИП,
+    # есть ли у корня список items
+    stack: List[Dict] = []
+    for prefix, event, value in events:
+        # События внутри непрошенных полей пропускаются одной проверкой
+        if prefix not in _RECORD_PREFIXES:
+            continue
+        if event == "start_map":
+            stack.append({"prefix": prefix, "fields": {}, "unmapped": [], "wrapped": {}, "items": False})
+            continue
+        if not stack or prefix != stack[-1]["prefix"]:
+            continue
+
+        frame = stack[-1]
+        if event == "map_key":
+            if value in MAPPED_FIELDS:
+                _, next_event, next_value = next(events)
+                frame["fields"][value] = _build_value(events, next_event, next_value)
+            elif value == "items" and prefix == "":
+                frame["items"] = next(events)[1] == "start_array"
+            elif value not in _WRAPPER_KEYS:
+                frame["unmapped"].append(value)
+            continue
+        if event != "end_map":
+            continue
+
+        stack.pop()
+        record = frame["fields"] or ({UNMAPPED: frame["unmapped"]} if frame["unmapped"] else None)
+        if prefix in _WRAPPED_PREFIXES:
+            # Запись внутри элемента items: отдаётся вместо самого элемента
+            if stack:
+                stack[-1]["wrapped"][prefix.rsplit(".", 1)[1]] = record
+        elif frame["wrapped"]:
+            for key in ("ЮЛ", "ИП"):
+                if frame["wrapped"].get(key):
+                    yield frame["wrapped"][key]
+        elif not frame["items"] and record:
+            yield record
+
+
+def _records_from_object(obj, nested: bool = True) -> Iterator[Dict]:
+    if not isinstance(obj, dict):
+        return
+    if nested and isinstance(obj.get("items"), list):
+        for item in obj["items"]:
+            wrapped = [item[key] for key in ("ЮЛ", "ИП") if isinstance(item, dict) and isinstance(item.get(key), dict)]
+            for record in wrapped or [item]:
+                yield from _records_from_object(record, nested=False)
+        return
+    fields = {key: value for key, value in obj.items() if key in MAPPED_FIELDS}
+    if fields:
+        yield fields
+    else:
+        unmapped = [key for key in obj if key not in _WRAPPER_KEYS]
+        if unmapped:
+            yield {UNMAPPED: unmapped}
+
+
+def records_from_data(data) -> Iterator[Dict]:
+    """Записи уже разобранного ответа (объект, список объектов или {"items": [...]})"""
+    if isinstance(data, list):
+        for item in data:
+            yield from _records_from_object(item, nested=False)
+    else:
+        yield from _records_from_object(data)
+
+
+def parse_records(body: Union[bytes, str], stream_min_bytes: int = DEFAULT_STREAM_MIN_BYTES) -> List[Dict]:
+    """
+    Записи из тела ответа API
+
+    Args:
+        body: Тело ответа
+        stream_min_bytes: Разбирать потоком тела от этого размера
+
+    Raises:
+        ValueError: Тело ответа - не JSON
+    """
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if ijson is None or len(body) < stream_min_bytes:
+        return list(records_from_data(json.loads(body)))
+    try:
+        return list(_iter_stream(body))
+    except ijson.JSONError as e:
+        raise ValueError(str(e)) from e
+
+
+def _registration_date(record: Dict) -> datetime:
+    raw = str(record.get("ДатаОГРН") or record.get("ДатаОГРНИП") or "")
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(raw[:10], fmt)
+        except ValueError:
+            continue
+    return datetime.min
+
+
+def _is_active(record: Dict) -> bool:
+    return "действ" in str(record.get("Статус", "")).lower()
+
+
+def select_record(records: List[Dict]) -> Tuple[Dict, List[Dict]]:
+    """
+    Основная запись и остальные
+
+    Основная - действующая с самой поздней датой регистрации; при равенстве
+    остаётся первая по порядку ответа.
+    """
+    primary = max(records, key=lambda record: (_is_active(record), _registration_date(record)))
+    return primary, [record for record in records if record is not primary]
+
+
+def normalize_records(records: Iterable[Dict], inn: str) -> Dict:
+    """Нормализованные данные по записям ответа"""
+    records = list(records) or [{}]
+    primary, others = select_record(records)
+
+    normalized = {
+        "inn": inn,
+        "org_type": "Юридическое лицо" if len(inn) == 10 else "Индивидуальный предприниматель",
+        "verification_date": datetime.now().isoformat(),
+        "source": "api_fns"
+    }
+
+    if "НаимЮЛ" in primary:
+        fields = LEGAL_ENTITY_FIELDS
+    elif "ФИО" in primary:
+        fields = ENTREPRENEUR_FIELDS
+    else:
+        fields = {}
+        normalized["raw_fields"] = primary.get(UNMAPPED, sorted(primary))
+
+    for source_key, target_key in fields.items():
+        value = primary.get(source_key, "")
+        normalized[target_key] = value.strip() if target_key in ("company_name", "full_name") else value
+
+    normalized["is_active"] = _is_active(primary)
+
+    if others:
+        normalized["records_count"] = len(records)
+        normalized["other_records"] = [
+            {
+                "ogrn": record.get("ОГРН") or record.get("ОГРНИП", ""),
+                "registration_date": record.get("ДатаОГРН") or record.get("ДатаОГРНИП", ""),
+                "status": record.get("Статус", ""),
+            }
+            for record in others
+        ]
+    return normalized
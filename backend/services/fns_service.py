@@ -4,19 +4,78 @@
 """
 
 import os
-import json
 import requests
 import logging
 import hashlib
+import itertools
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple, List
+from typing import Dict, Iterable, Iterator, Optional, Tuple, List, Union
 from dataclasses import dataclass
 import redis
 
+from backend.services.fns_cache import CacheNamespace, TTLLRUCache, TwoTierCache
+from backend.services.fns_circuit_breaker import CircuitBreaker
+from backend.services.egr_index import EGRIndex
+from backend.services.fns_codec import get_codec
+from backend.services.fns_response import (
+    DEFAULT_STREAM_MIN_BYTES, normalize_records, parse_records, records_from_data
+)
+from backend.services.fns_quota import (
+    PRIORITIES, PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE, REASON_RATE,
+    REASON_RESERVED, InMemoryQuotaLimiter, QuotaDecision, RedisQuotaLimiter, validate_priority
+)
+from backend.services.fns_singleflight import RedisSingleFlight, SingleFlight
+from backend.services.fns_transport import RetryPolicy, build_session, connection_stats
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Исходы проверки, которые сохраняются в кэш
+OUTCOME_OK = "ok"
+OUTCOME_NOT_FOUND = "not_found"
+OUTCOME_ERROR = "error"
+
+# Ошибка проверки ИНН, которого нет в реестре
+NOT_FOUND_ERROR = "ИНН не найден в реестре ФНС"
+
+# Вид неудачной проверки (поле error_type результата)
+ERROR_TEMPORARY = "temporary"  # таймаут, сеть, 5xx и 429, цепь разомкнута, лимит
+ERROR_CONFIG = "config"        # ключ API не указан или отклонён (401, 403)
+
+# Ключи кэша старого формата: fns:<md5>
+LEGACY_CACHE_KEY_PATTERN = "fns:" + "[0-9a-f]" * 32
+
+# Запас времени блокировки межпроцессного объединения сверх самого долгого запроса, сек
+SINGLE_FLIGHT_MARGIN = 5
+
+
+def _body_preview(body: Union[bytes, str], limit: int = 500) -> str:
+    """Начало тела ответа для лога"""
+    if isinstance(body, bytes):
+        body = body[:limit].decode("utf-8", errors="replace")
+    return body[:limit]
+
+
+def is_temporary_failure(result: Dict) -> bool:
+    """
+    Неудачная проверка, которая может пройти при повторе
+
+    Временны только таймауты, ошибки сети, ответы 5xx и 429, разомкнутая
+    цепь и исчерпанный лимит (error_type=temporary). Ошибки настройки
+    (ключ API) и прочие ответы 4xx повтор не исправит.
+    """
+    return not result.get("success") and result.get("error_type") == ERROR_TEMPORARY
+
+
+def is_config_failure(result: Dict) -> bool:
+    """Проверка невозможна из-за настройки сервиса: ключ API не указан или отклонён"""
+    return not result.get("success") and result.get("error_type") == ERROR_CONFIG
+
 
 @dataclass
 class CompanyInfo:
@@ -32,20 +91,66 @@ class CompanyInfo:
     is_active: bool = False
     verification_date: datetime = None
     source: str = "fns_api"
+    
+    @classmethod
+    def from_normalized(cls, data: Dict) -> "CompanyInfo":
+        """Из нормализованных данных проверки (для ИП - ФИО и ОГРНИП)"""
+        try:
+            verification_date = datetime.fromisoformat(data.get("verification_date", ""))
+        except (TypeError, ValueError):
+            verification_date = None
+        return cls(
+            inn=data.get("inn", ""),
+            company_name=data.get("company_name") or data.get("full_name", ""),
+            ogrn=data.get("ogrn") or data.get("ogrn_ip", ""),
+            ogrn_date=data.get("ogrn_date") or data.get("ogrn_ip_date", ""),
+            status=data.get("status", ""),
+            address=data.get("address", ""),
+            okved=data.get("okved", ""),
+            director=data.get("director", ""),
+            is_active=bool(data.get("is_active")),
+            verification_date=verification_date,
+            source=data.get("source", "")
+        )
 
 
 class FNSService:
     """Сервис для работы с API ФНС"""
     
-    def __init__(self):
+    def __init__(self, allow_missing_key: bool = False):
+        """
+        Args:
+            allow_missing_key: Без FNS_API_KEY не падать, а работать в деградированном
+                режиме: отдавать данные из кэша и индекса ЕГР, без запросов к API
+        """
         # Получаем ключ API из переменных окружения
         self.api_key = os.getenv('FNS_API_KEY')
         if not self.api_key:
             logger.error("FNS_API_KEY не установлен в переменных окружения")
-            raise ValueError("Не указан ключ API ФНС")
+            if not allow_missing_key:
+                raise ValueError("Не указан ключ API ФНС")
         
-        self.base_url = "https://api-fns.ru/api"
-        self.session = requests.Session()
+        # Другой адрес - например, локальная заглушка scripts/fake_fns_server.py
+        self.base_url = os.getenv('FNS_API_BASE_URL', 'https://api-fns.ru/api').rstrip('/')
+        self.request_timeout = int(os.getenv('FNS_API_TIMEOUT', 15))
+        # Ответы от этого размера разбираются потоком (нужен пакет ijson)
+        self.stream_parse_min_bytes = int(os.getenv('FNS_STREAM_PARSE_MIN_BYTES', DEFAULT_STREAM_MIN_BYTES))
+        
+        # Пул keep-alive соединений и повторы временных ошибок API
+        self.pool_maxsize = int(os.getenv('FNS_HTTP_POOL_MAXSIZE', 10))
+        self.pool_block = os.getenv('FNS_HTTP_POOL_BLOCK', 'False').lower() in ('true', '1', 't')
+        self._init_session()
+        self.retry_policy = RetryPolicy(
+            max_attempts=1 + int(os.getenv('FNS_API_RETRIES', 2)),
+            base_delay=float(os.getenv('FNS_API_RETRY_BACKOFF', 0.5)),
+            max_delay=float(os.getenv('FNS_API_RETRY_MAX_BACKOFF', 4))
+        )
+        self.retry_stats = {'retries': 0, 'recovered': 0, 'exhausted': 0}
+        self._retry_stats_lock = threading.Lock()
+        
+        # Circuit breaker: таймаут подстраивается под p99, при сбоях API
+        # запросы не отправляются и отдаются данные из кэша
+        self._init_circuit_breaker()
         
         # Настройка Redis для кэширования
         redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379')
@@ -56,99 +161,257 @@ class FNSService:
         except Exception as e:
             logger.warning(f"Redis не доступен: {e}. Будет использоваться in-memory кэш.")
             self.redis_client = None
-            self.memory_cache = {}
         
         # Лимиты API
-        self.daily_limit = int(os.getenv('FNS_API_DAILY_LIMIT', 100))
+        self.rate_per_second = float(os.getenv('FNS_API_RATE_PER_SECOND', 0))
+        self.rate_burst = int(os.getenv('FNS_API_RATE_BURST', 0)) or None
+        self.rate_wait = float(os.getenv('FNS_API_RATE_WAIT', 2))
+        # Гарантированные доли лимита для регистраций и пакетных проверок;
+        # с FNS_QUOTA_LEND_FROM_HOUR резерв постепенно отдаётся остальным
+        self.quota_reserves = {
+            PRIORITY_INTERACTIVE: float(os.getenv('FNS_QUOTA_INTERACTIVE_RESERVE', 0.3)),
+            PRIORITY_BATCH: float(os.getenv('FNS_QUOTA_BATCH_RESERVE', 0.1)),
+        }
+        lend_from_hour = os.getenv('FNS_QUOTA_LEND_FROM_HOUR', '18')
+        self.quota_lend_from_hour = float(lend_from_hour) if lend_from_hour else None
+        self._init_quota(int(os.getenv('FNS_API_DAILY_LIMIT', 100)))
         self.cache_ttl = int(os.getenv('CACHE_TTL', 86400))
         
-        # Статистика использования
-        self.usage_stats = {
-            'today': 0,
-            'last_reset': datetime.now().date()
+        # Stale-while-revalidate: запись старше cache_ttl * refresh_ahead отдаётся
+        # сразу и обновляется в фоне; старше cache_ttl + max_stale - не отдаётся
+        self.refresh_ahead = float(os.getenv('FNS_CACHE_REFRESH_AHEAD', 0.9))
+        self.max_stale = int(os.getenv('FNS_CACHE_MAX_STALE', 6 * 86400))
+        self.refresh_reserve = int(os.getenv('FNS_REFRESH_QUOTA_RESERVE', 10))
+        self.refresh_workers = int(os.getenv('FNS_REFRESH_WORKERS', 2))
+        self._init_refresh_executor()
+        self.refresh_stats = {'scheduled': 0, 'skipped_quota': 0, 'failed': 0}
+        
+        # Короткий кэш отрицательных результатов: "не найден" и временные ошибки
+        self.outcome_ttl = {
+            OUTCOME_OK: self.cache_ttl + self.max_stale,
+            OUTCOME_NOT_FOUND: int(os.getenv('FNS_NOT_FOUND_CACHE_TTL', 3600)),
+            OUTCOME_ERROR: int(os.getenv('FNS_ERROR_CACHE_TTL', 60)),
+        }
+        self.outcome_stats = {
+            outcome: {'hits': 0, 'stores': 0} for outcome in self.outcome_ttl
         }
-        self._load_usage_stats()
+        self._outcome_stats_lock = threading.Lock()
+        
+        # Кэш: L1 в памяти процесса перед Redis
+        self.l1_cache_size = int(os.getenv('FNS_L1_CACHE_SIZE', 10000))
+        self.l1_cache_ttl = int(os.getenv('FNS_L1_CACHE_TTL', 300))
+        self._init_cache()
+        
+        # Локальный индекс ЕГРЮЛ/ЕГРИП из открытых выгрузок
+        self._init_egr_index()
+        
+        # Параллельность массовой проверки
+        self.batch_max_workers = int(os.getenv('FNS_BATCH_MAX_WORKERS', 8))
+        
+        # Объединение одновременных запросов по одному ИНН
+        self.single_flight = SingleFlight()
+        self.distributed_lock = os.getenv('FNS_DISTRIBUTED_LOCK', 'True').lower() in ('true', '1', 't')
+        self._init_redis_single_flight()
+        
+        _instances.add(self)
+    
+    @property
+    def available(self) -> bool:
+        """Можно ли обращаться к API (задан ключ)"""
+        return bool(self.api_key)
+    
+    def _init_session(self):
+        self.session = build_session(pool_maxsize=self.pool_maxsize, pool_block=self.pool_block)
+    
+    def _init_circuit_breaker(self):
+        self.circuit_breaker = CircuitBreaker(
+            failure_rate=float(os.getenv('FNS_CB_FAILURE_RATE', 0.5)),
+            min_requests=int(os.getenv('FNS_CB_MIN_REQUESTS', 10)),
+            consecutive_failures=int(os.getenv('FNS_CB_CONSECUTIVE_FAILURES', 5)),
+            open_seconds=float(os.getenv('FNS_CB_OPEN_SECONDS', 30)),
+            min_timeout=float(os.getenv('FNS_API_MIN_TIMEOUT', 2)),
+            max_timeout=self.request_timeout,
+            timeout_multiplier=float(os.getenv('FNS_API_TIMEOUT_MULTIPLIER', 3))
+        )
+    
+    def _init_refresh_executor(self):
+        self._refresh_executor = ThreadPoolExecutor(
+            max_workers=self.refresh_workers,
+            thread_name_prefix='fns-refresh'
+        )
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+    
+    def _after_fork(self):
+        """
+        Пересоздание ресурсов процесса в дочернем процессе после fork
+        
+        Сокеты HTTP-сессии и Redis, потоки фонового обновления и
+        блокировки, захваченные другими потоками родителя, в дочернем
+        процессе непригодны. Старые сокеты не закрываются: они всё ещё
+        используются родителем. Статистика circuit breaker и L1-кэш
+        начинаются заново.
+        """
+        if self.redis_client:
+            self.redis_client.connection_pool.reset()
+        self._init_session()
+        self._init_circuit_breaker()
+        self._init_refresh_executor()
+        self._retry_stats_lock = threading.Lock()
+        self._outcome_stats_lock = threading.Lock()
+        self._init_quota(self.daily_limit)
+        self._init_cache()
+        self._init_egr_index()
+        self.single_flight = SingleFlight()
+        self._init_redis_single_flight()
+    
+    def max_request_seconds(self) -> float:
+        """
+        Самое долгое выполнение запроса к API с повторами
+
+        Каждая попытка - ожидание лимита в секунду и таймаут запроса,
+        между попытками - наибольшие задержки повторов.
+        """
+        policy = self.retry_policy
+        return policy.max_attempts * (self.request_timeout + self.rate_wait) + policy.max_total_delay()
+    
+    def _init_redis_single_flight(self):
+        """
+        Межпроцессное объединение запросов (только с Redis)
+        
+        Блокировка живёт дольше запроса со всеми повторами: иначе она
+        истекает посреди повторов и ожидающие воркеры идут в API сами.
+        """
+        self.redis_single_flight = None
+        if self.redis_client and self.distributed_lock:
+            lock_ttl = self.max_request_seconds() + SINGLE_FLIGHT_MARGIN
+            self.redis_single_flight = RedisSingleFlight(
+                self.redis_client,
+                lock_ttl=lock_ttl,
+                wait_timeout=lock_ttl
+            )
+    
+    def _init_egr_index(self):
+        """Индекс выгрузок ЕГР (scripts/import_egr_dump.py), если настроен"""
+        path = os.getenv('FNS_EGR_INDEX_PATH')
+        self.egr_index = None
+        if path:
+            self.egr_index = EGRIndex(path, max_age_days=float(os.getenv('FNS_EGR_INDEX_MAX_AGE_DAYS', 45)))
+            if not os.path.exists(path):
+                logger.warning(f"Индекс ЕГР {path} не найден, проверки идут через API")
     
     def _get_cache_key(self, inn: str) -> str:
-        """Генерация ключа для кэша"""
-        return f"fns:{hashlib.md5(inn.encode()).hexdigest()}"
+        """Генерация ключа для кэша (fns:cache:<поколение>:<md5>)"""
+        return self.cache_namespace.key(hashlib.md5(inn.encode()).hexdigest())
+    
+    def _init_cache(self):
+        """
+        Создание двухуровневого кэша
+        
+        С Redis L1 держит записи не дольше FNS_L1_CACHE_TTL, чтобы воркеры
+        не расходились надолго; без Redis L1 - единственный уровень и
+        хранит записи вместе с допустимым устареванием.
+        """
+        storage_ttl = self.outcome_ttl[OUTCOME_OK]
+        l1_ttl = min(self.l1_cache_ttl, storage_ttl) if self.redis_client else storage_ttl
+        codec = get_codec(
+            os.getenv('FNS_CACHE_CODEC', 'msgpack'),
+            compression=os.getenv('FNS_CACHE_COMPRESSION', 'zlib'),
+            threshold=int(os.getenv('FNS_CACHE_COMPRESS_THRESHOLD', 512))
+        )
+        self.cache = TwoTierCache(
+            TTLLRUCache(maxsize=self.l1_cache_size, ttl=l1_ttl),
+            self.redis_client,
+            codec
+        )
+        self.cache_namespace = CacheNamespace(
+            self.redis_client,
+            refresh_interval=float(os.getenv('FNS_CACHE_GENERATION_REFRESH', 5))
+        )
     
-    def _save_to_cache(self, inn: str, data: Dict):
-        """Сохранение данных в кэш"""
+    def _save_to_cache(self, inn: str, data: Optional[Dict], outcome: str = OUTCOME_OK, error: str = ""):
+        """
+        Сохранение результата проверки в кэш
+        
+        Args:
+            inn: ИНН
+            data: Нормализованные данные (для OUTCOME_OK)
+            outcome: Исход проверки; от него зависит время хранения
+            error: Текст ошибки для отрицательных исходов
+        """
         cache_key = self._get_cache_key(inn)
         cache_data = {
             'data': data,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': datetime.now().isoformat(),
+            'outcome': outcome
         }
+        if error:
+            cache_data['error'] = error
         
         try:
-            if self.redis_client:
-                self.redis_client.setex(
-                    cache_key,
-                    self.cache_ttl,
-                    json.dumps(cache_data, ensure_ascii=False)
-                )
-            else:
-                self.memory_cache[cache_key] = cache_data
+            # Неудачное обновление не затирает ещё пригодные данные
+            if outcome == OUTCOME_ERROR and self._usable_entry(self.cache.get(cache_key)):
+                return
+            self.cache.set(cache_key, cache_data, self.outcome_ttl[outcome])
+            self._count_outcome(outcome, 'stores')
         except Exception as e:
             logger.error(f"Ошибка сохранения в кэш: {e}")
     
+    def _count_outcome(self, outcome: str, counter: str):
+        """Учёт статистики кэша по исходам"""
+        with self._outcome_stats_lock:
+            self.outcome_stats[outcome][counter] += 1
+    
     def _get_from_cache(self, inn: str) -> Optional[Dict]:
         """Получение данных из кэша"""
         cache_key = self._get_cache_key(inn)
         
         try:
-            if self.redis_client:
-                cached = self.redis_client.get(cache_key)
-                if cached:
-                    return json.loads(cached)
-            else:
-                return self.memory_cache.get(cache_key)
+            return self.cache.get(cache_key)
         except Exception as e:
             logger.error(f"Ошибка чтения из кэша: {e}")
         
         return None
     
-    def _load_usage_stats(self):
-        """Загрузка статистики использования из кэша"""
-        try:
-            if self.redis_client:
-                stats = self.redis_client.get('fns:usage_stats')
-                if stats:
-                    self.usage_stats = json.loads(stats)
-                    # Проверяем, не сбросить ли счетчик на новый день
-                    last_reset = datetime.fromisoformat(self.usage_stats['last_reset']).date()
-                    if last_reset < datetime.now().date():
-                        self.usage_stats = {
-                            'today': 0,
-                            'last_reset': datetime.now().date().isoformat()
-                        }
-                        self._save_usage_stats()
-        except Exception as e:
-            logger.error(f"Ошибка загрузки статистики: {e}")
+    def _init_quota(self, daily_limit: int):
+        """
+        Создание лимитера запросов к API
+        
+        С Redis счётчик общий для всех воркеров и обновляется атомарно,
+        без Redis - счётчик процесса.
+        """
+        priority_settings = {
+            'reserves': self.quota_reserves,
+            'lend_from_hour': self.quota_lend_from_hour,
+        }
+        if self.redis_client:
+            self.quota = RedisQuotaLimiter(
+                self.redis_client, daily_limit, self.rate_per_second, self.rate_burst, **priority_settings
+            )
+        else:
+            self.quota = InMemoryQuotaLimiter(
+                daily_limit, self.rate_per_second, self.rate_burst, **priority_settings
+            )
     
-    def _save_usage_stats(self):
-        """Сохранение статистики использования"""
-        try:
-            if self.redis_client:
-                self.redis_client.setex(
-                    'fns:usage_stats',
-                    86400,  # 24 часа
-                    json.dumps(self.usage_stats, default=str)
-                )
-        except Exception as e:
-            logger.error(f"Ошибка сохранения статистики: {e}")
+    @property
+    def daily_limit(self) -> int:
+        """Дневной лимит запросов к API"""
+        return self.quota.daily_limit
     
-    def _increment_usage(self):
-        """Увеличение счетчика использования"""
-        self.usage_stats['today'] += 1
-        self._save_usage_stats()
-        
-        # Логирование при приближении к лимиту
-        if self.usage_stats['today'] >= self.daily_limit * 0.8:
-            logger.warning(f"Использовано {self.usage_stats['today']} из {self.daily_limit} запросов к API ФНС")
+    @daily_limit.setter
+    def daily_limit(self, value: int):
+        self.quota.daily_limit = value
+    
+    @property
+    def usage_stats(self) -> Dict:
+        """Использование лимита за сегодня"""
+        return {
+            'today': self.quota.used_today(),
+            'last_reset': self.quota.today()
+        }
     
-    def validate_inn_format(self, inn: str) -> Tuple[bool, str]:
+    @staticmethod
+    def validate_inn_format(inn: str) -> Tuple[bool, str]:
         """
         Валидация формата ИНН
         
@@ -198,17 +461,21 @@ class FNSService:
         
         return True, ""
     
-    def check_inn(self, inn: str, force_refresh: bool = False) -> Dict:
+    def check_inn(self, inn: str, force_refresh: bool = False,
+                  priority: str = PRIORITY_INTERACTIVE) -> Dict:
         """
         Проверка ИНН через API ФНС
         
         Args:
             inn: ИНН для проверки
             force_refresh: Игнорировать кэш и сделать новый запрос
+            priority: Класс трафика для учёта лимита (interactive, batch, background)
             
         Returns:
             Dict: Результат проверки
         """
+        validate_priority(priority)
+        
         # Проверка формата ИНН
         is_valid, error_message = self.validate_inn_format(inn)
         if not is_valid:
@@ -219,239 +486,736 @@ class FNSService:
                 "cached": False
             }
         
-        # Проверка кэша (если не force_refresh)
+        # Проверка кэша и локального индекса (если не force_refresh)
         if not force_refresh:
-            cached_data = self._get_from_cache(inn)
-            if cached_data:
-                logger.info(f"ИНН {inn} найден в кэше")
-                return {
-                    "success": True,
-                    "data": cached_data['data'],
-                    "inn": inn,
-                    "cached": True
-                }
+            local_result = self._local_result(inn)
+            if local_result:
+                logger.info(f"ИНН {inn} найден в {'кэше' if local_result['cached'] else 'индексе ЕГР'}")
+                return local_result
         
-        # Проверка лимитов API
-        if self.usage_stats['today'] >= self.daily_limit:
-            logger.error(f"Достигнут дневной лимит API: {self.usage_stats['today']}/{self.daily_limit}")
-            return {
+        return self._coalesced_request(inn, force_refresh, priority)
+    
+    def _local_result(self, inn: str) -> Optional[Dict]:
+        """Результат без обращения к API: из кэша, затем из индекса ЕГР"""
+        return self._cached_result(inn) or self._index_result(inn)
+    
+    def _index_result(self, inn: str) -> Optional[Dict]:
+        """
+        Результат из локального индекса ЕГР
+        
+        Индекс старше FNS_EGR_INDEX_MAX_AGE_DAYS не используется. Найденная
+        запись кладётся в кэш как обычный ответ API; дата выгрузки - в
+        index_imported_at (время записи кэша - время чтения из индекса,
+        чтобы запись жила в кэше обычный срок). ИНН, которого нет
+        в индексе, проверяется через API: выгрузка может быть неполной.
+        """
+        if self.egr_index is None or not self.egr_index.is_fresh():
+            return None
+        
+        record = self.egr_index.lookup(inn)
+        if record is None:
+            return None
+        
+        normalized_data = self._normalize_response(record, inn)
+        normalized_data["source"] = "egr_index"
+        normalized_data["index_imported_at"] = self.egr_index.imported_at()
+        self._save_to_cache(inn, normalized_data)
+        return {
+            "success": True,
+            "data": normalized_data,
+            "inn": inn,
+            "cached": False
+        }
+    
+    def _cached_result(self, inn: str, not_before: Optional[str] = None) -> Optional[Dict]:
+        """
+        Результат проверки из кэша
+        
+        Args:
+            inn: ИНН
+            not_before: Не принимать записи, сохранённые раньше этого момента (ISO)
+        """
+        cached_data = self._get_from_cache(inn)
+        if not cached_data:
+            return None
+        if not_before and cached_data.get('timestamp', '') < not_before:
+            return None
+        
+        outcome = cached_data.get('outcome', OUTCOME_OK)
+        if outcome == OUTCOME_OK:
+            age = self._entry_age(cached_data)
+            if age > self.cache_ttl + self.max_stale:
+                return None
+            if age >= self.cache_ttl * self.refresh_ahead:
+                self._schedule_refresh(inn)
+        
+        self._count_outcome(outcome, 'hits')
+        if outcome != OUTCOME_OK:
+            result = {
                 "success": False,
-                "error": "Достигнут дневной лимит проверок. Попробуйте завтра.",
+                "error": cached_data.get('error', ''),
                 "inn": inn,
-                "cached": False
+                "cached": True
             }
+            # В кэш ошибки попадают только временные (_transient_error)
+            if outcome == OUTCOME_ERROR:
+                result["error_type"] = ERROR_TEMPORARY
+            return result
+        return {
+            "success": True,
+            "data": cached_data['data'],
+            "inn": inn,
+            "cached": True
+        }
+    
+    def _entry_age(self, cached_data: Dict) -> float:
+        """Возраст записи кэша в секундах"""
+        try:
+            saved_at = datetime.fromisoformat(cached_data['timestamp'])
+        except (KeyError, TypeError, ValueError):
+            return float('inf')
+        return (datetime.now() - saved_at).total_seconds()
+    
+    def _usable_entry(self, cached_data: Optional[Dict]) -> bool:
+        """Есть ли в записи успешный результат, который ещё можно отдавать"""
+        return bool(
+            cached_data
+            and cached_data.get('outcome', OUTCOME_OK) == OUTCOME_OK
+            and self._entry_age(cached_data) <= self.cache_ttl + self.max_stale
+        )
+    
+    def _schedule_refresh(self, inn: str):
+        """
+        Фоновое обновление записи, близкой к истечению
+        
+        Обновление идёт с фоновым приоритетом и не запускается, если фоновым
+        задачам осталось не больше FNS_REFRESH_QUOTA_RESERVE запросов.
+        """
+        with self._refresh_lock:
+            if inn in self._refreshing:
+                return
+            if self.quota.remaining(PRIORITY_BACKGROUND) <= self.refresh_reserve:
+                self.refresh_stats['skipped_quota'] += 1
+                return
+            self._refreshing.add(inn)
+            self.refresh_stats['scheduled'] += 1
         
+        logger.info(f"Фоновое обновление данных ИНН: {inn}")
+        self._refresh_executor.submit(self._refresh, inn)
+    
+    def _refresh(self, inn: str):
+        """Обновление записи кэша из API"""
         try:
-            # Формирование запроса к API ФНС
-            url = f"{self.base_url}/egr"
-            params = {
-                "req": inn,
-                "key": self.api_key
-            }
-            
-            logger.info(f"Запрос к API ФНС для ИНН: {inn}")
-            
-            # Отправка запроса
-            response = self.session.get(url, params=params, timeout=15)
+            result = self._coalesced_request(inn, force_refresh=True, priority=PRIORITY_BACKGROUND)
+            if not result["success"]:
+                self.refresh_stats['failed'] += 1
+        except Exception as e:
+            self.refresh_stats['failed'] += 1
+            logger.error(f"Ошибка фонового обновления ИНН {inn}: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(inn)
+    
+    def _coalesced_request(self, inn: str, force_refresh: bool = False,
+                           priority: str = PRIORITY_INTERACTIVE) -> Dict:
+        """
+        Запрос к API, объединённый с одновременными запросами того же ИНН
+        
+        В пределах процесса запрос выполняет первый вызов, остальные получают
+        его результат. С Redis объединение распространяется на все воркеры:
+        владелец блокировки повторно смотрит в кэш, остальные ждут появления
+        результата в кэше. Лимит расходует только фактический запрос.
+        """
+        def fetch() -> Dict:
+            if self.redis_single_flight is None:
+                return self._limited_request(inn, priority)
             
-            # Увеличиваем счетчик использования
-            self._increment_usage()
+            not_before = datetime.now().isoformat() if force_refresh else None
+            lookup = lambda: self._cached_result(inn, not_before)
+            result, _ = self.redis_single_flight.do(
+                inn,
+                lambda: lookup() or self._limited_request(inn, priority),
+                lookup
+            )
+            return result
+        
+        result, shared = self.single_flight.do(inn, fetch)
+        if shared:
+            logger.info(f"ИНН {inn}: использован результат одновременного запроса")
+            result = dict(result)
+        return result
+    
+    def _limited_request(self, inn: str, priority: str = PRIORITY_INTERACTIVE) -> Dict:
+        """
+        Запрос к API с проверкой circuit breaker и дневного лимита
+        
+        Временные ошибки (таймаут, сеть, 5xx, 429) повторяются с
+        экспоненциальной задержкой. Каждая попытка - отдельный запрос
+        к API, поэтому заново проходит circuit breaker и занимает лимит;
+        если повтор не пропущен, возвращается результат последней попытки.
+        """
+        if not self.available:
+            return self._unavailable_result(inn)
+        
+        attempt = 0
+        while True:
+            attempt += 1
+            if not self.circuit_breaker.allow_request():
+                if attempt > 1:
+                    break
+                return self._circuit_open_result(inn)
             
-            # Проверка статуса ответа
-            if response.status_code != 200:
-                logger.error(f"Ошибка API ФНС: {response.status_code} - {response.text}")
-                return {
-                    "success": False,
-                    "error": f"Ошибка API ФНС: {response.status_code}",
-                    "inn": inn,
-                    "cached": False
-                }
+            # Занимаем запрос в лимите до обращения к API
+            decision = self.quota.acquire(timeout=self.rate_wait, priority=priority)
+            if not decision.allowed:
+                self.circuit_breaker.release()
+                if attempt > 1:
+                    break
+                return self._quota_error(inn, decision)
             
-            # Парсинг ответа
             try:
-                data = response.json()
-            except json.JSONDecodeError:
-                logger.error(f"Некорректный JSON от API ФНС: {response.text}")
+                status_code, body, error = self._request_api(inn)
+            except Exception as e:
+                self.circuit_breaker.release()
+                logger.error(f"Неожиданная ошибка при проверке ИНН {inn}: {str(e)}")
                 return {
                     "success": False,
-                    "error": "Некорректный ответ от сервера ФНС",
+                    "error": f"Внутренняя ошибка: {str(e)}",
                     "inn": inn,
                     "cached": False
                 }
             
-            # Обработка ответа
-            if not data:
-                return {
-                    "success": False,
-                    "error": "ИНН не найден в реестре ФНС",
-                    "inn": inn,
-                    "cached": False
-                }
+            retryable = self.retry_policy.is_retryable(status_code)
+            if not retryable or attempt >= self.retry_policy.max_attempts:
+                break
             
-            # Нормализация данных
-            normalized_data = self._normalize_response(data, inn)
-            
-            # Сохранение в кэш
-            self._save_to_cache(inn, normalized_data)
-            
-            logger.info(f"Успешная проверка ИНН: {inn}")
+            delay = self.retry_policy.delay(attempt)
+            self._count_retry('retries')
+            logger.warning(f"ИНН {inn}: временная ошибка API ({error or status_code}), "
+                           f"повтор {attempt} через {delay:.2f} с")
+            time.sleep(delay)
+        
+        if attempt > 1:
+            self._count_retry('exhausted' if retryable else 'recovered')
+        
+        if status_code is None:
+            return self._transient_error(inn, error)
+        return self._handle_api_response(inn, status_code, body)
+    
+    def _count_retry(self, counter: str):
+        with self._retry_stats_lock:
+            self.retry_stats[counter] += 1
+    
+    def _unavailable_result(self, inn: str) -> Dict:
+        """Ответ без ключа API: проверка возможна только по кэшу и индексу"""
+        return {
+            "success": False,
+            "error": "Проверка через API ФНС недоступна: не указан ключ API",
+            "error_type": ERROR_CONFIG,
+            "inn": inn,
+            "cached": False
+        }
+    
+    def _circuit_open_result(self, inn: str) -> Dict:
+        """
+        Ответ при разомкнутой цепи: данные из кэша любой давности
+        в пределах хранения или быстрый отказ
+        """
+        cached_data = self._get_from_cache(inn)
+        if cached_data and cached_data.get('outcome', OUTCOME_OK) == OUTCOME_OK:
+            logger.warning(f"API ФНС недоступен, ИНН {inn} отдан из устаревшего кэша")
             return {
                 "success": True,
-                "data": normalized_data,
+                "data": cached_data['data'],
                 "inn": inn,
-                "cached": False
+                "cached": True
+            }
+        
+        logger.warning(f"API ФНС недоступен, проверка ИНН {inn} отклонена")
+        return {
+            "success": False,
+            "error": "Сервис ФНС временно недоступен. Повторите попытку позже.",
+            "error_type": ERROR_TEMPORARY,
+            "inn": inn,
+            "cached": False
+        }
+    
+    def _record_call(self, started_at: float, status_code: Optional[int] = None):
+        """
+        Учёт исхода запроса в circuit breaker
+        
+        Сбоем считаются таймауты, ошибки сети, 5xx и 429 (status_code=None -
+        запрос не получил ответа).
+        """
+        latency = time.perf_counter() - started_at
+        if RetryPolicy.is_retryable(status_code):
+            self.circuit_breaker.record_failure(latency)
+        else:
+            self.circuit_breaker.record_success(latency)
+    
+    def _quota_error(self, inn: str, decision: QuotaDecision) -> Dict:
+        """Ответ при отказе лимитера"""
+        if decision.reason == REASON_RATE:
+            logger.warning(f"Превышена частота запросов к API ФНС для ИНН: {inn}")
+            error = "Слишком много проверок одновременно. Повторите через несколько секунд."
+        elif decision.reason == REASON_RESERVED:
+            logger.warning(f"ИНН {inn}: остаток лимита API зарезервирован для запросов выше приоритетом")
+            error = "Лимит проверок для этого типа запросов на сегодня исчерпан."
+        else:
+            logger.error(f"Достигнут дневной лимит API: {decision.used}/{self.daily_limit}")
+            error = "Достигнут дневной лимит проверок. Попробуйте завтра."
+        return {
+            "success": False,
+            "error": error,
+            "error_type": ERROR_TEMPORARY,
+            "inn": inn,
+            "cached": False
+        }
+    
+    def _request_api(self, inn: str) -> Tuple[Optional[int], bytes, str]:
+        """
+        Один запрос к API ФНС; запрос должен быть уже учтён в лимите
+        
+        Args:
+            inn: ИНН, уже прошедший валидацию формата
+            
+        Returns:
+            Tuple[Optional[int], bytes, str]: (HTTP статус или None без ответа,
+            тело ответа, описание ошибки сети)
+        """
+        started_at = time.perf_counter()
+        try:
+            # Формирование запроса к API ФНС
+            url = f"{self.base_url}/egr"
+            params = {
+                "req": inn,
+                "key": self.api_key
             }
             
+            logger.info(f"Запрос к API ФНС для ИНН: {inn}")
+            
+            # Отправка запроса (уже учтён в лимите)
+            response = self.session.get(url, params=params, timeout=self.circuit_breaker.timeout())
+            self._record_call(started_at, response.status_code)
+            return response.status_code, response.content, ""
+            
         except requests.exceptions.Timeout:
+            self._record_call(started_at)
             logger.error(f"Таймаут при проверке ИНН: {inn}")
-            return {
-                "success": False,
-                "error": "Таймаут при обращении к серверу ФНС",
-                "inn": inn,
-                "cached": False
-            }
+            return None, b"", "Таймаут при обращении к серверу ФНС"
         except requests.exceptions.RequestException as e:
+            self._record_call(started_at)
             logger.error(f"Ошибка сети при проверке ИНН {inn}: {str(e)}")
-            return {
+            return None, b"", f"Ошибка сети: {str(e)}"
+    
+    def _handle_api_response(self, inn: str, status_code: int, body: Union[bytes, str]) -> Dict:
+        """
+        Разбор ответа API ФНС
+        
+        Общая часть для синхронного и асинхронного клиентов. Из тела
+        извлекаются только нужные поля (см. fns_response).
+        
+        Args:
+            inn: ИНН
+            status_code: HTTP статус ответа
+            body: Тело ответа
+            
+        Returns:
+            Dict: Результат проверки
+        """
+        # Проверка статуса ответа
+        if status_code != 200:
+            logger.error(f"Ошибка API ФНС: {status_code} - {_body_preview(body)}")
+            error = f"Ошибка API ФНС: {status_code}"
+            if status_code >= 500 or status_code == 429:
+                return self._transient_error(inn, error)
+            result = {
                 "success": False,
-                "error": f"Ошибка сети: {str(e)}",
+                "error": error,
                 "inn": inn,
                 "cached": False
             }
-        except Exception as e:
-            logger.error(f"Неожиданная ошибка при проверке ИНН {inn}: {str(e)}")
+            if status_code in (401, 403):
+                result["error_type"] = ERROR_CONFIG
+            return result
+        
+        # Парсинг ответа
+        try:
+            records = parse_records(body, self.stream_parse_min_bytes)
+        except ValueError:
+            logger.error(f"Некорректный JSON от API ФНС: {_body_preview(body)}")
+            return self._transient_error(inn, "Некорректный ответ от сервера ФНС")
+        
+        # Обработка ответа
+        if not records:
+            error = NOT_FOUND_ERROR
+            self._save_to_cache(inn, None, OUTCOME_NOT_FOUND, error)
             return {
                 "success": False,
-                "error": f"Внутренняя ошибка: {str(e)}",
+                "error": error,
                 "inn": inn,
                 "cached": False
             }
+        
+        # Нормализация данных
+        normalized_data = normalize_records(records, inn)
+        
+        # Сохранение в кэш
+        self._save_to_cache(inn, normalized_data)
+        
+        logger.info(f"Успешная проверка ИНН: {inn}")
+        return {
+            "success": True,
+            "data": normalized_data,
+            "inn": inn,
+            "cached": False
+        }
     
-    def _normalize_response(self, data: Dict, inn: str) -> Dict:
+    def _transient_error(self, inn: str, error: str) -> Dict:
+        """
+        Временная ошибка API (таймаут, сеть, 5xx, 429)
+        
+        Кэшируется на FNS_ERROR_CACHE_TTL, чтобы повторы бота
+        не расходовали лимит на заведомо неудачные запросы.
+        """
+        self._save_to_cache(inn, None, OUTCOME_ERROR, error)
+        return {
+            "success": False,
+            "error": error,
+            "error_type": ERROR_TEMPORARY,
+            "inn": inn,
+            "cached": False
+        }
+    
+    def _normalize_response(self, data: Union[Dict, List[Dict]], inn: str) -> Dict:
         """
         Нормализация ответа от API ФНС
         
+        Если в ответе несколько записей, основной берётся действующая
+        с самой поздней датой регистрации, остальные - в other_records.
+        
         Args:
-            data: Сырые данные от API
+            data: Сырые данные от API (запись или список записей)
             inn: ИНН
             
         Returns:
             Dict: Нормализованные данные
         """
-        # Если ответ содержит массив, берем первый элемент
-        if isinstance(data, list):
-            data = data[0] if data else {}
-        
-        # Определение типа организации
-        org_type = "Юридическое лицо" if len(inn) == 10 else "Индивидуальный предприниматель"
-        
-        # Базовые данные
-        normalized = {
-            "inn": inn,
-            "org_type": org_type,
-            "verification_date": datetime.now().isoformat(),
-            "source": "api_fns"
-        }
-        
-        # Для юр.лиц
-        if "НаимЮЛ" in data:
-            normalized.update({
-                "company_name": data.get("НаимЮЛ", "").strip(),
-                "short_name": data.get("СокрНаимЮЛ", ""),
-                "ogrn": data.get("ОГРН", ""),
-                "ogrn_date": data.get("ДатаОГРН", ""),
-                "status": data.get("Статус", ""),
-                "address": data.get("Адрес", ""),
-                "okved": data.get("ОКВЭД", ""),
-                "okved_desc": data.get("ТекстОКВЭД", ""),
-                "director": data.get("Руководитель", ""),
-                "founders": data.get("Учредители", ""),
-                "authorized_capital": data.get("УстКап", ""),
-            })
-        # Для ИП
-        elif "ФИО" in data:
-            normalized.update({
-                "full_name": data.get("ФИО", "").strip(),
-                "ogrn_ip": data.get("ОГРНИП", ""),
-                "ogrn_ip_date": data.get("ДатаОГРНИП", ""),
-                "status": data.get("Статус", ""),
-                "address": data.get("Адрес", ""),
-                "okved": data.get("ОКВЭД", ""),
-                "okved_desc": data.get("ТекстОКВЭД", ""),
-            })
-        else:
-            # Если формат неизвестен, сохраняем сырые данные
-            normalized["raw_data"] = data
-        
-        # Определение статуса активности
-        status = normalized.get("status", "").lower()
-        normalized["is_active"] = any(active_word in status for active_word in ["действ", "действующ"])
-        
-        return normalized
+        return normalize_records(records_from_data(data), inn)
     
-    def batch_check(self, inns: List[str]) -> Dict:
+    def batch_check(self, inns: List[str], max_workers: Optional[int] = None,
+                    priority: str = PRIORITY_BATCH) -> Dict:
         """
         Массовая проверка ИНН
         
+        Сначала без сетевых запросов отрабатываются ошибки формата, попадания
+        в кэш и в индекс ЕГР, затем оставшиеся ИНН проверяются через API в пуле потоков.
+        В API уходит не больше запросов, чем осталось в дневном лимите
+        классу priority, повторяющиеся ИНН запрашиваются один раз.
+        
         Args:
             inns: Список ИНН для проверки
+            max_workers: Размер пула потоков (по умолчанию FNS_BATCH_MAX_WORKERS)
+            priority: Класс трафика для учёта лимита
             
         Returns:
-            Dict: Результаты проверки
+            Dict: Результаты проверки в порядке входного списка
         """
-        results = []
-        successful = 0
-        failed = 0
+        validate_priority(priority)
+        started_at = time.perf_counter()
+        results: List[Optional[Dict]] = [None] * len(inns)
+        pending: Dict[str, List[int]] = {}
+        cache_hits = 0
+        index_hits = 0
         
-        for inn in inns:
-            result = self.check_inn(inn)
-            results.append(result)
+        # Этап 1: формат, кэш и индекс ЕГР, без обращений к API
+        for index, inn in enumerate(inns):
+            if inn in pending:
+                pending[inn].append(index)
+                continue
             
-            if result["success"]:
-                successful += 1
+            lookup_started = time.perf_counter()
+            is_valid, error_message = self.validate_inn_format(inn)
+            if not is_valid:
+                result = {
+                    "success": False,
+                    "error": error_message,
+                    "inn": inn,
+                    "cached": False
+                }
             else:
-                failed += 1
+                result = self._local_result(inn)
+                if not result:
+                    pending[inn] = [index]
+                    continue
+                if result["cached"]:
+                    cache_hits += 1
+                else:
+                    index_hits += 1
+            result["latency_ms"] = round((time.perf_counter() - lookup_started) * 1000, 2)
+            results[index] = result
+        
+        # Этап 2: запросы к API в пределах оставшегося лимита
+        available = self.quota.remaining(priority)
+        to_dispatch = list(pending)[:available]
+        skipped = list(pending)[available:]
+        
+        if skipped:
+            logger.warning(f"Дневной лимит API: {len(skipped)} ИНН из пакета не будут проверены")
+        for inn in skipped:
+            for index in pending[inn]:
+                results[index] = dict(self._skipped_by_limit(inn), latency_ms=0.0)
+        
+        if to_dispatch:
+            workers = min(max_workers or self.batch_max_workers, len(to_dispatch))
+            with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+                futures = {pool.submit(self._timed_request, inn, priority): inn for inn in to_dispatch}
+                for future in as_completed(futures):
+                    inn = futures[future]
+                    result, latency_ms = future.result()
+                    for index in pending[inn]:
+                        results[index] = dict(result, latency_ms=latency_ms)
+        
+        successful = sum(1 for result in results if result["success"])
         
         return {
             "total": len(inns),
             "successful": successful,
-            "failed": failed,
+            "failed": len(inns) - successful,
+            "cache_hits": cache_hits,
+            "index_hits": index_hits,
+            "api_requests": len(to_dispatch),
+            "skipped_by_limit": len(skipped),
+            "wall_time_ms": round((time.perf_counter() - started_at) * 1000, 2),
             "results": results,
-            "usage_today": self.usage_stats['today'],
+            "usage_today": self.quota.used_today(),
             "daily_limit": self.daily_limit
         }
     
+    def _timed_request(self, inn: str, priority: str = PRIORITY_INTERACTIVE) -> Tuple[Dict, float]:
+        """Запрос к API с замером времени выполнения (мс)"""
+        request_started = time.perf_counter()
+        result = self._coalesced_request(inn, priority=priority)
+        return result, round((time.perf_counter() - request_started) * 1000, 2)
+    
+    def _skipped_by_limit(self, inn: str) -> Dict:
+        """Результат для ИНН, не отправленного в API из-за дневного лимита (skipped=True)"""
+        return {
+            "success": False,
+            "error": "Достигнут дневной лимит проверок. Попробуйте завтра.",
+            "error_type": ERROR_TEMPORARY,
+            "skipped": True,
+            "inn": inn,
+            "cached": False
+        }
+    
+    def batch_check_iter(self, inns: Iterable[str], chunk_size: int = 500,
+                         max_workers: Optional[int] = None,
+                         priority: str = PRIORITY_BATCH) -> Iterator[Dict]:
+        """
+        Потоковая массовая проверка ИНН
+        
+        Вход читается частями по chunk_size, поэтому память не зависит от его
+        размера. В каждой части сначала отдаются ошибки формата и попадания
+        в кэш и индекс ЕГР, затем ответы API по мере готовности. В API уходит
+        не больше запросов, чем осталось в дневном лимите классу priority;
+        повторяющиеся в части ИНН запрашиваются один раз.
+        
+        Args:
+            inns: ИНН (список, генератор строк файла и т.п.)
+            chunk_size: Размер части входа
+            max_workers: Размер пула потоков (по умолчанию FNS_BATCH_MAX_WORKERS)
+            priority: Класс трафика для учёта лимита
+            
+        Yields:
+            Dict: Результат проверки с позицией ИНН во входе (index) и latency_ms;
+                у не отправленных из-за лимита - skipped=True
+        """
+        validate_priority(priority)
+        iterator = iter(inns)
+        offset = 0
+        pool = ThreadPoolExecutor(max_workers=max(1, max_workers or self.batch_max_workers))
+        try:
+            while True:
+                chunk = list(itertools.islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                
+                # Без обращений к API
+                pending: Dict[str, List[int]] = {}
+                for index, inn in enumerate(chunk, offset):
+                    if inn in pending:
+                        pending[inn].append(index)
+                        continue
+                    
+                    lookup_started = time.perf_counter()
+                    is_valid, error_message = self.validate_inn_format(inn)
+                    if is_valid:
+                        result = self._local_result(inn)
+                        if not result:
+                            pending[inn] = [index]
+                            continue
+                    else:
+                        result = {
+                            "success": False,
+                            "error": error_message,
+                            "inn": inn,
+                            "cached": False
+                        }
+                    latency_ms = round((time.perf_counter() - lookup_started) * 1000, 2)
+                    yield dict(result, index=index, latency_ms=latency_ms)
+                offset += len(chunk)
+                
+                # Запросы к API в пределах оставшегося лимита
+                available = self.quota.remaining(priority)
+                for inn in list(pending)[available:]:
+                    for index in pending[inn]:
+                        yield dict(self._skipped_by_limit(inn), index=index, latency_ms=0.0)
+                
+                futures = {
+                    pool.submit(self._timed_request, inn, priority): inn
+                    for inn in list(pending)[:available]
+                }
+                for future in as_completed(futures):
+                    inn = futures[future]
+                    result, latency_ms = future.result()
+                    for index in pending[inn]:
+                        yield dict(result, index=index, latency_ms=latency_ms)
+        finally:
+            # Клиент мог отключиться: неначатые запросы отменяются
+            pool.shutdown(wait=False, cancel_futures=True)
+    
     def get_usage_stats(self) -> Dict:
         """Получение статистики использования API"""
+        used_today = self.quota.used_today()
         return {
-            "used_today": self.usage_stats['today'],
+            "available": self.available,
+            "used_today": used_today,
             "daily_limit": self.daily_limit,
-            "remaining": self.daily_limit - self.usage_stats['today'],
-            "last_reset": self.usage_stats['last_reset']
+            "remaining": max(0, self.daily_limit - used_today),
+            "last_reset": self.quota.today(),
+            "rate_per_second": self.rate_per_second,
+            "by_priority": self._priority_stats(),
+            "cache": self.cache.get_stats(),
+            "cache_by_outcome": {
+                outcome: dict(counters, ttl=self.outcome_ttl[outcome])
+                for outcome, counters in self.outcome_stats.items()
+            },
+            "circuit_breaker": self.circuit_breaker.get_stats(),
+            "transport": dict(
+                connection_stats(self.session),
+                pool_maxsize=self.pool_maxsize,
+                max_attempts=self.retry_policy.max_attempts,
+                **self.retry_stats
+            ),
+            "refresh": dict(self.refresh_stats, in_progress=len(self._refreshing)),
+            "egr_index": self.egr_index.get_stats() if self.egr_index else {"enabled": False},
+            "coalesced_requests": self.single_flight.shared + (
+                self.redis_single_flight.shared if self.redis_single_flight else 0
+            )
+        }
+    
+    def _priority_stats(self) -> Dict:
+        """Использование, резерв и остаток лимита по классам трафика"""
+        used = self.quota.used_by_priority()
+        reserved = self.quota.reserved()
+        return {
+            priority: {
+                "used": used.get(priority, 0),
+                "reserved": reserved.get(priority, 0),
+                "remaining": self.quota.remaining(priority)
+            }
+            for priority in PRIORITIES
         }
     
-    def clear_cache(self, inn: str = None):
-        """Очистка кэша"""
+    def clear_cache(self, inn: str = None, purge: bool = True, batch_size: int = 500) -> Dict:
+        """
+        Очистка кэша
+        
+        Полная очистка переключает поколение ключей (один INCR), после чего
+        записи старых поколений удаляются через SCAN/UNLINK пачками; другие
+        воркеры видят новое поколение в пределах FNS_CACHE_GENERATION_REFRESH.
+        Ключи лимита (fns:quota:*) и блокировок не затрагиваются.
+        
+        Очистка по ИНН удаляет запись из Redis и из кэша в памяти только этого
+        процесса: другие воркеры отдают свою копию, пока она не истечёт
+        (FNS_L1_CACHE_TTL). Чтобы сбросить запись во всех воркерах сразу,
+        нужна полная очистка.
+        
+        Args:
+            inn: ИНН, для которого очистить кэш (None - весь кэш)
+            purge: Удалить записи старых поколений сразу
+            batch_size: Размер пачки при удалении
+            
+        Returns:
+            Dict: Итог очистки
+        """
         try:
             if inn:
-                cache_key = self._get_cache_key(inn)
-                if self.redis_client:
-                    self.redis_client.delete(cache_key)
-                elif cache_key in self.memory_cache:
-                    del self.memory_cache[cache_key]
-                logger.info(f"Кэш для ИНН {inn} очищен")
-            else:
-                if self.redis_client:
-                    # Удаляем все ключи начинающиеся с fns:
-                    keys = self.redis_client.keys("fns:*")
-                    if keys:
-                        self.redis_client.delete(*keys)
-                else:
-                    self.memory_cache.clear()
-                logger.info("Весь кэш ФНС очищен")
+                self.cache.delete(self._get_cache_key(inn))
+                logger.info(f"Кэш для ИНН {inn} очищен в Redis и в памяти этого процесса")
+                return {"inn": inn, "deleted": 1}
+            
+            generation = self.cache_namespace.invalidate()
+            self.cache.l1.clear()
+            logger.info(f"Кэш ФНС инвалидирован, новое поколение: {generation}")
+            
+            report = {"generation": generation, "deleted": 0, "batches": 0}
+            if purge:
+                report.update(self.cache_namespace.purge(
+                    batch_size=batch_size,
+                    progress=lambda deleted, batches: logger.info(
+                        f"Очистка кэша ФНС: удалено {deleted} ключей, пачек {batches}"
+                    ),
+                    extra_patterns=[LEGACY_CACHE_KEY_PATTERN]
+                ))
+            logger.info(f"Весь кэш ФНС очищен: удалено {report['deleted']} ключей")
+            return report
         except Exception as e:
             logger.error(f"Ошибка очистки кэша: {e}")
+            return {"error": str(e)}
+
+
+# Экземпляры процесса, которые нужно пересоздать после fork
+_instances: "weakref.WeakSet[FNSService]" = weakref.WeakSet()
+_service: Optional[FNSService] = None
+_service_lock = threading.Lock()
+
+
+def get_fns_service() -> FNSService:
+    """
+    Общий экземпляр сервиса, создаётся при первом обращении
+    
+    Импорт модуля не подключается к Redis и не требует FNS_API_KEY; без
+    ключа сервис работает в деградированном режиме (см. FNSService.available).
+    """
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = FNSService(allow_missing_key=True)
+    return _service
+
+
+def _reinit_after_fork():
+    global _service_lock
+    _service_lock = threading.Lock()
+    for service in list(_instances):
+        service._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reinit_after_fork)
+
+
+class _LazyFNSService:
+    """Прокси для совместимости с `from ... import fns_service`"""
+    
+    def __getattr__(self, name):
+        return getattr(get_fns_service(), name)
+    
+    def __repr__(self):
+        return f"<lazy {get_fns_service()!r}>"
 
 
-# Создаем глобальный экземпляр сервиса
-fns_service = FNSService()
+fns_service = _LazyFNSService()
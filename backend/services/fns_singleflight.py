@@ -0,0 +1,133 @@
+"""
+Объединение одновременных запросов к API ФНС по одному ИНН
+Один вызов выполняет запрос, остальные ждут и получают его результат
+"""
+
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """Выполняющийся вызов, результат которого ждут остальные"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Объединение одновременных вызовов с одинаковым ключом внутри процесса"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Выполнение fn не более одного раза на ключ в каждый момент времени
+
+        Returns:
+            Tuple[Any, bool]: (результат, получен ли он от чужого вызова)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+        return call.result, False
+
+
+# Снятие блокировки только её владельцем
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisSingleFlight:
+    """
+    Объединение вызовов между воркерами через блокировку в Redis
+
+    Владелец блокировки выполняет запрос и кладёт результат в кэш,
+    остальные опрашивают кэш, пока блокировка не освободится. Если
+    результат так и не появился (ошибка у владельца), блокировку берёт
+    следующий ожидающий. По истечении wait_timeout вызов выполняется
+    без блокировки, чтобы не зависеть от упавшего воркера.
+    """
+
+    def __init__(self, redis_client, lock_ttl: float = 20, wait_timeout: float = 20,
+                 poll_interval: float = 0.05, prefix: str = "fns:lock:"):
+        self.redis_client = redis_client
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.prefix = prefix
+        self._release = redis_client.register_script(_RELEASE_SCRIPT)
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any], lookup: Callable[[], Optional[Any]]) -> Tuple[Any, bool]:
+        """
+        Выполнение fn одним воркером на ключ
+
+        Args:
+            key: Ключ объединения (ИНН)
+            fn: Запрос к API, сохраняющий результат в кэш
+            lookup: Чтение результата из кэша (None - ещё нет)
+
+        Returns:
+            Tuple[Any, bool]: (результат, получен ли он от другого воркера)
+        """
+        lock_key = f"{self.prefix}{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.wait_timeout
+
+        while time.monotonic() < deadline:
+            if self.redis_client.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000)):
+                try:
+                    return fn(), False
+                finally:
+                    self._release(keys=[lock_key], args=[token])
+
+            while self.redis_client.exists(lock_key) and time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                value = lookup()
+                if value is not None:
+                    self.shared += 1
+                    return value, True
+
+            value = lookup()
+            if value is not None:
+                self.shared += 1
+                return value, True
+
+        logger.warning(f"Не дождались блокировки {lock_key}, запрос выполняется без неё")
+        return fn(), False
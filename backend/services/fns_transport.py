@@ -0,0 +1,134 @@
+"""
+HTTP-транспорт для API ФНС: пул соединений и политика повторов
+"""
+
+import random
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """
+    Адаптер, считающий запросы и фактически открытые TCP-соединения
+
+    Счётчик пула urllib3 (num_connections) не учитывает переподключение
+    уже созданного объекта соединения, поэтому считаются вызовы connect().
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._stats_lock = threading.Lock()
+        self.requests_count = 0
+        self.connects_count = 0
+        super().__init__(*args, **kwargs)
+
+    def _count(self, counter: str):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        class CountingHTTPConnection(HTTPConnection):
+            def connect(self):
+                adapter._count("connects_count")
+                super().connect()
+
+        class CountingHTTPSConnection(HTTPSConnection):
+            def connect(self):
+                adapter._count("connects_count")
+                super().connect()
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = CountingHTTPConnection
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = CountingHTTPSConnection
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, *args, **kwargs):
+        self._count("requests_count")
+        return super().send(request, *args, **kwargs)
+
+
+def build_session(pool_connections: int = 1, pool_maxsize: int = 10, pool_block: bool = False) -> requests.Session:
+    """
+    Сессия с настроенным пулом keep-alive соединений
+
+    Повторы на уровне адаптера отключены: их выполняет FNSService, чтобы
+    каждая попытка проходила через лимит и circuit breaker.
+
+    Args:
+        pool_connections: Количество пулов (хостов), которые держит адаптер
+        pool_maxsize: Соединений в пуле на хост; не меньше числа потоков,
+            одновременно обращающихся к API, иначе лишние соединения закрываются
+        pool_block: Ждать свободного соединения вместо открытия нового сверх pool_maxsize
+    """
+    session = requests.Session()
+    adapter = PooledHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                pool_block=pool_block, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def connection_stats(session) -> Dict:
+    """
+    Переиспользование keep-alive соединений сессии
+
+    requests - отправленных запросов, new_connections - открытых TCP-соединений;
+    остальные запросы ушли по уже открытым соединениям. Считаются только
+    адаптеры PooledHTTPAdapter (сессии из build_session).
+    """
+    requests_count = 0
+    new_connections = 0
+    adapters = getattr(session, "adapters", {})
+    for adapter in {id(a): a for a in adapters.values()}.values():
+        if isinstance(adapter, PooledHTTPAdapter):
+            requests_count += adapter.requests_count
+            new_connections += adapter.connects_count
+
+    reused = max(0, requests_count - new_connections)
+    return {
+        "requests": requests_count,
+        "new_connections": new_connections,
+        "reused": reused,
+        "reuse_rate": round(reused / requests_count, 4) if requests_count else 0.0
+    }
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Повторы временных ошибок с экспоненциальной задержкой
+
+    Задержка перед попыткой n+1: случайная в [0, min(max_delay, base_delay * 2^(n-1))]
+    ("full jitter"), чтобы воркеры не повторяли запросы синхронно.
+    """
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 4.0
+
+    @staticmethod
+    def is_retryable(status_code: Optional[int]) -> bool:
+        """Таймаут, ошибка сети (None), 5xx и 429"""
+        return status_code is None or status_code >= 500 or status_code == 429
+
+    def delay(self, attempt: int) -> float:
+        """Задержка после неудачной попытки номер attempt (с 1)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def max_total_delay(self) -> float:
+        """Наибольшая суммарная задержка между всеми попытками"""
+        return sum(min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                   for attempt in range(1, self.max_attempts))
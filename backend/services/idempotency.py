@@ -0,0 +1,270 @@
+"""
+Хранилище ответов по ключу идемпотентности (заголовок Idempotency-Key)
+
+Боты и Tilda повторяют POST по таймауту. Первый запрос с ключом
+выполняется и его ответ сохраняется на IDEMPOTENCY_TTL; повторы с тем же
+ключом получают сохранённый ответ, а пришедшие, пока первый ещё
+выполняется, ждут его результата. Ответы 5xx, 408 и 429 не сохраняются:
+повтор выполнит запрос заново.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATE_IN_PROGRESS = 'in_progress'
+STATE_DONE = 'done'
+
+# Статусы, после которых повтор должен выполнить запрос заново
+_RETRYABLE_STATUSES = frozenset((408, 429))
+
+
+class IdempotencyConflict(Exception):
+    """Ключ уже использован для запроса с другим телом"""
+
+
+class IdempotencyInProgress(Exception):
+    """Запрос с этим ключом ещё выполняется дольше wait_timeout"""
+
+
+@dataclass
+class StoredResponse:
+    """Сохранённый ответ"""
+    status: int
+    body: str
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def request_fingerprint(method: str, path: str, body: bytes) -> str:
+    """Отпечаток запроса: повтор ключа с другим телом - ошибка клиента"""
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def is_storable(status: int) -> bool:
+    return status < 500 and status not in _RETRYABLE_STATUSES
+
+
+class IdempotencyStore:
+    """
+    Выполнение запроса не более одного раза на ключ
+
+    Наследники реализуют хранение записей: {state, fingerprint, response}.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, lock_ttl: Optional[float] = None,
+                 wait_timeout: Optional[float] = None):
+        """
+        Args:
+            ttl: Сколько хранить ответ, сек (IDEMPOTENCY_TTL)
+            lock_ttl: Сколько считать запрос выполняющимся, сек (IDEMPOTENCY_LOCK_TTL):
+                после падения воркера ключ освобождается по истечении этого времени
+            wait_timeout: Сколько повтор ждёт выполняющийся запрос (IDEMPOTENCY_WAIT_TIMEOUT)
+        """
+        self.ttl = ttl or float(os.getenv('IDEMPOTENCY_TTL', 86400))
+        self.lock_ttl = lock_ttl or float(os.getenv('IDEMPOTENCY_LOCK_TTL', 60))
+        self.wait_timeout = wait_timeout if wait_timeout is not None else float(
+            os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', 30))
+        self._stats_lock = threading.Lock()
+        self.stats = {'executed': 0, 'replayed': 0, 'waited': 0, 'conflicts': 0}
+
+    def run(self, key: str, fingerprint: str, fn: Callable[[], StoredResponse]) -> Tuple[StoredResponse, bool]:
+        """
+        Выполнение fn один раз на ключ
+
+        Raises:
+            IdempotencyConflict: Ключ использован с другим телом запроса
+            IdempotencyInProgress: Не дождались выполняющегося запроса
+
+        Returns:
+            Tuple[StoredResponse, bool]: (ответ, сохранённый ли это ответ)
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        waited = False
+        while True:
+            record = self._get(key)
+            if record is not None and record['fingerprint'] != fingerprint:
+                self._count('conflicts')
+                raise IdempotencyConflict(key)
+            if record is not None and record['state'] == STATE_DONE:
+                self._count('waited' if waited else 'replayed')
+                return StoredResponse(**record['response']), True
+
+            token = uuid.uuid4().hex
+            if record is None and self._acquire(key, fingerprint, token):
+                return self._execute(key, fingerprint, token, fn), False
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise IdempotencyInProgress(key)
+            waited = True
+            self._wait(key, remaining)
+
+    def _execute(self, key: str, fingerprint: str, token: str, fn: Callable[[], StoredResponse]) -> StoredResponse:
+        try:
+            response = fn()
+        except BaseException:
+            self._release(key, token)
+            raise
+        self._count('executed')
+        if is_storable(response.status):
+            self._save(key, {'state': STATE_DONE, 'fingerprint': fingerprint, 'response': asdict(response)})
+        else:
+            self._release(key, token)
+        return response
+
+    def _count(self, counter: str):
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            return dict(self.stats, backend=type(self).__name__)
+
+    # Хранение записей
+
+    def _get(self, key: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def _acquire(self, key: str, fingerprint: str, token: str) -> bool:
+        """Запись "выполняется", если ключа ещё нет"""
+        raise NotImplementedError
+
+    def _save(self, key: str, record: Dict):
+        raise NotImplementedError
+
+    def _release(self, key: str, token: str):
+        """Удаление записи "выполняется" её владельцем"""
+        raise NotImplementedError
+
+    def _wait(self, key: str, timeout: float):
+        """Ожидание изменения записи"""
+        raise NotImplementedError
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    """Хранилище в памяти процесса (без Redis)"""
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, **kwargs):
+        super().__init__(**kwargs)
+        self._clock = clock
+        self._records: Dict[str, Tuple[float, Dict]] = {}
+        self._changed = threading.Condition()
+
+    def _get(self, key: str) -> Optional[Dict]:
+        with self._changed:
+            entry = self._records.get(key)
+            if entry is None:
+                return None
+            expires_at, record = entry
+            if expires_at <= self._clock():
+                del self._records[key]
+                return None
+            return record
+
+    def _acquire(self, key: str, fingerprint: str, token: str) -> bool:
+        with self._changed:
+            if self._get(key) is not None:
+                return False
+            self._purge()
+            self._records[key] = (self._clock() + self.lock_ttl,
+                                  {'state': STATE_IN_PROGRESS, 'fingerprint': fingerprint, 'token': token})
+            return True
+
+    def _save(self, key: str, record: Dict):
+        with self._changed:
+            self._records[key] = (self._clock() + self.ttl, record)
+            self._changed.notify_all()
+
+    def _release(self, key: str, token: str):
+        with self._changed:
+            entry = self._records.get(key)
+            if entry is not None and entry[1].get('token') == token:
+                del self._records[key]
+            self._changed.notify_all()
+
+    def _wait(self, key: str, timeout: float):
+        with self._changed:
+            self._changed.wait(min(timeout, self.lock_ttl))
+
+    def _purge(self):
+        now = self._clock()
+        expired = [key for key, (expires_at, _) in self._records.items() if expires_at <= now]
+        for key in expired:
+            del self._records[key]
+
+
+# Удаление записи "выполняется" только её владельцем
+_RELEASE_SCRIPT = """
+local value = redis.call('get', KEYS[1])
+if value and cjson.decode(value)['token'] == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisIdempotencyStore(IdempotencyStore):
+    """Хранилище в Redis, общее для воркеров; повторы опрашивают ключ"""
+
+    def __init__(self, redis_client, prefix: str = "idempotency:", poll_interval: float = 0.05, **kwargs):
+        super().__init__(**kwargs)
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+        self._release_script = redis_client.register_script(_RELEASE_SCRIPT)
+
+    def _get(self, key: str) -> Optional[Dict]:
+        raw = self.redis_client.get(f"{self.prefix}{key}")
+        return json.loads(raw) if raw else None
+
+    def _acquire(self, key: str, fingerprint: str, token: str) -> bool:
+        record = {'state': STATE_IN_PROGRESS, 'fingerprint': fingerprint, 'token': token}
+        return bool(self.redis_client.set(f"{self.prefix}{key}", json.dumps(record), nx=True,
+                                          px=int(self.lock_ttl * 1000)))
+
+    def _save(self, key: str, record: Dict):
+        self.redis_client.set(f"{self.prefix}{key}", json.dumps(record, ensure_ascii=False),
+                              px=int(self.ttl * 1000))
+
+    def _release(self, key: str, token: str):
+        self._release_script(keys=[f"{self.prefix}{key}"], args=[token])
+
+    def _wait(self, key: str, timeout: float):
+        time.sleep(min(timeout, self.poll_interval))
+
+
+_store: Optional[IdempotencyStore] = None
+_store_lock = threading.Lock()
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """Общее хранилище: Redis из REDIS_URL, без него - память процесса"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _create_store()
+    return _store
+
+
+def _create_store() -> IdempotencyStore:
+    try:
+        import redis
+        client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'), decode_responses=True)
+        client.ping()
+        return RedisIdempotencyStore(client)
+    except Exception as e:
+        logger.warning(f"Redis не доступен: {e}. Ключи идемпотентности хранятся в памяти процесса.")
+        return InMemoryIdempotencyStore()
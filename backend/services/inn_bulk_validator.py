@@ -0,0 +1,110 @@
+"""
+Массовая проверка формата и контрольных сумм ИНН на NumPy
+Для очистки партнерской базы: миллионы ИНН из таблиц и внешних реестров
+"""
+
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+# Коды результата проверки
+INN_OK = 0
+INN_EMPTY = 1
+INN_NOT_DIGITS = 2
+INN_BAD_LENGTH = 3
+INN_BAD_CHECKSUM = 4
+INN_BAD_CHECKSUM_2 = 5
+
+# Те же сообщения, что и у FNSService.validate_inn_format
+ERROR_MESSAGES = {
+    INN_OK: "",
+    INN_EMPTY: "ИНН не может быть пустым",
+    INN_NOT_DIGITS: "ИНН должен содержать только цифры",
+    INN_BAD_LENGTH: "ИНН должен содержать 10 цифр (юр.лицо) или 12 цифр (ИП)",
+    INN_BAD_CHECKSUM: "Неверная контрольная сумма ИНН",
+    INN_BAD_CHECKSUM_2: "Неверная контрольная сумма ИНН (вторая)",
+}
+
+_COEFFICIENTS_10 = np.array([2, 4, 10, 3, 5, 9, 4, 6, 8], dtype=np.int32)
+_COEFFICIENTS_12_1 = np.array([7, 2, 4, 10, 3, 5, 9, 4, 6, 8], dtype=np.int32)
+_COEFFICIENTS_12_2 = np.array([3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8], dtype=np.int32)
+
+
+def _as_unicode_array(inns: Iterable) -> np.ndarray:
+    """Приведение списка, массива или колонки к массиву строк NumPy"""
+    arr = np.asarray(inns)
+    if arr.dtype.kind != 'U':
+        arr = arr.astype(object)
+        arr[np.equal(arr, None)] = ""
+        arr = arr.astype(str)
+    return np.ascontiguousarray(arr.ravel())
+
+
+def validate_inns_bulk(inns: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Проверка массива ИНН
+
+    Правила совпадают с FNSService.validate_inn_format: ИНН из 10 цифр
+    (юр.лицо) или 12 цифр (ИП) с верными контрольными суммами. Цифрами
+    считаются только ASCII 0-9, пропуски (None) - пустые значения.
+
+    Args:
+        inns: Список, массив NumPy или колонка pandas с ИНН
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (валидность по строкам, коды ошибок INN_*)
+    """
+    arr = _as_unicode_array(inns)
+    rows = len(arr)
+    if rows == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.int8)
+
+    # Символы строк как матрица кодов UCS-4 (строки дополнены нулями)
+    width = max(arr.dtype.itemsize // 4, 1)
+    chars = arr.view(np.uint32).reshape(rows, width)
+    if width < 12:
+        chars = np.pad(chars, ((0, 0), (0, 12 - width)))
+
+    lengths = np.count_nonzero(chars, axis=1)
+    is_digit = (chars >= 48) & (chars <= 57)
+    all_digits = np.all(is_digit | (chars == 0), axis=1)
+
+    digits = np.where(is_digit, chars.astype(np.int32) - 48, 0)[:, :12]
+
+    is_10 = lengths == 10
+    is_12 = lengths == 12
+
+    check_10 = (digits[:, :9] @ _COEFFICIENTS_10) % 11 % 10 == digits[:, 9]
+    check_12_1 = (digits[:, :10] @ _COEFFICIENTS_12_1) % 11 % 10 == digits[:, 10]
+    check_12_2 = (digits[:, :11] @ _COEFFICIENTS_12_2) % 11 % 10 == digits[:, 11]
+
+    codes = np.select(
+        [
+            lengths == 0,
+            ~all_digits,
+            ~(is_10 | is_12),
+            is_10 & ~check_10,
+            is_12 & ~check_12_1,
+            is_12 & ~check_12_2,
+        ],
+        [INN_EMPTY, INN_NOT_DIGITS, INN_BAD_LENGTH, INN_BAD_CHECKSUM, INN_BAD_CHECKSUM, INN_BAD_CHECKSUM_2],
+        default=INN_OK
+    ).astype(np.int8)
+
+    return codes == INN_OK, codes
+
+
+def error_messages(inns: Iterable, codes: np.ndarray) -> List[str]:
+    """
+    Тексты ошибок по кодам, как у FNSService.validate_inn_format
+
+    Для 12-значных ИНН с ошибкой первой контрольной суммы уточняется "(первая)".
+    """
+    lengths = np.char.str_len(_as_unicode_array(inns))
+    messages = []
+    for code, length in zip(codes.tolist(), lengths.tolist()):
+        if code == INN_BAD_CHECKSUM and length == 12:
+            messages.append("Неверная контрольная сумма ИНН (первая)")
+        else:
+            messages.append(ERROR_MESSAGES[code])
+    return messages
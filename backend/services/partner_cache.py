@@ -0,0 +1,171 @@
+"""
+Кэш карточек партнёров для GET /api/v1/partners/<partner_code>
+
+Личный кабинет Tilda и боты постоянно опрашивают статус регистрации.
+Готовый JSON ответа хранится по partner_code вместе с ETag из updated_at
+(L1 в памяти процесса перед Redis, как кэш ФНС), поэтому повторный
+опрос не обращается к базе, а с If-None-Match получает 304.
+
+Запись сбрасывается после коммита любой сессии, которая вставила,
+изменила или удалила партнёра через ORM: регистрация, вебхук Tilda,
+проверка ИНН в фоне, перепроверка по реестру. Импорт (Core INSERT)
+только добавляет новых партнёров, а отсутствующие коды не кэшируются.
+"""
+
+import logging
+import os
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from backend.services.fns_cache import TTLLRUCache, TwoTierCache
+
+logger = logging.getLogger(__name__)
+
+# Ключ session.info с кодами партнёров, изменёнными в транзакции
+_PENDING_KEY = 'partner_cache_codes'
+
+_MAPPER_EVENTS = ('after_insert', 'after_update', 'after_delete')
+
+
+def make_etag(partner) -> str:
+    """ETag карточки: id и время последнего изменения партнёра"""
+    moment = partner.updated_at or partner.created_at
+    stamp = moment.strftime('%Y%m%d%H%M%S%f') if moment else '0'
+    return f"{partner.id}-{stamp}"
+
+
+class PartnerCache:
+    """Сериализованные карточки партнёров по partner_code"""
+
+    def __init__(self, redis_client=None, ttl: Optional[int] = None, l1_ttl: Optional[float] = None,
+                 l1_size: Optional[int] = None, prefix: str = "partners:card:"):
+        """
+        Args:
+            redis_client: Общий для воркеров уровень (None - только память процесса)
+            ttl: Время жизни записи, сек (PARTNER_CACHE_TTL)
+            l1_ttl: Время жизни в памяти процесса при Redis, сек (PARTNER_CACHE_L1_TTL):
+                сброс в другом воркере виден здесь не позже чем через l1_ttl
+            l1_size: Записей в памяти процесса (PARTNER_CACHE_L1_SIZE)
+        """
+        self.ttl = ttl or int(os.getenv('PARTNER_CACHE_TTL', 60))
+        l1_ttl = l1_ttl if l1_ttl is not None else float(os.getenv('PARTNER_CACHE_L1_TTL', 2))
+        l1_size = l1_size or int(os.getenv('PARTNER_CACHE_L1_SIZE', 10000))
+        self.prefix = prefix
+        self.cache = TwoTierCache(
+            TTLLRUCache(maxsize=l1_size, ttl=min(l1_ttl, self.ttl) if redis_client else self.ttl),
+            redis_client
+        )
+        self._stats_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._listeners = []
+
+    def get_or_load(self, partner_code: str,
+                    load: Callable[[], Optional[Tuple[str, str]]]) -> Optional[Dict]:
+        """
+        Запись {etag, body} из кэша или из load()
+
+        Args:
+            load: (etag, тело ответа) из базы или None, если партнёра нет
+
+        Returns:
+            Optional[Dict]: None - партнёр не найден (не кэшируется)
+        """
+        key = f"{self.prefix}{partner_code}"
+        entry = self.cache.get(key)
+        if entry is not None:
+            self._count('hits')
+            return entry
+
+        self._count('misses')
+        loaded = load()
+        if loaded is None:
+            return None
+        etag, body = loaded
+        entry = {'etag': etag, 'body': body}
+        self.cache.set(key, entry, self.ttl)
+        return entry
+
+    def invalidate(self, *partner_codes: str):
+        for partner_code in partner_codes:
+            try:
+                self.cache.delete(f"{self.prefix}{partner_code}")
+            except Exception as e:
+                # Запись в Redis доживёт до ttl
+                logger.error(f"Ошибка сброса кэша партнёра {partner_code}: {e}")
+        self._count('invalidations', len(partner_codes))
+
+    # ==================== СБРОС ПОСЛЕ КОММИТА ====================
+
+    def track(self, session, model):
+        """
+        Сброс записей партнёров, изменённых через ORM, после коммита
+
+        Args:
+            session: Сессия или scoped_session (db.session)
+            model: Модель партнёра
+        """
+        self._listen(model, _MAPPER_EVENTS, self._on_write)
+        self._listen(session, ('after_commit',), self._on_commit)
+        self._listen(session, ('after_rollback',), self._on_rollback)
+        return self
+
+    def untrack(self):
+        for target, name, fn in self._listeners:
+            event.remove(target, name, fn)
+        self._listeners = []
+
+    def _listen(self, target, names, fn):
+        for name in names:
+            event.listen(target, name, fn)
+            self._listeners.append((target, name, fn))
+
+    def _on_write(self, mapper, connection, target):
+        session = object_session(target)
+        if session is not None and target.partner_code:
+            session.info.setdefault(_PENDING_KEY, set()).add(target.partner_code)
+
+    def _on_commit(self, session):
+        # Сброс после коммита: чтение между сбросом и коммитом вернуло бы старые данные
+        codes = session.info.pop(_PENDING_KEY, None)
+        if codes:
+            self.invalidate(*codes)
+
+    def _on_rollback(self, session):
+        session.info.pop(_PENDING_KEY, None)
+
+    def _count(self, counter: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[counter] += n
+
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return dict(stats, ttl=self.ttl, cache=self.cache.get_stats())
+
+
+_cache: Optional[PartnerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_partner_cache() -> PartnerCache:
+    """Общий кэш карточек: Redis из REDIS_URL, без него - память процесса"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PartnerCache(_create_redis_client())
+    return _cache
+
+
+def _create_redis_client():
+    try:
+        import redis
+        client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'), decode_responses=True)
+        client.ping()
+        return client
+    except Exception as e:
+        logger.warning(f"Redis не доступен: {e}. Карточки партнёров кэшируются в памяти процесса.")
+        return None
@@ -0,0 +1,219 @@
+"""
+Выдача кодов партнёров (partner_code)
+
+Код - P-ГГММДД и номер из общего счётчика. Счётчик хранится в таблице
+code_sequences или в Redis; каждый воркер забирает из него блок номеров
+одним запросом и дальше выдаёт коды из памяти. Номера уникальны между
+воркерами без COUNT по таблице партнёров; номера неиспользованного
+остатка блока (рестарт воркера) пропускаются.
+"""
+
+import logging
+import os
+import threading
+import weakref
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_NAME = 'partner_code'
+
+BACKEND_DATABASE = 'db'
+BACKEND_REDIS = 'redis'
+
+
+class PartnerCodeAllocator:
+    """Выдача номеров из блоков, полученных у общего счётчика"""
+
+    def __init__(self, block_size: Optional[int] = None, start: Union[int, Callable[[], int]] = 1,
+                 clock: Callable[[], datetime] = datetime.now):
+        """
+        Args:
+            block_size: Номеров в блоке (по умолчанию PARTNER_CODE_BLOCK_SIZE)
+            start: Первый номер или функция, которая его вернёт;
+                используется только при создании счётчика
+            clock: Текущее время для даты в коде
+        """
+        self.block_size = block_size or int(os.getenv('PARTNER_CODE_BLOCK_SIZE', 20))
+        self.start = start
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self.stats = {'allocated': 0, 'blocks': 0}
+        _instances.add(self)
+
+    def next_value(self) -> int:
+        """Следующий номер; запрос к счётчику - раз в block_size номеров"""
+        with self._lock:
+            if self._next >= self._end:
+                self._next, self._end = self._reserve(self.block_size)
+                self.stats['blocks'] += 1
+            value = self._next
+            self._next += 1
+            self.stats['allocated'] += 1
+            return value
+
+    def next_values(self, count: int) -> List[int]:
+        """
+        count номеров подряд для пакетной вставки
+
+        Остаток текущего блока используется первым, недостающие номера
+        берутся у счётчика одним запросом.
+        """
+        with self._lock:
+            values = list(range(self._next, min(self._end, self._next + count)))
+            self._next += len(values)
+            missing = count - len(values)
+            if missing:
+                start, end = self._reserve(missing)
+                values.extend(range(start, end))
+                self.stats['blocks'] += 1
+            self.stats['allocated'] += count
+            return values
+
+    def next_code(self) -> str:
+        """Следующий код партнёра"""
+        return format_code(self.next_value(), self.clock())
+
+    def next_codes(self, count: int) -> List[str]:
+        """count кодов партнёров"""
+        moment = self.clock()
+        return [format_code(value, moment) for value in self.next_values(count)]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, block_size=self.block_size, block_remaining=self._end - self._next)
+
+    def _start_value(self) -> int:
+        return self.start() if callable(self.start) else self.start
+
+    def _reserve(self, size: int) -> Tuple[int, int]:
+        """Блок номеров [начало, конец) у общего счётчика"""
+        raise NotImplementedError
+
+    def _after_fork(self):
+        # Блок родителя остаётся за ним: дочерний процесс берёт свой
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+
+
+class DatabaseCodeAllocator(PartnerCodeAllocator):
+    """
+    Счётчик в таблице code_sequences
+
+    Блок выдаётся в отдельной короткой транзакции (UPDATE ... + size):
+    строка счётчика блокируется до коммита, поэтому блоки воркеров
+    не пересекаются, а транзакция регистрации её не держит.
+    """
+
+    def __init__(self, engine, table, name: str = SEQUENCE_NAME, **kwargs):
+        """
+        Args:
+            engine: Engine SQLAlchemy (db.engine)
+            table: Таблица счётчиков (CodeSequence.__table__)
+            name: Имя счётчика
+        """
+        super().__init__(**kwargs)
+        self.engine = engine
+        self.table = table
+        self.name = name
+
+    def _reserve(self, size: int) -> Tuple[int, int]:
+        table = self.table
+        for _ in range(3):
+            with self.engine.begin() as conn:
+                updated = conn.execute(
+                    update(table)
+                    .where(table.c.name == self.name)
+                    .values(next_value=table.c.next_value + size)
+                ).rowcount
+                if updated:
+                    end = conn.execute(select(table.c.next_value).where(table.c.name == self.name)).scalar_one()
+                    return end - size, end
+
+            # Счётчика ещё нет: создаём, при гонке его создаст другой воркер
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(table).values(name=self.name, next_value=self._start_value()))
+                logger.info(f"Создан счётчик кодов {self.name}")
+            except IntegrityError:
+                pass
+        raise RuntimeError(f"Не удалось получить блок номеров счётчика {self.name}")
+
+
+class RedisCodeAllocator(PartnerCodeAllocator):
+    """
+    Счётчик в Redis (INCRBY), общий для воркеров
+
+    Ключ без TTL. Если Redis без персистентности потеряет данные, счётчик
+    начнётся заново со start и коды повторятся - в таком окружении
+    используйте таблицу (PARTNER_CODE_BACKEND=db).
+    """
+
+    def __init__(self, redis_client, key: str = f"codes:{SEQUENCE_NAME}", **kwargs):
+        super().__init__(**kwargs)
+        self.redis_client = redis_client
+        self.key = key
+
+    def _reserve(self, size: int) -> Tuple[int, int]:
+        # В ключе - последний выданный номер
+        self.redis_client.set(self.key, self._start_value() - 1, nx=True)
+        end = int(self.redis_client.incrby(self.key, size)) + 1
+        return end - size, end
+
+
+def format_code(value: int, moment: datetime) -> str:
+    """Код партнёра: P-ГГММДД и номер (не короче 4 цифр)"""
+    return f"P-{moment.strftime('%y%m%d')}{value:04d}"
+
+
+def count_start(engine, partners_table) -> Callable[[], int]:
+    """
+    Начальный номер, продолжающий прежнюю нумерацию (число партнёров + 1)
+
+    Для start аллокатора: COUNT выполняется только при создании счётчика,
+    поэтому коды не совпадут с выданными до появления счётчика.
+    """
+    def start() -> int:
+        with engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(partners_table)).scalar_one() + 1
+    return start
+
+
+def create_code_allocator(engine, table, redis_client=None, **kwargs) -> PartnerCodeAllocator:
+    """
+    Выдача кодов по PARTNER_CODE_BACKEND: db (по умолчанию) или redis
+
+    Args:
+        engine: Engine SQLAlchemy
+        table: Таблица счётчиков
+        redis_client: Клиент Redis (для redis; по умолчанию из REDIS_URL)
+    """
+    backend = os.getenv('PARTNER_CODE_BACKEND', BACKEND_DATABASE).lower()
+    if backend == BACKEND_REDIS:
+        if redis_client is None:
+            import redis
+            redis_client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379'),
+                                          decode_responses=True)
+        return RedisCodeAllocator(redis_client, **kwargs)
+    if backend != BACKEND_DATABASE:
+        raise ValueError(f"Неизвестный PARTNER_CODE_BACKEND: {backend}")
+    return DatabaseCodeAllocator(engine, table, **kwargs)
+
+
+# Экземпляры процесса, блоки которых сбрасываются после fork
+_instances: "weakref.WeakSet[PartnerCodeAllocator]" = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    for allocator in list(_instances):
+        allocator._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
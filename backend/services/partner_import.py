@@ -0,0 +1,302 @@
+"""
+Массовый импорт партнёров из CRM (CSV или JSONL)
+
+Файл читается потоком и обрабатывается пачками: ИНН пачки проверяются
+векторно (inn_bulk_validator), дубли ищутся по множествам ИНН и email,
+загруженным из базы один раз, строки пачки вставляются одним INSERT
+в своей транзакции. API ФНС при импорте не вызывается: импортированные
+партнёры получают этап imported и проверяются позже.
+"""
+
+import csv
+import itertools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from backend.services.inn_bulk_validator import error_messages, validate_inns_bulk
+
+logger = logging.getLogger(__name__)
+
+FORMAT_CSV = 'csv'
+FORMAT_JSONL = 'jsonl'
+
+STAGE_IMPORTED = 'imported'
+
+REQUIRED_FIELDS = ('company_name', 'inn')
+IMPORT_FIELDS = (
+    'company_name', 'legal_form', 'inn', 'ogrn', 'legal_address', 'actual_address',
+    'contact_person', 'phone', 'email', 'website', 'main_category',
+)
+
+# Заголовки выгрузки CRM -> поля партнёра
+FIELD_ALIASES = {
+    'наименование': 'company_name',
+    'название': 'company_name',
+    'организационно-правовая форма': 'legal_form',
+    'опф': 'legal_form',
+    'инн': 'inn',
+    'огрн': 'ogrn',
+    'юридический адрес': 'legal_address',
+    'фактический адрес': 'actual_address',
+    'контактное лицо': 'contact_person',
+    'телефон': 'phone',
+    'e-mail': 'email',
+    'почта': 'email',
+    'сайт': 'website',
+    'категория': 'main_category',
+}
+
+
+@dataclass
+class ImportReport:
+    """Итоги импорта и ошибки по строкам (номер строки данных с 1)"""
+    total: int = 0
+    imported: int = 0
+    errors: List[Dict] = field(default_factory=list)
+    duration: float = 0.0
+    dry_run: bool = False
+
+    @property
+    def rows_per_second(self) -> float:
+        return round(self.total / self.duration, 1) if self.duration > 0 else 0.0
+
+    def add_error(self, row: int, inn: str, error: str):
+        self.errors.append({'row': row, 'inn': inn, 'error': error})
+
+    def to_dict(self, max_errors: Optional[int] = None) -> Dict:
+        errors = self.errors if max_errors is None else self.errors[:max_errors]
+        return {
+            'total': self.total,
+            'imported': self.imported,
+            'failed': len(self.errors),
+            'dry_run': self.dry_run,
+            'duration_ms': round(self.duration * 1000, 2),
+            'rows_per_second': self.rows_per_second,
+            'errors': errors,
+            'errors_truncated': len(errors) < len(self.errors),
+        }
+
+
+def detect_format(filename: str = '', content_type: str = '') -> str:
+    """Формат по расширению файла или Content-Type (по умолчанию CSV)"""
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return FORMAT_JSONL
+    return FORMAT_CSV
+
+
+def iter_rows(lines: Iterable[str], fmt: str = FORMAT_CSV) -> Iterator[Dict]:
+    """
+    Строки файла как словари полей партнёра
+
+    Строка JSONL с ошибкой разбора отдаётся как {'_error': текст}.
+    """
+    if fmt == FORMAT_JSONL:
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield {'_error': f'Некорректный JSON: {e}'}
+                continue
+            yield _map_fields(row) if isinstance(row, dict) else {'_error': 'Ожидается объект JSON'}
+        return
+
+    lines = iter(lines)
+    header = next(lines, '')
+    dialect_delimiter = max((';', ',', '\t'), key=header.count)
+    reader = csv.DictReader(itertools.chain([header], lines), delimiter=dialect_delimiter)
+    for row in reader:
+        yield _map_fields(row)
+
+
+def _map_fields(row: Dict) -> Dict:
+    mapped = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        name = str(key).strip().lstrip('﻿').lower()
+        mapped[FIELD_ALIASES.get(name, name)] = value
+    return mapped
+
+
+class PartnerImporter:
+    """Импорт партнёров пачками через Core INSERT"""
+
+    def __init__(self, engine, table, code_allocator=None, chunk_size: Optional[int] = None,
+                 dry_run: bool = False, source: str = 'crm_import',
+                 clock: Callable[[], datetime] = datetime.utcnow):
+        """
+        Args:
+            engine: Engine SQLAlchemy
+            table: Таблица партнёров (Partner.__table__)
+            code_allocator: Выдача partner_code (не нужна при dry_run)
+            chunk_size: Строк в пачке и транзакции (PARTNER_IMPORT_CHUNK_SIZE)
+            dry_run: Только проверка, без записи в базу
+            source: registration_source импортированных партнёров
+        """
+        self.engine = engine
+        self.table = table
+        self.code_allocator = code_allocator
+        self.chunk_size = chunk_size or int(os.getenv('PARTNER_IMPORT_CHUNK_SIZE', 2000))
+        self.dry_run = dry_run
+        self.source = source
+        self.clock = clock
+        self._max_lengths = {
+            name: getattr(table.c[name].type, 'length', None) for name in IMPORT_FIELDS
+        }
+        self._existing_inns = set()
+        self._existing_emails = set()
+
+    def _load_existing(self):
+        """ИНН и email партнёров в базе: один проход по двум колонкам"""
+        with self.engine.connect() as conn:
+            result = conn.execution_options(yield_per=10000).execute(
+                select(self.table.c.inn, self.table.c.email)
+            )
+            for inn, email in result:
+                self._existing_inns.add(inn)
+                if email:
+                    self._existing_emails.add(email.lower())
+
+    def run(self, rows: Iterable[Dict], progress: Optional[Callable[[ImportReport], None]] = None) -> ImportReport:
+        """
+        Импорт строк
+
+        Args:
+            rows: Словари полей (см. iter_rows)
+            progress: Вызывается после каждой пачки
+        """
+        started_at = time.perf_counter()
+        report = ImportReport(dry_run=self.dry_run)
+        self._load_existing()
+
+        numbered = enumerate(rows, start=1)
+        while True:
+            chunk = list(itertools.islice(numbered, self.chunk_size))
+            if not chunk:
+                break
+            report.total += len(chunk)
+            valid = self._validate(chunk, report)
+            if valid and not self.dry_run:
+                self._insert(valid, report)
+            elif self.dry_run:
+                report.imported += len(valid)
+            if progress:
+                report.duration = time.perf_counter() - started_at
+                progress(report)
+
+        report.errors.sort(key=lambda error: error['row'])
+        report.duration = time.perf_counter() - started_at
+        logger.info(f"Импорт партнёров: {report.imported} из {report.total}, "
+                    f"ошибок {len(report.errors)}, {report.rows_per_second} строк/с")
+        return report
+
+    def _validate(self, chunk: List[Tuple[int, Dict]], report: ImportReport) -> List[Tuple[int, Dict]]:
+        """Строки пачки, прошедшие проверку, с приведёнными значениями"""
+        cleaned = []
+        for number, row in chunk:
+            if '_error' in row:
+                report.add_error(number, '', row['_error'])
+                continue
+            values = {
+                name: str(row[name]).strip() if row.get(name) is not None else ''
+                for name in IMPORT_FIELDS
+            }
+            values['inn'] = values['inn'].replace(' ', '')
+            values['email'] = values['email'].lower()
+            cleaned.append((number, values))
+
+        # Формат и контрольные суммы ИНН - одной операцией на пачку
+        is_valid, codes = validate_inns_bulk([values['inn'] for _, values in cleaned])
+        messages = error_messages([values['inn'] for _, values in cleaned], codes)
+
+        valid = []
+        for (number, values), inn_ok, inn_error in zip(cleaned, is_valid.tolist(), messages):
+            error = self._row_error(values, inn_ok, inn_error)
+            if error:
+                report.add_error(number, values['inn'], error)
+                continue
+            # Дубли внутри файла отсекаются так же, как дубли в базе
+            self._existing_inns.add(values['inn'])
+            if values['email']:
+                self._existing_emails.add(values['email'])
+            valid.append((number, values))
+        return valid
+
+    def _row_error(self, values: Dict, inn_ok: bool, inn_error: str) -> Optional[str]:
+        for name in REQUIRED_FIELDS:
+            if not values[name]:
+                return f'Не заполнено обязательное поле: {name}'
+        if not inn_ok:
+            return inn_error
+        for name, max_length in self._max_lengths.items():
+            if max_length and len(values[name]) > max_length:
+                return f'Поле {name} длиннее {max_length} символов'
+        if values['inn'] in self._existing_inns:
+            return 'Компания с таким ИНН уже зарегистрирована'
+        if values['email'] and values['email'] in self._existing_emails:
+            return 'Партнёр с таким email уже зарегистрирован'
+        return None
+
+    def _partner_row(self, values: Dict, partner_code: str, now: datetime) -> Dict:
+        row = {name: values[name] or None for name in IMPORT_FIELDS}
+        row.update({
+            'partner_code': partner_code,
+            'legal_form': values['legal_form'] or ('ИП' if len(values['inn']) == 12 else 'ООО'),
+            'status': 'pending',
+            'registration_stage': STAGE_IMPORTED,
+            'verification_status': 'pending',
+            'registration_source': self.source,
+            'created_at': now,
+            'updated_at': now,
+        })
+        return row
+
+    def _insert(self, valid: List[Tuple[int, Dict]], report: ImportReport):
+        now = self.clock()
+        codes = self.code_allocator.next_codes(len(valid))
+        rows = [self._partner_row(values, code, now) for (_, values), code in zip(valid, codes)]
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(insert(self.table), rows)
+            report.imported += len(rows)
+            return
+        except IntegrityError:
+            # Партнёр с тем же ИНН/email появился во время импорта: пачка построчно
+            logger.warning("Конфликт при вставке пачки, строки вставляются по одной")
+
+        for (number, values), row in zip(valid, rows):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(self.table), [row])
+                report.imported += 1
+            except IntegrityError as e:
+                report.add_error(number, values['inn'], self._conflict_error(values, e))
+
+    def _conflict_error(self, values: Dict, error: IntegrityError) -> str:
+        """
+        Причина отказа строки: дубль ИНН или email в базе
+
+        Прочие нарушения (например, совпадение partner_code) - не ошибка
+        в данных строки, а внутренняя.
+        """
+        table = self.table
+        with self.engine.connect() as conn:
+            if conn.execute(select(table.c.id).where(table.c.inn == values['inn']).limit(1)).first():
+                return 'Компания с таким ИНН уже зарегистрирована'
+            if values['email'] and conn.execute(
+                select(table.c.id).where(func.lower(table.c.email) == values['email']).limit(1)
+            ).first():
+                return 'Партнёр с таким email уже зарегистрирован'
+        logger.error(f"Ошибка вставки партнёра с ИНН {values['inn']}: {error}")
+        return 'Внутренняя ошибка при сохранении строки'
@@ -0,0 +1,261 @@
+"""
+Асинхронная регистрация партнёров
+
+Запрос регистрации только проверяет поля и формат ИНН, сохраняет партнёра
+на этапе inn_verification и ставит проверку ИНН в очередь; ответ 202
+отдаётся сразу. Проверка (API ФНС и резервные источники) выполняется
+в пуле потоков процесса, результат - в registration_stage
+и verification_status партнёра.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from backend.services.fns_service import is_temporary_failure
+
+logger = logging.getLogger(__name__)
+
+# Этапы регистрации
+STAGE_PENDING = 'inn_verification'
+STAGE_VERIFIED = 'inn_verified'
+STAGE_FAILED = 'inn_verification_failed'
+
+# Статусы проверки
+VERIFICATION_PENDING = 'pending'
+VERIFICATION_VERIFIED = 'pending_documents'
+VERIFICATION_FAILED = 'failed'
+
+# Итоги проверки
+OUTCOME_VERIFIED = 'verified'
+OUTCOME_FAILED = 'failed'
+OUTCOME_RETRY = 'retry'
+OUTCOME_SKIPPED = 'skipped'
+
+
+class RegistrationPipeline:
+    """
+    Очередь проверки ИНН новых партнёров
+
+    Временные ошибки (сеть, лимит, 5xx) повторяются с экспоненциальной
+    задержкой; после исчерпания повторов, как и при "ИНН не найден" и
+    прочих окончательных ошибках, регистрация завершается этапом inn_verification_failed. Очередь
+    живёт в памяти процесса: после рестарта зависшие регистрации
+    подбирает resume_pending_once() - в каждом процессе после fork, при
+    первом запросе, а не при импорте (пул мастера --preload воркерам
+    не достаётся). Отложенная на повтор проверка обновляет updated_at,
+    поэтому другой процесс не считает её зависшей.
+    """
+
+    def __init__(self, app, session, model, verifier=None, max_workers: Optional[int] = None,
+                 retries: Optional[int] = None, retry_delay: Optional[float] = None,
+                 timer: Callable = threading.Timer):
+        """
+        Args:
+            app: Приложение Flask: проверка выполняется в его контексте
+            session: Сессия SQLAlchemy (db.session)
+            model: Модель партнёра (Partner)
+            verifier: Проверка ИНН (по умолчанию get_company_verifier())
+            max_workers: Потоков проверки (REGISTRATION_WORKERS)
+            retries: Повторов временной ошибки (REGISTRATION_VERIFY_RETRIES)
+            retry_delay: Задержка первого повтора, сек (REGISTRATION_RETRY_DELAY)
+        """
+        self.app = app
+        self.session = session
+        self.model = model
+        self._verifier = verifier
+        self.max_workers = max_workers or int(os.getenv('REGISTRATION_WORKERS', 4))
+        self.retries = retries if retries is not None else int(os.getenv('REGISTRATION_VERIFY_RETRIES', 3))
+        # Не меньше FNS_ERROR_CACHE_TTL, иначе повтор получит ошибку из кэша
+        self.retry_delay = retry_delay if retry_delay is not None else float(
+            os.getenv('REGISTRATION_RETRY_DELAY', 60))
+        self._timer = timer
+
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        self._resumed_pid = None
+
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'in_progress': 0,
+            OUTCOME_VERIFIED: 0,
+            OUTCOME_FAILED: 0,
+            OUTCOME_RETRY: 0,
+            OUTCOME_SKIPPED: 0,
+            'errors': 0,
+        }
+        # Время от постановки в очередь до результата, сек
+        self._latencies = deque(maxlen=1000)
+
+    @property
+    def verifier(self):
+        if self._verifier is None:
+            from backend.services.company_providers import get_company_verifier
+            self._verifier = get_company_verifier()
+        return self._verifier
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Пул потоков процесса (после fork создаётся заново)"""
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='registration')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    # ==================== ОЧЕРЕДЬ ====================
+
+    def submit(self, partner_id: int, attempt: int = 0, queued_at: Optional[float] = None):
+        """Постановка проверки партнёра в очередь"""
+        queued_at = queued_at or time.perf_counter()
+        with self._stats_lock:
+            if attempt == 0:
+                self.stats['submitted'] += 1
+            self.stats['in_progress'] += 1
+        self._get_executor().submit(self._run, partner_id, attempt, queued_at)
+
+    def _run(self, partner_id: int, attempt: int, queued_at: float):
+        try:
+            with self.app.app_context():
+                outcome = self.verify(partner_id, attempt)
+        except Exception as e:
+            logger.error(f"Ошибка проверки регистрации партнёра {partner_id}: {e}")
+            outcome = None
+            with self._stats_lock:
+                self.stats['errors'] += 1
+        with self._stats_lock:
+            self.stats['in_progress'] -= 1
+            if outcome is not None:
+                self.stats[outcome] += 1
+            if outcome in (OUTCOME_VERIFIED, OUTCOME_FAILED):
+                self._latencies.append(time.perf_counter() - queued_at)
+
+        if outcome == OUTCOME_RETRY:
+            delay = self.retry_delay * 2 ** attempt
+            timer = self._timer(delay, self.submit, args=(partner_id, attempt + 1, queued_at))
+            timer.daemon = True
+            timer.start()
+
+    @property
+    def max_retry_delay(self) -> float:
+        """Самая долгая задержка повтора, сек"""
+        return self.retry_delay * 2 ** max(self.retries - 1, 0)
+
+    def resume_pending(self, older_than: Optional[float] = None) -> int:
+        """
+        Повторная постановка регистраций, застрявших на этапе проверки
+
+        Регистрация забирается обновлением updated_at: из нескольких
+        процессов, подбирающих зависшие проверки, её получит один.
+
+        Args:
+            older_than: Только не обновлявшиеся столько секунд
+                (REGISTRATION_RESUME_AFTER, но не меньше двух самых долгих
+                задержек повтора): свежие ещё в очереди других воркеров
+
+        Returns:
+            int: Сколько регистраций поставлено в очередь
+        """
+        if older_than is None:
+            older_than = max(float(os.getenv('REGISTRATION_RESUME_AFTER', 300)), 2 * self.max_retry_delay)
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=older_than)
+        stale = (
+            self.model.registration_stage == STAGE_PENDING,
+            self.model.updated_at < cutoff
+        )
+        ids = []
+        for row in self.session.query(self.model.id).filter(*stale).all():
+            claimed = self.session.query(self.model).filter(self.model.id == row.id, *stale).update(
+                {self.model.updated_at: now}, synchronize_session=False
+            )
+            self.session.commit()
+            if claimed:
+                ids.append(row.id)
+        for partner_id in ids:
+            self.submit(partner_id)
+        if ids:
+            logger.info(f"Возобновлена проверка {len(ids)} регистраций")
+        return len(ids)
+
+    def resume_pending_once(self) -> int:
+        """resume_pending() один раз в процессе (в контексте приложения)"""
+        with self._executor_lock:
+            if self._resumed_pid == os.getpid():
+                return 0
+            self._resumed_pid = os.getpid()
+        return self.resume_pending()
+
+    # ==================== ПРОВЕРКА ====================
+
+    def verify(self, partner_id: int, attempt: int = 0) -> str:
+        """
+        Проверка ИНН партнёра и запись результата (в контексте приложения)
+
+        Returns:
+            str: verified, failed, retry или skipped (партнёр удалён
+            или уже не на этапе проверки)
+        """
+        partner = self.session.get(self.model, partner_id)
+        if partner is None or partner.registration_stage != STAGE_PENDING:
+            return OUTCOME_SKIPPED
+
+        result = self.verifier.check_inn(partner.inn)
+        try:
+            outcome = self._apply(partner, result, attempt)
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+        return outcome
+
+    def _apply(self, partner, result: Dict, attempt: int) -> str:
+        if result['success']:
+            partner.verification_data = result.get('data')
+            partner.verification_date = datetime.utcnow()
+            partner.verification_method = result.get('provider', 'fns_api')
+            partner.verification_status = VERIFICATION_VERIFIED
+            partner.registration_stage = STAGE_VERIFIED
+            logger.info(f"Партнёр {partner.partner_code}: ИНН {partner.inn} подтверждён")
+            return OUTCOME_VERIFIED
+
+        error = result.get('error')
+        if is_temporary_failure(result) and attempt < self.retries:
+            # Отметка для resume_pending: проверка не зависла, а ждёт повтора
+            partner.updated_at = datetime.utcnow()
+            logger.info(f"Партнёр {partner.partner_code}: проверка ИНН отложена ({error}), "
+                        f"повтор {attempt + 1}/{self.retries}")
+            return OUTCOME_RETRY
+
+        partner.verification_data = {'error': error}
+        partner.verification_date = datetime.utcnow()
+        partner.verification_status = VERIFICATION_FAILED
+        partner.registration_stage = STAGE_FAILED
+        logger.warning(f"Партнёр {partner.partner_code}: ИНН {partner.inn} не подтверждён: {error}")
+        return OUTCOME_FAILED
+
+    # ==================== МЕТРИКИ ====================
+
+    def get_stats(self) -> Dict:
+        """Очередь, итоги и время до результата проверки"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+            latencies = sorted(self._latencies)
+        if latencies:
+            stats['latency_p50_ms'] = round(latencies[len(latencies) // 2] * 1000, 2)
+            stats['latency_p99_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2)
+        stats['workers'] = self.max_workers
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
@@ -0,0 +1,439 @@
+"""
+Фоновая повторная проверка ИНН зарегистрированных партнёров
+
+Данные ФНС сохраняются в Partner.verification_data при регистрации и сами
+не обновляются, поэтому ликвидированная компания остаётся "проверенной".
+Планировщик перепроверяет партнёров, начиная с самых давно проверенных
+(активные и платящие - раньше остальных). Запросы идут с фоновым
+приоритетом, то есть не занимают резервы регистраций и пакетных проверок.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, case, func, or_
+
+from backend.services.fns_circuit_breaker import STATE_OPEN
+from backend.services.fns_quota import PRIORITY_BACKGROUND
+from backend.services.fns_service import (
+    NOT_FOUND_ERROR, FNSService, get_fns_service, is_config_failure, is_temporary_failure
+)
+
+logger = logging.getLogger(__name__)
+
+# Статусы проверки, которые выставляет планировщик
+VERIFICATION_COMPANY_INACTIVE = 'company_inactive'
+VERIFICATION_NOT_FOUND = 'not_found'
+VERIFICATION_METHOD = 'fns_reverification'
+
+# Причины остановки прохода
+STOP_DONE = 'done'
+STOP_QUOTA = 'quota'
+STOP_CIRCUIT_OPEN = 'circuit_open'
+STOP_UNAVAILABLE = 'unavailable'
+STOP_LOCKED = 'locked'
+
+# Проход ведёт один процесс: блокировка в Redis на время прохода
+LOCK_KEY = 'fns:reverify:lock'
+# Итоги последнего прохода для метрик веб-приложения
+LAST_RUN_KEY = 'fns:reverify:last_run'
+# Запас времени жизни блокировки сверх запросов к API (выборка, запись в БД), сек
+LOCK_TTL_MARGIN = 60
+
+# Снятие блокировки только её владельцем
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class ReverificationScheduler:
+    """
+    Повторная проверка партнёров пачками
+
+    Порядок: активные, затем платящие (не trial и подписка не истекла), затем
+    по давности последней проверки (для не проверявшихся - даты регистрации).
+    Свежий результат из кэша лимит не расходует; перед каждым запросом к API
+    проверяется, что фоновым задачам остаётся больше FNS_REVERIFY_QUOTA_RESERVE.
+
+    Ликвидированная компания получает is_active=False, status='suspended'
+    и verification_status='company_inactive'. Обратное включение - вручную.
+    Временные ошибки API дату проверки не сдвигают: партнёр попадёт
+    в следующий проход. Окончательная ошибка (ответ 4xx) сдвигает дату
+    проверки без смены статуса, иначе такие партнёры выбирались бы первыми
+    в каждом проходе и вытесняли остальных. Ошибка настройки (ключ API
+    отклонён) останавливает проход: она относится ко всем партнёрам.
+
+    Проходы запускаются одним процессом (scripts/reverify_partners.py), а не
+    в каждом веб-воркере. Если у сервиса ФНС есть Redis, проход берёт
+    блокировку: второй запущенный планировщик пропускает проход (locked),
+    а не проверяет тех же партнёров повторно. Итоги прохода публикуются
+    в Redis, так что get_stats() в веб-приложении видит последний проход.
+    """
+
+    def __init__(self, session, model, service: Optional[FNSService] = None, log_model=None,
+                 interval_days: Optional[float] = None, batch_size: Optional[int] = None,
+                 quota_reserve: Optional[int] = None, lock_ttl: Optional[float] = None,
+                 clock: Callable[[], datetime] = datetime.utcnow):
+        """
+        Args:
+            session: Сессия SQLAlchemy (db.session)
+            model: Модель партнёра (Partner)
+            service: Сервис ФНС (по умолчанию общий get_fns_service() при первом обращении)
+            log_model: Модель журнала проверок (VerificationLog), если нужен журнал
+            interval_days: Как часто перепроверять партнёра (FNS_REVERIFY_INTERVAL_DAYS)
+            batch_size: Партнёров за один проход (FNS_REVERIFY_BATCH_SIZE)
+            quota_reserve: Запросов фонового остатка лимита, которые планировщик
+                не трогает (FNS_REVERIFY_QUOTA_RESERVE)
+            lock_ttl: Время жизни блокировки прохода, сек (FNS_REVERIFY_LOCK_TTL):
+                больше самого долгого прохода, после падения процесса она истечёт сама.
+                По умолчанию batch_size самых долгих запросов к API (с повторами)
+                плюс LOCK_TTL_MARGIN
+        """
+        self.session = session
+        self.model = model
+        self._service = service
+        self.log_model = log_model
+        self.interval_days = interval_days if interval_days is not None else float(
+            os.getenv('FNS_REVERIFY_INTERVAL_DAYS', 30))
+        self.batch_size = batch_size or int(os.getenv('FNS_REVERIFY_BATCH_SIZE', 50))
+        self.quota_reserve = quota_reserve if quota_reserve is not None else int(
+            os.getenv('FNS_REVERIFY_QUOTA_RESERVE', 0))
+        self._lock_ttl = lock_ttl or float(os.getenv('FNS_REVERIFY_LOCK_TTL') or 0)
+        self._clock = clock
+
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'runs': 0,
+            'checked': 0,
+            'api_requests': 0,
+            'cache_hits': 0,
+            'deactivated': 0,
+            'not_found': 0,
+            'errors': 0,
+            'skipped_locked': 0,
+        }
+        self.last_run: Optional[Dict] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def service(self) -> FNSService:
+        if self._service is None:
+            self._service = get_fns_service()
+        return self._service
+
+    @property
+    def lock_ttl(self) -> float:
+        """Время жизни блокировки: заданное или самый долгий проход"""
+        if self._lock_ttl:
+            return self._lock_ttl
+        return self.batch_size * self.service.max_request_seconds() + LOCK_TTL_MARGIN
+
+    # ==================== ВЫБОРКА ====================
+
+    def _last_checked(self):
+        """Дата последней проверки, для не проверявшихся - дата регистрации"""
+        return func.coalesce(self.model.verification_date, self.model.created_at)
+
+    def _due_query(self):
+        """Партнёры, которых пора перепроверить"""
+        cutoff = self._clock() - timedelta(days=self.interval_days)
+        return self.session.query(self.model).filter(
+            self.model.inn.isnot(None),
+            self._last_checked() < cutoff
+        )
+
+    def due_partners(self, limit: int) -> List:
+        """Партнёры к перепроверке в порядке приоритета"""
+        model = self.model
+        paying = and_(
+            model.subscription_plan.isnot(None),
+            model.subscription_plan != 'trial',
+            or_(model.subscription_expires.is_(None), model.subscription_expires > self._clock())
+        )
+        return (
+            self._due_query()
+            .order_by(
+                case((model.is_active.is_(True), 0), else_=1),
+                case((paying, 0), else_=1),
+                self._last_checked().asc()
+            )
+            .limit(limit)
+            .all()
+        )
+
+    def backlog(self) -> int:
+        """Сколько партнёров ждут перепроверки"""
+        return self._due_query().count()
+
+    def budget(self) -> int:
+        """Запросов к API, которые можно потратить с фоновым приоритетом"""
+        return max(0, self.service.quota.remaining(PRIORITY_BACKGROUND) - self.quota_reserve)
+
+    # ==================== ПРОВЕРКА ====================
+
+    def _stop_reason(self) -> Optional[str]:
+        """Почему запрос к API сейчас делать нельзя (None - можно)"""
+        if not self.service.available:
+            return STOP_UNAVAILABLE
+        if self.service.circuit_breaker.state == STATE_OPEN:
+            return STOP_CIRCUIT_OPEN
+        if self.budget() <= 0:
+            return STOP_QUOTA
+        return None
+
+    def _check(self, inn: str) -> Optional[Dict]:
+        """
+        Свежий результат проверки ИНН
+
+        Запись кэша моложе CACHE_TTL принимается без запроса. Индекс ЕГР
+        и устаревшие записи не используются: цель - актуальный статус.
+        None - запрос к API сейчас невозможен.
+        """
+        not_before = (datetime.now() - timedelta(seconds=self.service.cache_ttl)).isoformat()
+        cached = self.service._cached_result(inn, not_before)
+        # Запись из индекса ЕГР кладётся в кэш с текущим временем, но данные в ней - на дату выгрузки
+        if cached and (cached.get('data') or {}).get('source') != 'egr_index':
+            self._count('cache_hits')
+            return cached
+
+        if self._stop_reason():
+            return None
+        self._count('api_requests')
+        return self.service._coalesced_request(inn, force_refresh=True, priority=PRIORITY_BACKGROUND)
+
+    def _apply(self, partner, result: Dict, now: datetime) -> str:
+        """
+        Обновление партнёра по результату проверки
+
+        Returns:
+            str: Итог - verified, deactivated, not_found или error
+        """
+        if result['success']:
+            data = result['data']
+            partner.verification_data = data
+            partner.verification_date = now
+            partner.verification_method = VERIFICATION_METHOD
+            if data.get('is_active') or not partner.is_active:
+                return 'verified'
+            partner.is_active = False
+            partner.status = 'suspended'
+            partner.verification_status = VERIFICATION_COMPANY_INACTIVE
+            logger.warning(f"Партнёр {partner.partner_code} (ИНН {partner.inn}) отключён: "
+                           f"статус в реестре '{data.get('status', '')}'")
+            return 'deactivated'
+
+        if result.get('error') == NOT_FOUND_ERROR:
+            partner.verification_date = now
+            partner.verification_method = VERIFICATION_METHOD
+            partner.verification_status = VERIFICATION_NOT_FOUND
+            logger.warning(f"Партнёр {partner.partner_code}: ИНН {partner.inn} не найден в реестре")
+            return 'not_found'
+
+        if is_temporary_failure(result):
+            logger.info(f"Перепроверка ИНН {partner.inn} отложена: {result.get('error')}")
+            return 'error'
+
+        # Попытка учитывается: партнёр вернётся в очередь через interval_days
+        partner.verification_date = now
+        logger.warning(f"Перепроверка ИНН {partner.inn} не удалась: {result.get('error')}")
+        return 'error'
+
+    def _log(self, partner, result: Dict, outcome: str):
+        if self.log_model is None:
+            return
+        self.session.add(self.log_model(
+            partner_id=partner.id,
+            inn=partner.inn,
+            request_type='reverification',
+            response_data=result.get('data'),
+            status=outcome,
+            error_message=result.get('error')
+        ))
+
+    def _count(self, counter: str, n: int = 1):
+        with self._stats_lock:
+            self.stats[counter] += n
+
+    def _acquire_lock(self) -> Optional[str]:
+        """Блокировка прохода: токен владельца, '' - без Redis, None - занята"""
+        redis_client = self.service.redis_client
+        if not redis_client:
+            return ''
+        token = uuid.uuid4().hex
+        try:
+            if redis_client.set(LOCK_KEY, token, nx=True, px=int(self.lock_ttl * 1000)):
+                return token
+            return None
+        except Exception as e:
+            logger.error(f"Ошибка блокировки перепроверки в Redis: {e}")
+            return None
+
+    def _release_lock(self, token: str):
+        if not token:
+            return
+        try:
+            self.service.redis_client.eval(_RELEASE_SCRIPT, 1, LOCK_KEY, token)
+        except Exception as e:
+            # Блокировка истечёт через lock_ttl
+            logger.error(f"Ошибка снятия блокировки перепроверки: {e}")
+
+    def _publish_last_run(self, run: Dict):
+        redis_client = self.service.redis_client
+        if not redis_client:
+            return
+        try:
+            redis_client.set(LAST_RUN_KEY, json.dumps(run))
+        except Exception as e:
+            logger.error(f"Ошибка сохранения итогов перепроверки в Redis: {e}")
+
+    def _shared_state(self):
+        """Идёт ли проход в другом процессе и итоги последнего прохода (из Redis)"""
+        redis_client = self.service.redis_client
+        if not redis_client:
+            return False, None
+        try:
+            locked, last_run = redis_client.exists(LOCK_KEY), redis_client.get(LAST_RUN_KEY)
+            return bool(locked), json.loads(last_run) if last_run else None
+        except Exception as e:
+            logger.error(f"Ошибка чтения состояния перепроверки из Redis: {e}")
+            return False, None
+
+    def run_once(self) -> Dict:
+        """
+        Один проход: до batch_size партнёров
+
+        Если проход уже идёт в другом процессе, ничего не проверяется
+        (stop_reason=locked).
+
+        Returns:
+            Dict: Итоги прохода и причина остановки
+        """
+        token = self._acquire_lock()
+        if token is None:
+            self._count('skipped_locked')
+            logger.info("Перепроверка партнёров уже идёт в другом процессе, проход пропущен")
+            return {'started_at': self._clock().isoformat(), 'checked': 0, 'api_requests': 0,
+                    'stop_reason': STOP_LOCKED}
+        try:
+            return self._run_pass()
+        finally:
+            self._release_lock(token)
+
+    def _run_pass(self) -> Dict:
+        started_at = time.perf_counter()
+        now = self._clock()
+        outcomes = {'verified': 0, 'deactivated': 0, 'not_found': 0, 'error': 0}
+        api_requests_before = self.stats['api_requests']
+        stop_reason = STOP_DONE
+
+        if self.budget() > 0:
+            partners = self.due_partners(self.batch_size)
+        else:
+            partners, stop_reason = [], STOP_QUOTA
+
+        try:
+            for partner in partners:
+                result = self._check(partner.inn)
+                if result is None:
+                    stop_reason = self._stop_reason() or STOP_QUOTA
+                    break
+                if is_config_failure(result):
+                    logger.error(f"Перепроверка партнёров остановлена: {result.get('error')}")
+                    stop_reason = STOP_UNAVAILABLE
+                    break
+                outcome = self._apply(partner, result, now)
+                self._log(partner, result, outcome)
+                outcomes[outcome] += 1
+            self.session.commit()
+        except Exception:
+            self.session.rollback()
+            raise
+
+        checked = sum(outcomes.values())
+        duration = time.perf_counter() - started_at
+        with self._stats_lock:
+            self.stats['runs'] += 1
+            self.stats['checked'] += checked
+            self.stats['deactivated'] += outcomes['deactivated']
+            self.stats['not_found'] += outcomes['not_found']
+            self.stats['errors'] += outcomes['error']
+            self.last_run = {
+                'started_at': now.isoformat(),
+                'duration_ms': round(duration * 1000, 2),
+                'checked': checked,
+                'api_requests': self.stats['api_requests'] - api_requests_before,
+                'outcomes': outcomes,
+                'stop_reason': stop_reason,
+                'per_minute': round(checked / duration * 60, 1) if duration > 0 else 0.0,
+            }
+            run = dict(self.last_run)
+        self._publish_last_run(run)
+
+        logger.info(f"Перепроверка партнёров: {checked} проверено, {outcomes['deactivated']} отключено, "
+                    f"остановка: {stop_reason}")
+        return run
+
+    # ==================== ФОНОВЫЙ ЗАПУСК ====================
+
+    def start(self, app, period: Optional[float] = None) -> 'ReverificationScheduler':
+        """
+        Запуск проходов в фоновом потоке каждые period секунд (FNS_REVERIFY_PERIOD)
+
+        Только в одном процессе; веб-приложение планировщик не запускает.
+
+        Args:
+            app: Приложение Flask: проход выполняется в его контексте
+        """
+        period = period if period is not None else float(os.getenv('FNS_REVERIFY_PERIOD', 300))
+
+        def loop():
+            while not self._stop.wait(period):
+                try:
+                    with app.app_context():
+                        self.run_once()
+                except Exception as e:
+                    logger.error(f"Ошибка перепроверки партнёров: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name='fns-reverification', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # ==================== МЕТРИКИ ====================
+
+    def get_stats(self) -> Dict:
+        """Пропускная способность и очередь перепроверки"""
+        oldest = self.session.query(func.min(self._last_checked())).filter(
+            self.model.inn.isnot(None)
+        ).scalar()
+        with self._stats_lock:
+            stats = dict(self.stats)
+            last_run = dict(self.last_run) if self.last_run else None
+        locked, shared_last_run = self._shared_state()
+        stats.update({
+            'backlog': self.backlog(),
+            'oldest_check_age_days': round((self._clock() - oldest).total_seconds() / 86400, 1)
+            if oldest else None,
+            'interval_days': self.interval_days,
+            'budget': self.budget(),
+            'quota_reserve': self.quota_reserve,
+            'running': locked or (self._thread is not None and self._thread.is_alive()),
+            'last_run': shared_last_run or last_run,
+        })
+        return stats
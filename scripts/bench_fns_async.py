@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Сравнение пропускной способности синхронного и асинхронного клиентов API ФНС
+Запросы идут в локальную заглушку, лимит API не расходуется
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+# Добавляем путь к модулям проекта
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+os.environ.setdefault('FNS_API_KEY', 'benchmark-key')
+
+from backend.services.fns_service import FNSService
+from backend.services.fns_async_service import AsyncFNSService
+from scripts.fake_fns_server import FakeFNSServer
+
+
+def make_inns(count: int):
+    """Генерация валидных ИНН юр.лиц"""
+    coefficients = [2, 4, 10, 3, 5, 9, 4, 6, 8]
+    inns = []
+    for i in range(count):
+        prefix = f"77{i:07d}"
+        check_sum = sum(int(prefix[j]) * coefficients[j] for j in range(9)) % 11 % 10
+        inns.append(f"{prefix}{check_sum}")
+    return inns
+
+
+def fresh_service(base_url: str) -> FNSService:
+    """Сервис без кэша и с неограниченным лимитом"""
+    service = FNSService()
+    service.redis_client = None
+    service._init_cache()
+    service.daily_limit = 10 ** 9
+    service.base_url = base_url
+    return service
+
+
+async def run_async(service: FNSService, inns, concurrency: int):
+    async with AsyncFNSService(service, max_concurrency=concurrency) as client:
+        return await client.batch_check(inns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк sync/async клиентов API ФНС")
+    parser.add_argument("--count", type=int, default=500, help="Количество ИНН")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка заглушки, сек")
+    parser.add_argument("--workers", type=int, default=8, help="Потоки синхронного batch_check")
+    parser.add_argument("--concurrency", type=int, default=200, help="Конкурентность async клиента")
+    args = parser.parse_args()
+
+    inns = make_inns(args.count)
+
+    with FakeFNSServer(latency=args.latency) as server:
+        sync_report = fresh_service(server.base_url).batch_check(inns, max_workers=args.workers)
+        async_report = asyncio.run(run_async(fresh_service(server.base_url), inns, args.concurrency))
+
+    print(f"📊 {args.count} ИНН, задержка заглушки {args.latency * 1000:.0f} мс")
+    for name, report in (("sync", sync_report), ("async", async_report)):
+        seconds = report["wall_time_ms"] / 1000
+        print(f"  {name:5}: {seconds:.2f} с, {args.count / seconds:.0f} ИНН/с, "
+              f"успешно {report['successful']}/{report['total']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Сравнение кодеков записей кэша ФНС: размер записи в байтах
+и время кодирования/декодирования против прежнего JSON
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Добавляем путь к модулям проекта
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+os.environ.setdefault('FNS_API_KEY', 'benchmark-key')
+
+from backend.services.fns_codec import JsonCodec, MsgpackCodec, zstandard
+from backend.services.fns_service import FNSService, OUTCOME_NOT_FOUND, OUTCOME_OK
+
+
+def make_raw(index: int, founders: int) -> dict:
+    """Ответ API для юр.лица с учредителями или для ИП"""
+    suffix = f"{index:06d}"
+    if index % 4 == 0:
+        return {
+            "ФИО": f"Иванов Иван Иванович {suffix}",
+            "ОГРНИП": f"3{suffix}0000000",
+            "ДатаОГРНИП": "2015-03-12",
+            "Статус": "Действующий",
+            "Адрес": f"г. Москва, ул. Тестовая, д. {index % 200}",
+            "ОКВЭД": "47.91",
+            "ТекстОКВЭД": "Торговля розничная по почте или по информационно-коммуникационной сети Интернет",
+        }
+    return {
+        "НаимЮЛ": f"ОБЩЕСТВО С ОГРАНИЧЕННОЙ ОТВЕТСТВЕННОСТЬЮ \"СТРОИТЕЛЬНАЯ КОМПАНИЯ {suffix}\"",
+        "СокрНаимЮЛ": f"ООО \"СК {suffix}\"",
+        "ОГРН": f"1{suffix}000000",
+        "ДатаОГРН": "2010-07-01",
+        "Статус": "Действующее",
+        "Адрес": f"123456, г. Москва, ул. Тестовая, д. {index % 200}, офис {index % 50}",
+        "ОКВЭД": "41.20",
+        "ТекстОКВЭД": "Строительство жилых и нежилых зданий",
+        "Руководитель": "Генеральный директор Петров Петр Петрович",
+        "Учредители": [
+            {"ФИО": f"Учредитель {i} {suffix}", "ИНН": f"77{i:02d}{suffix}00", "Доля": 100 // founders}
+            for i in range(founders)
+        ],
+        "УстКап": "10000",
+    }
+
+
+def make_entries(count: int, founders: int) -> list:
+    """Записи кэша в том виде, в каком их сохраняет FNSService"""
+    service = FNSService.__new__(FNSService)
+    entries = []
+    for index in range(count):
+        if index % 10 == 9:
+            entries.append({"data": None, "timestamp": "2024-01-01T00:00:00",
+                            "outcome": OUTCOME_NOT_FOUND, "error": "Компания с указанным ИНН не найдена"})
+            continue
+        inn = f"77{index:08d}"
+        entries.append({"data": service._normalize_response(make_raw(index, founders), inn),
+                        "timestamp": "2024-01-01T00:00:00", "outcome": OUTCOME_OK})
+    return entries
+
+
+def measure(codec, entries: list) -> tuple:
+    started = time.perf_counter()
+    encoded = [codec.encode(entry) for entry in entries]
+    encode_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for raw in encoded:
+        codec.decode(raw)
+    decode_time = time.perf_counter() - started
+
+    return sum(map(len, encoded)) / len(encoded), encode_time, decode_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк кодеков кэша ФНС")
+    parser.add_argument("--count", type=int, default=50_000, help="Количество записей")
+    parser.add_argument("--founders", type=int, default=5, help="Учредителей у юр.лица")
+    args = parser.parse_args()
+
+    entries = make_entries(args.count, args.founders)
+    codecs = [
+        ("json (прежний)", JsonCodec()),
+        ("msgpack", MsgpackCodec(compression="none")),
+        ("msgpack+zlib", MsgpackCodec(compression="zlib")),
+    ]
+    if zstandard is not None:
+        codecs.append(("msgpack+zstd", MsgpackCodec(compression="zstd", level=3)))
+
+    print(f"📊 {args.count} записей, учредителей у юр.лица: {args.founders}")
+    baseline = None
+    for name, codec in codecs:
+        size, encode_time, decode_time = measure(codec, entries)
+        baseline = baseline or size
+        print(f"  {name:16} {size:8.0f} байт/запись ({size / baseline:6.1%})"
+              f"  encode {encode_time / args.count * 1e6:6.1f} мкс"
+              f"  decode {decode_time / args.count * 1e6:6.1f} мкс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Разбор больших ответов API ФНС: время и пиковое выделение памяти
+при полном json.loads против выборочного разбора fns_response
+
+Ответы берутся из файлов (--payload, тело ответа API как есть)
+или генерируются: юр.лицо с длинной историей изменений и учредителей.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Добавляем путь к модулям проекта
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+os.environ.setdefault('FNS_API_KEY', 'benchmark-key')
+
+from backend.services import fns_response
+from backend.services.fns_response import normalize_records, parse_records, records_from_data
+from scripts.bench_fns_cache_codec import make_raw
+
+
+def make_payload(records: int, founders: int, history: int) -> bytes:
+    """Ответ с несколькими записями, учредителями и историей изменений"""
+    items = []
+    for index in range(records):
+        record = make_raw(index * 4 + 1, founders)
+        record["Статус"] = "Действующее" if index == records - 1 else "Ликвидировано"
+        record["История"] = [
+            {"Дата": f"20{i % 20:02d}-01-01", "Изменение": "Смена состава учредителей",
+             "Учредители": record["Учредители"][:5]}
+            for i in range(history)
+        ]
+        items.append(record)
+    return json.dumps(items, ensure_ascii=False).encode("utf-8")
+
+
+def parse_full(body: bytes) -> dict:
+    """Прежний путь: весь ответ в объекты Python, затем отбор полей"""
+    return normalize_records(records_from_data(json.loads(body)), "7700000000")
+
+
+def parse_selective_json(body: bytes) -> dict:
+    """Отбор полей после json.loads (без ijson и для малых тел)"""
+    return normalize_records(parse_records(body, stream_min_bytes=len(body) + 1), "7700000000")
+
+
+def parse_stream(body: bytes) -> dict:
+    """Потоковый разбор ijson"""
+    return normalize_records(parse_records(body, stream_min_bytes=0), "7700000000")
+
+
+def measure(parse, body: bytes, repeats: int) -> tuple:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        parse(body)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    parse(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора ответов API ФНС")
+    parser.add_argument("--payload", action="append", default=[],
+                        help="Файл с телом ответа API (можно несколько)")
+    parser.add_argument("--records", type=int, default=3, help="Записей в сгенерированном ответе")
+    parser.add_argument("--founders", type=int, default=500, help="Учредителей у записи")
+    parser.add_argument("--history", type=int, default=5000, help="Изменений в истории записи")
+    parser.add_argument("--repeats", type=int, default=5, help="Повторов для медианы времени")
+    args = parser.parse_args()
+
+    payloads = [(Path(path).name, Path(path).read_bytes()) for path in args.payload]
+    if not payloads:
+        payloads = [("сгенерированный", make_payload(args.records, args.founders, args.history))]
+
+    parsers = [("json.loads (прежний)", parse_full), ("выборочный json", parse_selective_json)]
+    if fns_response.ijson is not None:
+        parsers.append((f"ijson ({fns_response.ijson.backend})", parse_stream))
+
+    for name, body in payloads:
+        print(f"📊 {name}: {len(body) / 1024:.0f} КБ")
+        for parser_name, parse in parsers:
+            latency, peak = measure(parse, body, args.repeats)
+            print(f"  {parser_name:24} {latency * 1000:9.2f} мс  пик памяти {peak / 1024:9.0f} КБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Влияние переиспользования соединений на массовую проверку ИНН
+Запросы идут в локальную заглушку, лимит API не расходуется
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import requests
+
+# Добавляем путь к модулям проекта
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+os.environ.setdefault('FNS_API_KEY', 'benchmark-key')
+
+from backend.services.fns_transport import build_session, connection_stats
+from scripts.bench_fns_async import fresh_service, make_inns
+from scripts.fake_fns_server import FakeFNSServer
+
+
+def no_keep_alive_session() -> requests.Session:
+    """Новое TCP-соединение на каждый запрос"""
+    session = build_session(pool_maxsize=1)
+    session.headers["Connection"] = "close"
+    return session
+
+
+def default_session() -> requests.Session:
+    """Пул как у requests.Session() по умолчанию (10 соединений)"""
+    return build_session(pool_maxsize=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пула соединений API ФНС")
+    parser.add_argument("--count", type=int, default=2000, help="Количество ИНН")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка заглушки, сек")
+    parser.add_argument("--workers", type=int, default=32, help="Потоки batch_check")
+    args = parser.parse_args()
+
+    variants = [
+        ("без keep-alive", no_keep_alive_session),
+        ("Session по умолчанию", default_session),
+        (f"пул на {args.workers}", lambda: build_session(pool_maxsize=args.workers)),
+    ]
+
+    print(f"📊 {args.count} ИНН, {args.workers} потоков, задержка заглушки {args.latency * 1000:.0f} мс")
+    for offset, (name, make_session) in enumerate(variants):
+        inns = make_inns(args.count * (offset + 1))[args.count * offset:]
+        with FakeFNSServer(latency=args.latency) as server:
+            service = fresh_service(server.base_url)
+            service.session = make_session()
+            report = service.batch_check(inns, max_workers=args.workers)
+            stats = connection_stats(service.session)
+
+        seconds = report["wall_time_ms"] / 1000
+        print(f"  {name:22} {seconds:6.2f} с, {args.count / seconds:6.0f} ИНН/с, "
+              f"TCP-соединений {server.connections_count:5} "
+              f"(клиент: {stats['new_connections']}), переиспользовано {stats['reuse_rate']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
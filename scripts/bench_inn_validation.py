@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Сравнение скорости проверки ИНН: построчная FNSService.validate_inn_format
+против массовой validate_inns_bulk на NumPy
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Добавляем путь к модулям проекта
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+os.environ.setdefault('FNS_API_KEY', 'benchmark-key')
+
+from backend.services.fns_service import FNSService
+from backend.services.inn_bulk_validator import validate_inns_bulk
+
+
+def make_sample(count: int, seed: int = 42) -> list:
+    """Смесь 10- и 12-значных ИНН, примерно 10% из них с верной суммой"""
+    rng = np.random.default_rng(seed)
+    sample = []
+    for length in rng.choice([10, 12], size=count):
+        sample.append("".join(map(str, rng.integers(0, 10, size=length))))
+    return sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк проверки ИНН")
+    parser.add_argument("--count", type=int, default=1_000_000, help="Количество ИНН")
+    args = parser.parse_args()
+
+    inns = make_sample(args.count)
+
+    started = time.perf_counter()
+    scalar = [FNSService.validate_inn_format(inn)[0] for inn in inns]
+    scalar_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    valid, _ = validate_inns_bulk(inns)
+    bulk_time = time.perf_counter() - started
+
+    assert valid.tolist() == scalar, "Результаты проверок расходятся"
+
+    print(f"📊 {args.count} ИНН, валидных {int(valid.sum())}")
+    print(f"  построчно: {scalar_time:.2f} с ({args.count / scalar_time:,.0f} ИНН/с)")
+    print(f"  NumPy:     {bulk_time:.2f} с ({args.count / bulk_time:,.0f} ИНН/с)")
+    print(f"  ускорение: x{scalar_time / bulk_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Скорость массового импорта партнёров: PartnerImporter против прежнего
+пути по одному партнёру (COUNT, поиск дубля и коммит на строку, без ФНС)
+
+Файл CSV генерируется: ИНН юр.лиц, часть строк с неверной
+контрольной суммой и повторами ИНН. База - временный файл SQLite.
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, func, insert, select
+
+# Добавляем путь к модулям проекта
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.services.partner_codes import DatabaseCodeAllocator
+from backend.services.partner_import import PartnerImporter, iter_rows
+from scripts.import_partners import load_models
+
+_LEGAL_COEFFICIENTS = [2, 4, 10, 3, 5, 9, 4, 6, 8]
+
+
+def legal_inn(number: int) -> str:
+    prefix = f"{number:09d}"
+    check_sum = sum(int(prefix[i]) * _LEGAL_COEFFICIENTS[i] for i in range(9)) % 11 % 10
+    return f"{prefix}{check_sum}"
+
+
+def make_csv(rows: int, invalid_every: int = 50, duplicate_every: int = 100) -> str:
+    """Выгрузка CRM: заголовки по-русски, разделитель ';'"""
+    target = io.StringIO()
+    writer = csv.writer(target, delimiter=";")
+    writer.writerow(["Наименование", "ИНН", "Контактное лицо", "Телефон", "E-mail"])
+    for index in range(rows):
+        inn = legal_inn(100000000 + index)
+        if index % invalid_every == 1:
+            inn = inn[:-1] + str((int(inn[-1]) + 1) % 10)
+        elif index % duplicate_every == 2:
+            inn = legal_inn(100000000 + index - 2)
+        writer.writerow([f"ООО Ромашка {index}", inn, "Иванов Иван", "+79990000000",
+                         f"partner{index}@example.com"])
+    return target.getvalue()
+
+
+def setup(path: str):
+    models = load_models()
+    engine = create_engine(f"sqlite:///{path}")
+    models.db.metadata.create_all(engine, tables=[models.Partner.__table__, models.CodeSequence.__table__])
+    return models, engine
+
+
+def run_bulk(content: str, path: str, chunk_size: int):
+    models, engine = setup(path)
+    allocator = DatabaseCodeAllocator(engine, models.CodeSequence.__table__, block_size=chunk_size)
+    importer = PartnerImporter(engine, models.Partner.__table__, allocator, chunk_size=chunk_size)
+    return importer.run(iter_rows(io.StringIO(content)))
+
+
+def run_row_by_row(content: str, path: str) -> tuple:
+    """Прежний путь регистрации без вызова ФНС"""
+    models, engine = setup(path)
+    table = models.Partner.__table__
+    started = time.perf_counter()
+    imported = 0
+    for row in iter_rows(io.StringIO(content)):
+        with engine.begin() as conn:
+            count = conn.execute(select(func.count()).select_from(table)).scalar()
+            if conn.execute(select(table.c.id).where(table.c.inn == row["inn"])).first():
+                continue
+            conn.execute(insert(table).values(
+                partner_code=f"P-{count + 1:06d}", company_name=row["company_name"], inn=row["inn"],
+                contact_person=row["contact_person"], phone=row["phone"], email=row["email"],
+            ))
+            imported += 1
+    return imported, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк импорта партнёров")
+    parser.add_argument("--rows", type=int, default=100_000, help="Строк в файле")
+    parser.add_argument("--baseline-rows", type=int, default=2_000,
+                        help="Строк для пути по одному партнёру (0 - не измерять)")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="Строк в пачке")
+    args = parser.parse_args()
+
+    content = make_csv(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run_bulk(content, os.path.join(tmp, "bulk.db"), args.chunk_size)
+        print(f"PartnerImporter:    {report.total:,} строк, импортировано {report.imported:,}, "
+              f"ошибок {len(report.errors):,}, {report.duration:.2f} с, {report.rows_per_second:,.0f} строк/с")
+
+        if args.baseline_rows:
+            sample = make_csv(args.baseline_rows)
+            imported, elapsed = run_row_by_row(sample, os.path.join(tmp, "rows.db"))
+            print(f"По одному партнёру: {args.baseline_rows:,} строк, импортировано {imported:,}, "
+                  f"{elapsed:.2f} с, {args.baseline_rows / elapsed:,.0f} строк/с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка API ФНС (https://api-fns.ru/api/egr)
+Используется в тестах и замерах производительности без расхода лимита
+
+Поддерживает распределения задержки, долю ошибок 5xx, ответы 429 при
+превышении лимита в секунду и записанные ответы (фикстуры). Сервис
+направляется на заглушку через FNS_API_BASE_URL:
+
+    python scripts/fake_fns_server.py --latency lognormal:0.08,0.5 --error-rate 0.02 --rate-limit 50
+    FNS_API_BASE_URL=http://127.0.0.1:8081/api python app.py
+
+Запись фикстур с настоящего API (расходует лимит, один раз на ИНН):
+
+    python scripts/fake_fns_server.py --fixtures tests/fixtures/fns --record --api-key KEY
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+UPSTREAM_URL = "https://api-fns.ru/api"
+
+
+def build_company(inn: str) -> dict:
+    """Типовая запись реестра для ИНН"""
+    if len(inn) == 12:
+        return {
+            "ФИО": f"Иванов Иван Иванович {inn[-4:]}",
+            "ОГРНИП": f"3{inn}00",
+            "Статус": "Действующий",
+            "Адрес": "г. Москва",
+            "ОКВЭД": "41.20",
+        }
+    return {
+        "НаимЮЛ": f"ООО \"Тестовая компания {inn[-4:]}\"",
+        "СокрНаимЮЛ": f"ООО \"ТК {inn[-4:]}\"",
+        "ОГРН": f"1{inn}77",
+        "Статус": "Действующее",
+        "Адрес": "г. Москва, ул. Тестовая, д. 1",
+        "ОКВЭД": "41.20",
+        "Руководитель": "Петров Петр Петрович",
+    }
+
+
+def parse_latency(spec: Union[str, float, None], rng: random.Random) -> Callable[[], float]:
+    """
+    Распределение задержки ответа по описанию
+
+    Форматы: "0.05" или "fixed:0.05" - постоянная, "uniform:0.02,0.2" -
+    равномерная, "lognormal:0.08,0.5" - логнормальная с медианой 0.08 с
+    и сигмой 0.5 (длинный хвост, как у реального API).
+    """
+    if spec is None or isinstance(spec, (int, float)):
+        value = float(spec or 0)
+        return lambda: value
+
+    kind, _, params = spec.partition(":")
+    if not params:
+        kind, params = "fixed", kind
+    values = [float(v) for v in params.split(",")]
+
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        low, high = values
+        return lambda: rng.uniform(low, high)
+    if kind == "lognormal":
+        median, sigma = values
+        mu = math.log(median)
+        return lambda: rng.lognormvariate(mu, sigma)
+    raise ValueError(f"Неизвестное распределение задержки: {spec}")
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    request_queue_size = 512
+    daemon_threads = True
+
+
+class FakeFNSServer:
+    """HTTP сервер, отвечающий как API ФНС"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: Union[str, float] = 0.0,
+                 error_rate: float = 0.0, not_found_rate: float = 0.0, rate_limit: float = 0.0,
+                 fixtures_dir: Optional[str] = None, record: bool = False,
+                 upstream_url: str = UPSTREAM_URL, api_key: str = "", seed: Optional[int] = None):
+        """
+        Args:
+            latency: Задержка ответа (сек) или описание распределения, см. parse_latency
+            error_rate: Доля ответов 500/502/503
+            not_found_rate: Доля пустых ответов (ИНН не найден)
+            rate_limit: Запросов в секунду, сверх которых отвечать 429 (0 - без лимита)
+            fixtures_dir: Каталог записанных ответов <ИНН>.json
+            record: Запрашивать отсутствующие ИНН у upstream_url и сохранять в fixtures_dir
+            api_key: Ключ настоящего API для записи
+            seed: Зерно генератора для воспроизводимых прогонов
+        """
+        self._rng = random.Random(seed)
+        self.latency = parse_latency(latency, self._rng)
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.rate_limit = rate_limit
+        self.fixtures_dir = Path(fixtures_dir) if fixtures_dir else None
+        self.record = record
+        self.upstream_url = upstream_url
+        self.api_key = api_key
+
+        self.requests_count = 0
+        self.connections_count = 0
+        self.status_counts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._tokens = float(max(1, rate_limit))
+        self._tokens_ts = time.monotonic()
+        self._thread = None
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1: соединение остаётся открытым для следующих запросов
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections_count += 1
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                if parsed.path == "/__stats":
+                    self._send(200, server.get_stats())
+                    return
+                if parsed.path != "/api/egr":
+                    self.send_error(404)
+                    return
+
+                inn = parse_qs(parsed.query).get("req", [""])[0]
+                with server._lock:
+                    server.requests_count += 1
+
+                delay = server.latency()
+                if delay > 0:
+                    time.sleep(delay)
+
+                status, payload, headers = server.respond(inn)
+                self._send(status, payload, headers)
+
+            def _send(self, status: int, payload, headers: Optional[Dict[str, str]] = None):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                if self.close_connection:
+                    self.send_header("Connection", "close")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = _HTTPServer((host, port), Handler)
+
+    def _take_token(self) -> Tuple[bool, float]:
+        """Ведро токенов лимита в секунду: (пропустить ли, через сколько повторить)"""
+        now = time.monotonic()
+        self._tokens = min(max(1.0, self.rate_limit), self._tokens + (now - self._tokens_ts) * self.rate_limit)
+        self._tokens_ts = now
+        if self._tokens < 1:
+            return False, (1 - self._tokens) / self.rate_limit
+        self._tokens -= 1
+        return True, 0.0
+
+    def respond(self, inn: str) -> Tuple[int, object, Dict[str, str]]:
+        """Статус, тело и заголовки ответа на запрос ИНН"""
+        with self._lock:
+            allowed, retry_after = self._take_token() if self.rate_limit > 0 else (True, 0.0)
+            roll = self._rng.random()
+
+        if not allowed:
+            return self._count(429, {"error": "Too Many Requests"},
+                               {"Retry-After": str(max(1, math.ceil(retry_after)))})
+        if roll < self.error_rate:
+            status = self._rng.choice((500, 502, 503))
+            return self._count(status, {"error": "Internal Server Error"})
+        if roll < self.error_rate + self.not_found_rate:
+            return self._count(200, {})
+
+        fixture = self.load_fixture(inn)
+        if fixture is None and self.record:
+            fixture = self.record_fixture(inn)
+        if fixture is not None:
+            return self._count(fixture.get("status", 200), fixture["body"])
+        return self._count(200, build_company(inn))
+
+    def _count(self, status: int, payload, headers: Optional[Dict[str, str]] = None):
+        with self._lock:
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        return status, payload, headers or {}
+
+    def _fixture_path(self, inn: str) -> Optional[Path]:
+        if self.fixtures_dir is None or not inn.isdigit():
+            return None
+        return self.fixtures_dir / f"{inn}.json"
+
+    def load_fixture(self, inn: str) -> Optional[dict]:
+        """Записанный ответ: {"status": 200, "body": ...}"""
+        path = self._fixture_path(inn)
+        if path is None or not path.exists():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def record_fixture(self, inn: str) -> Optional[dict]:
+        """Запрос ИНН у настоящего API и сохранение ответа как фикстуры"""
+        import requests
+
+        path = self._fixture_path(inn)
+        if path is None:
+            return None
+        response = requests.get(f"{self.upstream_url}/egr", params={"req": inn, "key": self.api_key}, timeout=30)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {"error": response.text}
+        fixture = {"status": response.status_code, "body": body}
+        if response.status_code == 200:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(fixture, f, ensure_ascii=False, indent=2)
+        return fixture
+
+    def get_stats(self) -> Dict:
+        """Счётчики запросов, соединений и статусов ответов (GET /__stats)"""
+        with self._lock:
+            return {
+                "requests": self.requests_count,
+                "connections": self.connections_count,
+                "statuses": {str(status): count for status, count in sorted(self.status_counts.items())},
+            }
+
+    @property
+    def base_url(self) -> str:
+        """Адрес для подстановки в FNSService.base_url (FNS_API_BASE_URL)"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+    def start(self) -> "FakeFNSServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка API ФНС")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", default="0.05",
+                        help="Задержка, сек, или fixed:X | uniform:A,B | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 5xx")
+    parser.add_argument("--not-found-rate", type=float, default=0.0, help="Доля ответов 'не найден'")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Запросов в секунду до ответов 429")
+    parser.add_argument("--fixtures", help="Каталог записанных ответов <ИНН>.json")
+    parser.add_argument("--record", action="store_true", help="Записывать отсутствующие ответы с настоящего API")
+    parser.add_argument("--api-key", default="", help="Ключ настоящего API для --record")
+    parser.add_argument("--seed", type=int, help="Зерно генератора")
+    args = parser.parse_args()
+
+    if args.record and not (args.fixtures and args.api_key):
+        parser.error("--record требует --fixtures и --api-key")
+
+    server = FakeFNSServer(args.host, args.port, args.latency, error_rate=args.error_rate,
+                           not_found_rate=args.not_found_rate, rate_limit=args.rate_limit,
+                           fixtures_dir=args.fixtures, record=args.record, api_key=args.api_key,
+                           seed=args.seed)
+    print(f"🚀 Заглушка API ФНС: {server.base_url}")
+    print(f"   FNS_API_BASE_URL={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
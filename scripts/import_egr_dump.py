@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Импорт открытых выгрузок ЕГРЮЛ/ЕГРИП в локальный индекс
+
+Файлы XML (в том числе внутри zip-архивов ФНС) и CSV читаются потоком,
+в память целиком не загружаются. Готовый индекс подключается через
+FNS_EGR_INDEX_PATH.
+
+Примеры:
+    python scripts/import_egr_dump.py data/egrul/*.zip --index data/egr_index.sqlite
+    python scripts/import_egr_dump.py companies.csv --delimiter ";"
+"""
+
+import argparse
+import io
+import itertools
+import os
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+# Добавляем путь к модулям проекта
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from backend.services.egr_index import build_index, iter_csv_records, iter_xml_records
+
+
+def iter_file(path: str, delimiter: str):
+    """Записи одного файла выгрузки"""
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for name in archive.namelist():
+                if name.lower().endswith(".xml"):
+                    with archive.open(name) as source:
+                        yield from iter_xml_records(source)
+                elif name.lower().endswith(".csv"):
+                    with archive.open(name) as source:
+                        yield from iter_csv_records(io.TextIOWrapper(source, encoding="utf-8-sig"), delimiter)
+    elif path.lower().endswith(".xml"):
+        with open(path, "rb") as source:
+            yield from iter_xml_records(source)
+    else:
+        with open(path, encoding="utf-8-sig", newline="") as source:
+            yield from iter_csv_records(source, delimiter)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт выгрузок ЕГРЮЛ/ЕГРИП в локальный индекс")
+    parser.add_argument("files", nargs="+", help="Файлы XML, CSV или zip-архивы")
+    parser.add_argument("--index", default=os.getenv("FNS_EGR_INDEX_PATH", "data/egr_index.sqlite"),
+                        help="Путь к файлу индекса")
+    parser.add_argument("--delimiter", default=";", help="Разделитель CSV")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Записей в пачке вставки")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    records = itertools.chain.from_iterable(iter_file(path, args.delimiter) for path in args.files)
+
+    def progress(processed: int):
+        elapsed = time.perf_counter() - started
+        print(f"  обработано {processed:,} записей ({processed / elapsed:,.0f} в сек)", flush=True)
+
+    print(f"📥 Импорт {len(args.files)} файлов в {args.index}")
+    count = build_index(args.index, records, source=", ".join(os.path.basename(p) for p in args.files),
+                        batch_size=args.batch_size, progress=progress)
+    size_mb = os.path.getsize(args.index) / 1024 / 1024
+    print(f"✅ В индексе {count:,} записей, {size_mb:.1f} МБ, {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Массовый импорт партнёров из выгрузки CRM (CSV или JSONL)
+
+Строки проверяются и вставляются пачками, API ФНС не вызывается:
+партнёры получают этап imported. Ошибки по строкам пишутся в --report.
+
+Примеры:
+    python scripts/import_partners.py crm_partners.csv --report errors.csv
+    python scripts/import_partners.py partners.jsonl --dry-run
+"""
+
+import argparse
+import csv
+import importlib.util
+import os
+import sys
+import time
+from pathlib import Path
+
+# Добавляем путь к модулям проекта
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine
+
+from backend.services.partner_codes import count_start, create_code_allocator
+from backend.services.partner_import import PartnerImporter, detect_format, iter_rows
+
+
+def load_models():
+    """backend/models.py по пути: пакет backend/models перекрывает модуль"""
+    spec = importlib.util.spec_from_file_location(
+        "backend_models_db", Path(__file__).parent.parent / "backend" / "models.py"
+    )
+    models = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(models)
+    return models
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Импорт партнёров из CSV/JSONL")
+    parser.add_argument("files", nargs="+", help="Файлы CSV или JSONL")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Формат (по умолчанию по расширению)")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "sqlite:///haus_price.db"),
+                        help="База данных")
+    parser.add_argument("--chunk-size", type=int, help="Строк в пачке и транзакции")
+    parser.add_argument("--dry-run", action="store_true", help="Только проверка, без записи")
+    parser.add_argument("--report", help="CSV с ошибками по строкам")
+    args = parser.parse_args()
+
+    models = load_models()
+    engine = create_engine(args.database_url)
+    models.db.metadata.create_all(engine, tables=[models.Partner.__table__, models.CodeSequence.__table__])
+    # Тот же счётчик, что у приложения: нумерация продолжает уже выданные коды
+    allocator = create_code_allocator(engine, models.CodeSequence.__table__, block_size=args.chunk_size,
+                                      start=count_start(engine, models.Partner.__table__))
+
+    def progress(report):
+        print(f"  обработано {report.total:,} строк ({report.rows_per_second:,.0f} в сек)", flush=True)
+
+    started = time.perf_counter()
+    reports = []
+    for path in args.files:
+        print(f"📥 {path}")
+        importer = PartnerImporter(engine, models.Partner.__table__, allocator,
+                                   chunk_size=args.chunk_size, dry_run=args.dry_run)
+        with open(path, encoding="utf-8-sig", newline="") as source:
+            report = importer.run(iter_rows(source, args.format or detect_format(path)), progress=progress)
+        reports.append((path, report))
+        print(f"  импортировано {report.imported:,} из {report.total:,}, ошибок {len(report.errors):,}, "
+              f"{report.rows_per_second:,.0f} строк в сек")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8", newline="") as target:
+            writer = csv.writer(target)
+            writer.writerow(["file", "row", "inn", "error"])
+            for path, report in reports:
+                writer.writerows([path, error["row"], error["inn"], error["error"]] for error in report.errors)
+        print(f"📄 Ошибки записаны в {args.report}")
+
+    imported = sum(report.imported for _, report in reports)
+    total = sum(report.total for _, report in reports)
+    action = "проверено" if args.dry_run else "импортировано"
+    print(f"✅ {action} {imported:,} из {total:,} строк, {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
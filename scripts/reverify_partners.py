@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Фоновая перепроверка ИНН партнёров по реестру ФНС
+
+Запускается одним процессом отдельно от веб-воркеров (systemd, отдельный
+контейнер или cron с --once): планировщик в каждом воркере gunicorn брал бы
+одних и тех же партнёров и тратил на них лимит API. С Redis (REDIS_URL)
+случайно запущенный второй экземпляр пропускает проходы, пока идёт первый.
+
+Примеры:
+    python scripts/reverify_partners.py               # проход каждые FNS_REVERIFY_PERIOD сек
+    python scripts/reverify_partners.py --once        # один проход (cron)
+"""
+
+import argparse
+import importlib.util
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+# Добавляем путь к модулям проекта
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from flask import Flask
+
+from backend.services.reverification_scheduler import ReverificationScheduler
+
+
+def load_models():
+    """backend/models.py по пути: пакет backend/models перекрывает модуль"""
+    spec = importlib.util.spec_from_file_location(
+        "backend_models_db", Path(__file__).parent.parent / "backend" / "models.py"
+    )
+    models = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(models)
+    return models
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перепроверка ИНН партнёров по реестру ФНС")
+    parser.add_argument("--once", action="store_true", help="Один проход и выход")
+    parser.add_argument("--period", type=float, default=float(os.getenv("FNS_REVERIFY_PERIOD", 300)),
+                        help="Пауза между проходами, сек")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL", "sqlite:///haus_price.db"),
+                        help="База данных")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    models = load_models()
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = args.database_url
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    models.db.init_app(app)
+
+    scheduler = ReverificationScheduler(models.db.session, models.Partner, log_model=models.VerificationLog)
+    print(f"🔁 Перепроверка партнёров, база {args.database_url}")
+    while True:
+        try:
+            with app.app_context():
+                run = scheduler.run_once()
+            print(f"  проверено {run['checked']}, запросов к API {run['api_requests']}, "
+                  f"остановка: {run['stop_reason']}", flush=True)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Ошибка перепроверки партнёров: {e}")
+        if args.once:
+            break
+        try:
+            time.sleep(args.period)
+        except KeyboardInterrupt:
+            break
+
+
+if __name__ == "__main__":
+    main()
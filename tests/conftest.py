@@ -0,0 +1,30 @@
+"""
+Общие фикстуры тестов
+"""
+
+import os
+import sys
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+from backend.services.fns_service import FNSService
+from backend.services.fns_transport import RetryPolicy
+from tests.fns_helpers import FakeSession
+
+
+@pytest.fixture
+def service():
+    """Сервис с in-memory кэшем и подменённой сессией"""
+    fns = FNSService()
+    fns.redis_client = None
+    fns._init_cache()
+    fns.session = FakeSession(delay=0.05)
+    fns.retry_policy = RetryPolicy(max_attempts=1)
+    fns.quota.lend_from_hour = None
+    return fns
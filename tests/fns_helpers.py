@@ -0,0 +1,62 @@
+"""
+Общие заглушки тестов проверки ИНН: валидные ИНН, ответы и сессия API ФНС
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+def make_inn(prefix: str) -> str:
+    """Дополняет 9 цифр контрольной суммой до валидного ИНН юр.лица"""
+    coefficients = [2, 4, 10, 3, 5, 9, 4, 6, 8]
+    check_sum = sum(int(prefix[i]) * coefficients[i] for i in range(9)) % 11 % 10
+    return f"{prefix}{check_sum}"
+
+
+class FakeResponse:
+    """Ответ API ФНС для подмены requests"""
+
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.text = json.dumps(payload, ensure_ascii=False)
+        self.content = self.text.encode("utf-8")
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """Сессия, имитирующая API ФНС с задержкой"""
+
+    def __init__(self, delay=0.0, status_code=200, payload=None):
+        self.delay = delay
+        self.status_code = status_code
+        self.payload = payload
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        with self._lock:
+            self.calls.append(params['req'])
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        if self.payload is not None:
+            return FakeResponse(self.payload, self.status_code)
+        return FakeResponse({"НаимЮЛ": f"ООО Тест {params['req']}", "Статус": "Действующее"},
+                            self.status_code)
+
+
+def age_entry(service, inn, seconds):
+    """Состарить запись кэша на seconds секунд"""
+    key = service._get_cache_key(inn)
+    entry = dict(service._get_from_cache(inn))
+    entry['timestamp'] = (datetime.now() - timedelta(seconds=seconds)).isoformat()
+    service.cache.set(key, entry, service.outcome_ttl['ok'])
@@ -0,0 +1,250 @@
+"""
+Тесты источников проверки ИНН и хеджированных запросов
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+from backend.services.company_providers import (
+    CompanyProvider, FNSProvider, HedgedVerifier, KonturProvider
+)
+from backend.services.fns_quota import InMemoryQuotaLimiter
+from backend.services.fns_service import NOT_FOUND_ERROR, FNSService
+from backend.services.fns_transport import RetryPolicy
+from tests.fns_helpers import FakeResponse, FakeSession, make_inn
+
+INN = make_inn("770708389")
+
+
+class StubProvider(CompanyProvider):
+    """Источник с заданной задержкой и ответом"""
+
+    def __init__(self, name, delay=0.0, outcome="ok", daily_limit=None, cost=0.0):
+        quota = InMemoryQuotaLimiter(daily_limit) if daily_limit is not None else None
+        super().__init__(cost=cost, quota=quota)
+        self.name = name
+        self.delay = delay
+        self.outcome = outcome
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def lookup(self, inn, priority="interactive"):
+        with self._lock:
+            self.calls.append(inn)
+        if self.quota is not None:
+            self.quota.try_acquire(priority=priority)
+        time.sleep(self.delay)
+        if self.outcome == "ok":
+            return {"success": True, "inn": inn, "cached": False,
+                    "data": {"inn": inn, "company_name": f"ООО {self.name}", "is_active": True,
+                             "source": self.name}}
+        error = NOT_FOUND_ERROR if self.outcome == "not_found" else "Ошибка сети"
+        return {"success": False, "error": error, "inn": inn, "cached": False}
+
+    def warm_up(self, latency, samples=20):
+        """Замеры задержки для p95"""
+        for _ in range(samples):
+            self.record({"success": True, "cached": False, "data": {}}, latency)
+
+
+def make_verifier(*providers, **kwargs):
+    kwargs.setdefault("default_delay", 1.0)
+    kwargs.setdefault("min_delay", 0.0)
+    return HedgedVerifier(list(providers), **kwargs)
+
+
+class TestHedgedVerifier:
+    """Тесты выбора источника"""
+
+    def test_fast_primary_no_hedge(self):
+        """Быстрый основной источник: резервный не запрашивается"""
+        primary, secondary = StubProvider("fns_api", delay=0.01), StubProvider("kontur")
+        result = make_verifier(primary, secondary).check_inn(INN)
+
+        assert result["success"] is True
+        assert result["provider"] == "fns_api"
+        assert secondary.calls == []
+
+    def test_hedge_after_p95(self):
+        """Основной не ответил за своё p95: запускается резервный"""
+        primary = StubProvider("fns_api", delay=0.5)
+        primary.warm_up(0.05)
+        secondary = StubProvider("kontur", delay=0.01)
+        verifier = make_verifier(primary, secondary)
+
+        started = time.perf_counter()
+        result = verifier.check_inn(INN)
+        elapsed = time.perf_counter() - started
+
+        assert result["provider"] == "kontur"
+        assert elapsed < 0.3
+        assert verifier.hedge_delay(primary) == pytest.approx(0.05)
+        assert secondary.stats["hedged"] == 1
+        assert secondary.stats["wins"] == 1
+
+    def test_default_delay_without_samples(self):
+        """Без замеров ждём default_delay, а не запускаем оба источника сразу"""
+        primary, secondary = StubProvider("fns_api", delay=0.1), StubProvider("kontur")
+        result = make_verifier(primary, secondary, default_delay=0.5).check_inn(INN)
+
+        assert result["provider"] == "fns_api"
+        assert secondary.calls == []
+
+    def test_fallback_on_error(self):
+        """Ошибка основного источника: сразу запрашивается следующий"""
+        primary = StubProvider("fns_api", outcome="error")
+        secondary = StubProvider("kontur")
+        result = make_verifier(primary, secondary, default_delay=5).check_inn(INN)
+
+        assert result["success"] is True
+        assert result["provider"] == "kontur"
+        assert primary.stats["errors"] == 1
+
+    def test_not_found_is_final(self):
+        """'Не найден' - окончательный ответ, резервный не запрашивается"""
+        primary = StubProvider("fns_api", outcome="not_found")
+        secondary = StubProvider("kontur")
+        result = make_verifier(primary, secondary).check_inn(INN)
+
+        assert result["error"] == NOT_FOUND_ERROR
+        assert secondary.calls == []
+
+    def test_all_failed(self):
+        """Все источники ответили ошибкой: возвращается последняя"""
+        result = make_verifier(StubProvider("a", outcome="error"), StubProvider("b", outcome="error")).check_inn(INN)
+
+        assert result["success"] is False
+        assert result["provider"] == "b"
+
+    def test_skips_provider_without_quota(self):
+        """Источник с исчерпанным лимитом пропускается"""
+        primary = StubProvider("kontur", daily_limit=1)
+        primary.quota.try_acquire()
+        secondary = StubProvider("fns_api")
+        result = make_verifier(primary, secondary).check_inn(INN)
+
+        assert result["provider"] == "fns_api"
+        assert primary.calls == []
+
+    def test_invalid_inn(self):
+        """Неверный формат не отправляется ни в один источник"""
+        primary = StubProvider("fns_api")
+        result = make_verifier(primary).check_inn("123")
+
+        assert result["success"] is False
+        assert primary.calls == []
+
+    def test_cost_accounting(self):
+        """Расходы: стоимость запроса * использовано лимита"""
+        provider = StubProvider("kontur", daily_limit=10, cost=2.5)
+        verifier = make_verifier(provider)
+        for prefix in ("710000001", "710000002"):
+            verifier.check_inn(make_inn(prefix))
+
+        stats = verifier.get_stats()["kontur"]
+        assert stats["used_today"] == 2
+        assert stats["spent_today"] == 5.0
+        assert stats["remaining"] == 8
+
+
+class KonturSession:
+    """Ответы Контур.Фокуса по ИНН"""
+
+    def __init__(self, items):
+        self.items = items
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.requests.append((url, params, headers))
+        return FakeResponse(self.items.get(params["inn"], []))
+
+
+class TestKonturProvider:
+    """Тесты источника Контур.Фокус"""
+
+    def make_provider(self, items):
+        provider = KonturProvider(api_key="kontur-key", base_url="http://kontur.local/api3", daily_limit=5)
+        provider.session = KonturSession(items)
+        return provider
+
+    def test_legal_entity(self):
+        """Юр.лицо приводится к общему виду"""
+        provider = self.make_provider({INN: [{
+            "inn": INN,
+            "ogrn": "1027700132195",
+            "UL": {
+                "legalName": {"short": "ПАО Сбербанк", "full": "ПАО \"Сбербанк России\""},
+                "legalAddress": {"parsedAddressRF": {
+                    "zipCode": "117312",
+                    "regionName": {"topoShortName": "г", "topoValue": "Москва"},
+                    "street": {"topoShortName": "ул", "topoValue": "Вавилова"},
+                    "house": {"topoShortName": "д", "topoValue": "19"},
+                }},
+                "status": {"statusString": "Действующее"},
+                "heads": [{"fio": "Греф Герман Оскарович"}],
+                "registrationDate": "1991-06-20",
+            },
+        }]})
+
+        result = provider.lookup(INN)
+
+        assert result["success"] is True
+        data = result["data"]
+        assert data["company_name"] == "ПАО \"Сбербанк России\""
+        assert data["address"] == "117312, г Москва, ул Вавилова, д 19"
+        assert data["director"] == "Греф Герман Оскарович"
+        assert data["is_active"] is True
+        assert data["source"] == "kontur"
+        url, params, headers = provider.session.requests[0]
+        assert url == "http://kontur.local/api3/req"
+        assert headers["Authorization"] == "Bearer kontur-key"
+        assert provider.quota.used_today() == 1
+
+    def test_dissolved(self):
+        """Ликвидированная компания неактивна"""
+        provider = self.make_provider({INN: [{
+            "inn": INN, "UL": {"legalName": {"short": "ООО Старт"}, "status": {"dissolved": True}}
+        }]})
+        assert provider.lookup(INN)["data"]["is_active"] is False
+
+    def test_not_found(self):
+        """Пустой ответ - ИНН не найден"""
+        result = self.make_provider({}).lookup(INN)
+        assert result["error"] == NOT_FOUND_ERROR
+
+    def test_unavailable_without_key(self):
+        """Без ключа источник не используется"""
+        assert KonturProvider(api_key="").available is False
+
+
+class TestFNSProvider:
+    """Тесты источника API ФНС"""
+
+    def test_common_company_info(self):
+        """Ответ ФНС отдаётся с именем источника и в виде CompanyInfo"""
+        service = FNSService()
+        service.redis_client = None
+        service._init_cache()
+        service.session = FakeSession()
+        service.retry_policy = RetryPolicy(max_attempts=1)
+        verifier = make_verifier(FNSProvider(service))
+
+        result = verifier.check_inn(INN)
+        info = verifier.check_company(INN)
+
+        assert result["provider"] == "fns_api"
+        assert info.inn == INN
+        assert info.company_name == f"ООО Тест {INN}"
+        assert info.is_active is True
+        assert info.verification_date is not None
+        assert len(service.session.calls) == 1
@@ -0,0 +1,159 @@
+"""
+Тесты локального индекса ЕГРЮЛ/ЕГРИП
+"""
+
+import io
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+from backend.services.egr_index import EGRIndex, build_index, iter_csv_records, iter_xml_records
+from tests.fns_helpers import make_inn
+
+XML_DUMP = """<?xml version="1.0" encoding="utf-8"?>
+<Файл ИдФайл="EGRUL_TEST" ВерсФорм="4.06">
+  <Документ ИдДок="1">
+    <СвЮЛ ИНН="7707083893" ОГРН="1027700132195" ДатаОГРН="2002-08-16">
+      <СвНаимЮЛ НаимЮЛПолн="ПУБЛИЧНОЕ АКЦИОНЕРНОЕ ОБЩЕСТВО &quot;СБЕРБАНК РОССИИ&quot;">
+        <СвНаимЮЛСокр НаимСокр="ПАО СБЕРБАНК"/>
+      </СвНаимЮЛ>
+      <СвАдресЮЛ>
+        <АдресРФ Индекс="117312" Дом="19">
+          <Регион ТипРегион="ГОРОД" НаимРегион="МОСКВА"/>
+          <Улица ТипУлица="УЛИЦА" НаимУлица="ВАВИЛОВА"/>
+        </АдресРФ>
+      </СвАдресЮЛ>
+      <СведДолжнФЛ><СвФЛ Фамилия="ГРЕФ" Имя="ГЕРМАН" Отчество="ОСКАРОВИЧ"/></СведДолжнФЛ>
+      <СвОКВЭД><СвОКВЭДОсн КодОКВЭД="64.19" НаимОКВЭД="Денежное посредничество прочее"/></СвОКВЭД>
+    </СвЮЛ>
+  </Документ>
+  <Документ ИдДок="2">
+    <СвИП ИННФЛ="500100732259" ОГРНИП="304500116000157" ДатаОГРНИП="2004-01-01">
+      <СвФЛ><ФИОРус Фамилия="ИВАНОВ" Имя="ИВАН" Отчество="ИВАНОВИЧ"/></СвФЛ>
+      <СвПрекрИП ДатаПрекрИП="2020-01-01"/>
+    </СвИП>
+  </Документ>
+</Файл>
+"""
+
+
+class TestParsers:
+    """Тесты разбора выгрузок"""
+
+    def test_xml_records(self):
+        """Юр.лица и ИП разбираются в формат ответа API"""
+        records = dict(iter_xml_records(io.BytesIO(XML_DUMP.encode("utf-8"))))
+
+        company = records["7707083893"]
+        assert company["НаимЮЛ"] == 'ПУБЛИЧНОЕ АКЦИОНЕРНОЕ ОБЩЕСТВО "СБЕРБАНК РОССИИ"'
+        assert company["СокрНаимЮЛ"] == "ПАО СБЕРБАНК"
+        assert company["Статус"] == "Действующее"
+        assert company["Руководитель"] == "ГРЕФ ГЕРМАН ОСКАРОВИЧ"
+        assert company["Адрес"] == "117312, ГОРОД МОСКВА, УЛИЦА ВАВИЛОВА, 19"
+        assert company["ОКВЭД"] == "64.19"
+
+        entrepreneur = records["500100732259"]
+        assert entrepreneur["ФИО"] == "ИВАНОВ ИВАН ИВАНОВИЧ"
+        assert entrepreneur["Статус"] == "Прекратил деятельность"
+
+    def test_csv_records(self):
+        """Колонки CSV переводятся в поля API, пустые пропускаются"""
+        source = io.StringIO("inn;company_name;status;director\n7707083893;ПАО Сбербанк;Действующее;\n;x;y;z\n")
+
+        assert list(iter_csv_records(source)) == [
+            ("7707083893", {"НаимЮЛ": "ПАО Сбербанк", "Статус": "Действующее"})
+        ]
+
+
+class TestEGRIndex:
+    """Тесты построения и чтения индекса"""
+
+    def test_build_and_lookup(self, tmp_path):
+        """Записи находятся по ИНН, статистика показывает объём и возраст"""
+        path = str(tmp_path / "egr.sqlite")
+        records = iter_xml_records(io.BytesIO(XML_DUMP.encode("utf-8")))
+
+        assert build_index(path, records, source="test.xml", batch_size=1) == 2
+
+        index = EGRIndex(path)
+        assert index.lookup("7707083893")["ОГРН"] == "1027700132195"
+        assert index.lookup("7707083894") is None
+        stats = index.get_stats()
+        assert stats["records"] == 2
+        assert stats["source"] == "test.xml"
+        assert stats["fresh"] is True
+        assert stats["age_days"] < 1
+
+    def test_reopens_replaced_index(self, tmp_path):
+        """После переимпорта читатель видит новый файл"""
+        path = str(tmp_path / "egr.sqlite")
+        build_index(path, [("7707083893", {"НаимЮЛ": "Старое"})])
+        index = EGRIndex(path)
+        assert index.lookup("7707083893")["НаимЮЛ"] == "Старое"
+
+        build_index(path, [("7707083893", {"НаимЮЛ": "Новое"})])
+        os.utime(path, (0, 0))
+
+        assert index.lookup("7707083893")["НаимЮЛ"] == "Новое"
+
+    def test_missing_index(self, tmp_path):
+        """Без файла индекса поиск ничего не находит"""
+        index = EGRIndex(str(tmp_path / "missing.sqlite"))
+
+        assert index.lookup("7707083893") is None
+        assert index.get_stats()["enabled"] is False
+
+
+class TestServiceIndex:
+    """Использование индекса в FNSService"""
+
+    @pytest.fixture
+    def indexed_service(self, service, tmp_path):
+        path = str(tmp_path / "egr.sqlite")
+        build_index(path, [(make_inn("770000001"), {"НаимЮЛ": "ООО Индекс", "Статус": "Действующее"})])
+        service.egr_index = EGRIndex(path)
+        return service
+
+    def test_index_before_api(self, indexed_service):
+        """ИНН из индекса не расходует запрос к API и попадает в кэш"""
+        inn = make_inn("770000001")
+
+        result = indexed_service.check_inn(inn)
+        assert result["success"] and result["data"]["source"] == "egr_index"
+        assert result["data"]["index_imported_at"] == indexed_service.egr_index.imported_at()
+        assert result["data"]["is_active"] is True
+        assert indexed_service.check_inn(inn)["cached"] is True
+        assert indexed_service.session.calls == []
+        assert indexed_service.quota.used_today() == 0
+
+        stats = indexed_service.get_usage_stats()["egr_index"]
+        assert stats["records"] == 1 and stats["hits"] == 1
+
+    def test_batch_counts_index_hits(self, indexed_service):
+        """Массовая проверка берёт из индекса, остальное - из API"""
+        report = indexed_service.batch_check([make_inn("770000001"), make_inn("770000002")])
+
+        assert report["index_hits"] == 1
+        assert report["api_requests"] == 1
+
+    def test_stale_index_ignored(self, indexed_service):
+        """Устаревший индекс не используется"""
+        conn = sqlite3.connect(indexed_service.egr_index.path)
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'imported_at'",
+                     ((datetime.now() - timedelta(days=100)).isoformat(),))
+        conn.commit()
+        conn.close()
+        os.utime(indexed_service.egr_index.path, (0, 0))
+
+        indexed_service.check_inn(make_inn("770000001"))
+
+        assert len(indexed_service.session.calls) == 1
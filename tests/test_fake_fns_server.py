@@ -0,0 +1,90 @@
+"""
+Тесты локальной заглушки API ФНС
+"""
+
+import os
+import random
+import sys
+
+import pytest
+import requests
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+from backend.services.fns_service import FNSService
+from backend.services.fns_transport import RetryPolicy
+from scripts.fake_fns_server import FakeFNSServer, parse_latency
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures', 'fns')
+
+
+def fetch(server: FakeFNSServer, inn: str) -> requests.Response:
+    return requests.get(f"{server.base_url}/egr", params={"req": inn, "key": "x"}, timeout=5)
+
+
+class TestLatency:
+    """Тесты распределений задержки"""
+
+    def test_specs(self):
+        rng = random.Random(1)
+
+        assert parse_latency(0.05, rng)() == 0.05
+        assert parse_latency("0.1", rng)() == 0.1
+        assert all(0.02 <= parse_latency("uniform:0.02,0.2", rng)() <= 0.2 for _ in range(100))
+        samples = sorted(parse_latency("lognormal:0.08,0.5", rng)() for _ in range(2001))
+        assert 0.06 < samples[1000] < 0.1
+        with pytest.raises(ValueError):
+            parse_latency("pareto:1", rng)
+
+
+class TestResponses:
+    """Тесты ответов заглушки"""
+
+    def test_fixture_replay(self):
+        """Записанные ответы отдаются как есть, остальные ИНН генерируются"""
+        with FakeFNSServer(fixtures_dir=FIXTURES_DIR) as server:
+            recorded = fetch(server, "7707083893").json()
+            generated = fetch(server, "7707083894").json()
+
+        assert recorded["ОГРН"] == "1027700132195"
+        assert generated["НаимЮЛ"].startswith("ООО")
+
+    def test_error_rate(self):
+        """Доля ошибок 1.0 - все ответы 5xx"""
+        with FakeFNSServer(error_rate=1.0, seed=1) as server:
+            statuses = {fetch(server, "7707083893").status_code for _ in range(5)}
+            stats = server.get_stats()
+
+        assert statuses <= {500, 502, 503}
+        assert stats["requests"] == 5
+
+    def test_rate_limit_429(self):
+        """Сверх лимита в секунду - 429 с Retry-After"""
+        with FakeFNSServer(rate_limit=2) as server:
+            responses = [fetch(server, "7707083893") for _ in range(4)]
+
+        assert [r.status_code for r in responses[:2]] == [200, 200]
+        assert responses[-1].status_code == 429
+        assert responses[-1].headers["Retry-After"] == "1"
+
+
+class TestServiceAgainstFake:
+    """FNSService, направленный на заглушку через FNS_API_BASE_URL"""
+
+    def test_base_url_from_env(self, monkeypatch):
+        with FakeFNSServer(fixtures_dir=FIXTURES_DIR) as server:
+            monkeypatch.setenv('FNS_API_BASE_URL', server.base_url + '/')
+            service = FNSService()
+            service.retry_policy = RetryPolicy(max_attempts=1)
+
+            found = service.check_inn("7707083893")
+            missing = service.check_inn("7700000009")
+
+        assert service.base_url == server.base_url
+        assert found["data"]["company_name"] == 'ПУБЛИЧНОЕ АКЦИОНЕРНОЕ ОБЩЕСТВО "СБЕРБАНК РОССИИ"'
+        assert missing["success"] is False
+        assert server.requests_count == 2
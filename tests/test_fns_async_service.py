@@ -0,0 +1,185 @@
+"""
+Тесты асинхронного клиента API ФНС на локальной заглушке
+"""
+
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+pytest.importorskip('aiohttp')
+
+from backend.services.fns_service import FNSService
+from backend.services.fns_async_service import AsyncFNSService
+from scripts.fake_fns_server import FakeFNSServer
+from tests.fns_helpers import make_inn
+
+
+@pytest.fixture(scope='module')
+def fake_fns():
+    """Локальная заглушка API ФНС"""
+    with FakeFNSServer(latency=0.05) as server:
+        yield server
+
+
+@pytest.fixture
+def service(fake_fns):
+    """Синхронный сервис, направленный на заглушку"""
+    fns = FNSService()
+    fns.redis_client = None
+    fns._init_cache()
+    fns.base_url = fake_fns.base_url
+    # Резервы классов трафика проверяются в test_fns_quota
+    fns.quota.reserves = {}
+    return fns
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestAsyncCheckInn:
+    """Тесты одиночной проверки"""
+
+    def test_same_contract_as_sync(self, service):
+        """Ответ совпадает по структуре с синхронным клиентом"""
+        inn = make_inn("770708389")
+
+        async def scenario():
+            async with AsyncFNSService(service) as client:
+                return await client.check_inn(inn)
+
+        result = run(scenario())
+        assert result["success"] is True
+        assert result["cached"] is False
+        assert result["data"]["inn"] == inn
+        assert set(result) == set(service.check_inn(inn))
+
+    def test_second_call_served_from_cache(self, service, fake_fns):
+        """Повторная проверка берётся из общего кэша"""
+        inn = make_inn("770708390")
+
+        async def scenario():
+            async with AsyncFNSService(service) as client:
+                await client.check_inn(inn)
+                return await client.check_inn(inn)
+
+        before = fake_fns.requests_count
+        result = run(scenario())
+        assert result["cached"] is True
+        assert fake_fns.requests_count - before == 1
+
+    def test_invalid_inn(self, service):
+        """Ошибка формата возвращается без запроса"""
+        async def scenario():
+            async with AsyncFNSService(service) as client:
+                return await client.check_inn("12345")
+
+        assert run(scenario())["success"] is False
+
+
+class TestAsyncBatchCheck:
+    """Тесты массовой асинхронной проверки"""
+
+    def test_concurrent_batch(self, service):
+        """Сотня запросов выполняется конкурентно"""
+        inns = [make_inn(f"60000{i:04d}") for i in range(100)]
+
+        async def scenario():
+            async with AsyncFNSService(service, max_concurrency=100) as client:
+                return await client.batch_check(inns)
+
+        report = run(scenario())
+        assert report["successful"] == 100
+        assert [r["inn"] for r in report["results"]] == inns
+        assert report["wall_time_ms"] < 100 * 50 / 4
+
+    def test_quota_not_exceeded(self, service, fake_fns):
+        """Конкурентные запросы не превышают дневной лимит"""
+        service.daily_limit = 5
+        inns = [make_inn(f"61000{i:04d}") for i in range(20)]
+
+        async def scenario():
+            async with AsyncFNSService(service, max_concurrency=20) as client:
+                return await client.batch_check(inns)
+
+        before = fake_fns.requests_count
+        report = run(scenario())
+        assert fake_fns.requests_count - before == 5
+        assert report["api_requests"] == 5
+        assert report["skipped_by_limit"] == 15
+        assert report["skipped_by_circuit"] == 0
+        assert service.quota.used_today() == 5
+
+    def test_concurrent_same_inn_coalesced(self, service, fake_fns):
+        """Одновременные проверки одного ИНН делают один запрос"""
+        inn = make_inn("620000001")
+
+        async def scenario():
+            async with AsyncFNSService(service) as client:
+                return await asyncio.gather(*(client.check_inn(inn) for _ in range(20)))
+
+        before = fake_fns.requests_count
+        results = run(scenario())
+        assert fake_fns.requests_count - before == 1
+        assert all(r["success"] for r in results)
+
+    def test_degraded_without_key(self, service, fake_fns):
+        """Без ключа API пакет не тратит лимит и не отправляет запросов"""
+        service.api_key = None
+        inns = [make_inn(f"63000{i:04d}") for i in range(3)]
+
+        async def scenario():
+            async with AsyncFNSService(service) as client:
+                return await client.batch_check(inns)
+
+        before = fake_fns.requests_count
+        report = run(scenario())
+        assert fake_fns.requests_count - before == 0
+        assert service.quota.used_today() == 0
+        assert report["successful"] == 0
+        assert report["api_requests"] == 0
+        assert report["skipped_unavailable"] == 3
+        assert report["skipped_by_limit"] == 0
+        assert all("не указан ключ API" in r["error"] for r in report["results"])
+
+    def test_circuit_open_counted_separately(self, service, fake_fns):
+        """Пропуски из-за разомкнутой цепи не считаются пропусками по лимиту"""
+        service.circuit_breaker._open(service.circuit_breaker._clock())
+        inns = [make_inn(f"64000{i:04d}") for i in range(3)]
+
+        async def scenario():
+            async with AsyncFNSService(service) as client:
+                return await client.batch_check(inns)
+
+        before = fake_fns.requests_count
+        report = run(scenario())
+        assert fake_fns.requests_count - before == 0
+        assert report["skipped_by_circuit"] == 3
+        assert report["skipped_by_limit"] == 0
+        assert report["api_requests"] == 0
+
+    def test_blocking_calls_off_event_loop(self, service, monkeypatch):
+        """Кэш и лимит синхронного сервиса вызываются не в потоке event loop"""
+        threads = []
+        for name in ("_local_result", "_handle_api_response"):
+            original = getattr(service, name)
+            monkeypatch.setattr(service, name, lambda *args, _fn=original: threads.append(
+                threading.current_thread()) or _fn(*args))
+
+        async def scenario():
+            async with AsyncFNSService(service) as client:
+                await client.check_inn(make_inn("650000001"))
+                return threading.current_thread()
+
+        loop_thread = run(scenario())
+        assert len(threads) == 2
+        assert loop_thread not in threads
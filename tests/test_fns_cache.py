@@ -0,0 +1,167 @@
+"""
+Тесты двухуровневого кэша результатов проверки ИНН
+"""
+
+import os
+import sys
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.services.fns_cache import CacheNamespace, TTLLRUCache, TwoTierCache
+
+
+class FakeClock:
+    """Управляемые часы для проверки TTL"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLLRUCache:
+    """Тесты in-process уровня"""
+
+    def test_entry_expires(self):
+        """Запись истекает по TTL"""
+        clock = FakeClock()
+        cache = TTLLRUCache(maxsize=10, ttl=60, clock=clock)
+        cache.set("a", {"v": 1})
+
+        assert cache.get("a") == {"v": 1}
+        clock.now += 61
+        assert cache.get("a") is None
+        assert cache.expirations == 1
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняется давно не использованная запись"""
+        cache = TTLLRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert cache.evictions == 1
+
+    def test_entry_ttl_capped(self):
+        """TTL записи не превышает TTL кэша"""
+        clock = FakeClock()
+        cache = TTLLRUCache(maxsize=10, ttl=30, clock=clock)
+        cache.set("a", 1, ttl=3600)
+        clock.now += 31
+        assert cache.get("a") is None
+
+    def test_stats(self):
+        """Счетчики попаданий и промахов"""
+        cache = TTLLRUCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("missing")
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+
+class TestTwoTierCache:
+    """Тесты связки L1 + Redis"""
+
+    @pytest.fixture
+    def redis_client(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        return fakeredis.FakeRedis(decode_responses=True)
+
+    def test_l2_hit_promoted_to_l1(self, redis_client):
+        """Попадание в Redis поднимает запись в L1"""
+        writer = TwoTierCache(TTLLRUCache(ttl=60), redis_client)
+        reader = TwoTierCache(TTLLRUCache(ttl=60), redis_client)
+        writer.set("fns:a", {"data": 1}, 3600)
+
+        assert reader.get("fns:a") == {"data": 1}
+        assert reader.get("fns:a") == {"data": 1}
+        assert reader.l2_hits == 1
+        assert reader.l1.hits == 1
+
+    def test_l1_not_longer_than_redis_ttl(self, redis_client):
+        """L1 не держит запись дольше оставшегося TTL в Redis"""
+        clock = FakeClock()
+        redis_client.setex("fns:b", 5, '{"data": 2}')
+        cache = TwoTierCache(TTLLRUCache(ttl=60, clock=clock), redis_client)
+
+        assert cache.get("fns:b") == {"data": 2}
+        clock.now += 6
+        assert cache.l1.get("fns:b") is None
+
+    def test_without_redis(self):
+        """Без Redis работает только L1"""
+        cache = TwoTierCache(TTLLRUCache(ttl=60))
+        cache.set("fns:c", {"data": 3}, 3600)
+
+        assert cache.get("fns:c") == {"data": 3}
+        assert cache.get_stats()["l2"]["enabled"] is False
+
+
+class TestCacheNamespace:
+    """Тесты инвалидации кэша через поколения ключей"""
+
+    @pytest.fixture
+    def redis_client(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        return fakeredis.FakeRedis(decode_responses=True)
+
+    def test_invalidate_switches_keys(self, redis_client):
+        """После инвалидации ключи указывают на новое поколение"""
+        namespace = CacheNamespace(redis_client)
+        old_key = namespace.key("abc")
+
+        assert namespace.invalidate() == 1
+        assert namespace.key("abc") != old_key
+        assert namespace.key("abc") == "fns:cache:1:abc"
+
+    def test_other_workers_see_generation(self, redis_client):
+        """Другой воркер видит новое поколение после refresh_interval"""
+        clock = FakeClock()
+        reader = CacheNamespace(redis_client, refresh_interval=5, clock=clock)
+        assert reader.generation() == 0
+
+        CacheNamespace(redis_client).invalidate()
+        assert reader.generation() == 0
+        clock.now += 5
+        assert reader.generation() == 1
+
+    def test_purge_in_batches_keeps_other_keys(self, redis_client):
+        """Удаляются только старые поколения, пачками; лимит и текущие записи остаются"""
+        namespace = CacheNamespace(redis_client)
+        for i in range(25):
+            redis_client.set(namespace.key(f"old{i}"), "{}")
+        redis_client.set("fns:quota:day:2024-01-01", 10)
+        redis_client.set("fns:lock:7707083893", "token")
+        namespace.invalidate()
+        redis_client.set(namespace.key("new"), "{}")
+
+        progress = []
+        report = namespace.purge(batch_size=10, progress=lambda d, b: progress.append((d, b)))
+
+        assert report == {"deleted": 25, "batches": 3}
+        assert progress[-1] == (25, 3)
+        assert sorted(redis_client.keys("*")) == [
+            "fns:cache:1:new", "fns:cache:generation",
+            "fns:lock:7707083893", "fns:quota:day:2024-01-01"
+        ]
+
+    def test_without_redis(self):
+        """Без Redis поколение ведётся в памяти процесса"""
+        namespace = CacheNamespace()
+        namespace.invalidate()
+
+        assert namespace.key("abc") == "fns:cache:1:abc"
+        assert namespace.purge() == {"deleted": 0, "batches": 0}
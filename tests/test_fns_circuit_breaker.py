@@ -0,0 +1,123 @@
+"""
+Тесты circuit breaker и адаптивного таймаута API ФНС
+"""
+
+import os
+import sys
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+from backend.services.fns_circuit_breaker import (
+    STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker
+)
+from tests.fns_helpers import make_inn
+
+
+class FakeClock:
+    """Управляемые часы"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker:
+    """Тесты состояний размыкателя"""
+
+    def test_opens_after_consecutive_failures(self):
+        """Серия сбоев размыкает цепь"""
+        breaker = CircuitBreaker(consecutive_failures=3, clock=FakeClock())
+        for _ in range(3):
+            breaker.record_failure(1.0)
+
+        assert breaker.state == STATE_OPEN
+        assert breaker.allow_request() is False
+
+    def test_opens_on_error_rate(self):
+        """Доля ошибок в окне размыкает цепь"""
+        breaker = CircuitBreaker(min_requests=10, failure_rate=0.5, consecutive_failures=100)
+        for i in range(10):
+            if i % 2:
+                breaker.record_failure(0.1)
+            else:
+                breaker.record_success(0.1)
+
+        assert breaker.state == STATE_OPEN
+
+    def test_half_open_probe(self):
+        """После паузы пропускается один пробный запрос"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(consecutive_failures=1, open_seconds=30, clock=clock)
+        breaker.record_failure(1.0)
+
+        clock.now += 31
+        assert breaker.state == STATE_HALF_OPEN
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False
+
+        breaker.record_success(0.2)
+        assert breaker.state == STATE_CLOSED
+        assert breaker.allow_request() is True
+
+    def test_failed_probe_reopens(self):
+        """Неудачный пробный запрос снова размыкает цепь"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(consecutive_failures=1, open_seconds=30, clock=clock)
+        breaker.record_failure(1.0)
+        clock.now += 31
+        breaker.allow_request()
+        breaker.record_failure(1.0)
+
+        assert breaker.state == STATE_OPEN
+
+    def test_adaptive_timeout(self):
+        """Таймаут выводится из p99 задержки в заданных границах"""
+        breaker = CircuitBreaker(min_requests=10, min_timeout=1, max_timeout=15, timeout_multiplier=3)
+        assert breaker.timeout() == 15
+
+        for _ in range(20):
+            breaker.record_success(0.5)
+        assert breaker.timeout() == pytest.approx(1.5)
+
+        stats = breaker.get_stats()
+        assert stats["p50_ms"] == 500.0 and stats["p99_ms"] == 500.0
+
+
+class TestServiceFallback:
+    """Поведение FNSService при разомкнутой цепи"""
+
+    def test_fail_fast_without_quota(self, service):
+        """При разомкнутой цепи запрос не отправляется и не тратит лимит"""
+        service.session.status_code = 503
+        for i in range(service.circuit_breaker.consecutive_failures):
+            service.check_inn(make_inn(f"11000{i:04d}"))
+        calls = len(service.session.calls)
+        used = service.quota.used_today()
+
+        result = service.check_inn(make_inn("110009999"))
+
+        assert result["success"] is False
+        assert len(service.session.calls) == calls
+        assert service.quota.used_today() == used
+        assert service.get_usage_stats()["circuit_breaker"]["state"] == STATE_OPEN
+
+    def test_stale_data_served_when_open(self, service):
+        """При разомкнутой цепи отдаются устаревшие данные из кэша"""
+        from tests.fns_helpers import age_entry
+        inn = make_inn("120000001")
+        service.check_inn(inn)
+        age_entry(service, inn, service.cache_ttl + service.max_stale + 1)
+        service.circuit_breaker.consecutive_failures = 1
+        service.circuit_breaker.record_failure(1.0)
+
+        result = service.check_inn(inn)
+        assert result["success"] is True
+        assert result["cached"] is True
@@ -0,0 +1,93 @@
+"""
+Тесты кодеков записей кэша ФНС
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.services.fns_cache import TTLLRUCache, TwoTierCache
+from backend.services.fns_codec import (
+    COMPRESSION_NONE, COMPRESSION_ZLIB, FORMAT_MSGPACK, JsonCodec, MsgpackCodec, decode_value, get_codec
+)
+
+pytest.importorskip('msgpack')
+
+
+def make_entry(size: int = 20) -> dict:
+    """Запись кэша с учредителями, как у крупного юр.лица"""
+    return {
+        "data": {
+            "inn": "7707083893",
+            "company_name": "ПАО \"Сбербанк\"",
+            "founders": [{"ФИО": f"Учредитель {i}", "Доля": i} for i in range(size)],
+            "is_active": True,
+        },
+        "timestamp": "2024-01-01T00:00:00",
+        "outcome": "ok",
+    }
+
+
+class TestMsgpackCodec:
+    """Тесты msgpack-кодека"""
+
+    def test_round_trip(self):
+        """Запись читается без потерь"""
+        codec = MsgpackCodec()
+        entry = make_entry()
+
+        assert codec.decode(codec.encode(entry)) == entry
+
+    def test_compression_above_threshold(self):
+        """Сжимаются только записи больше порога"""
+        codec = MsgpackCodec(compression="zlib", threshold=256)
+        small = codec.encode({"data": None, "outcome": "not_found"})
+        large = codec.encode(make_entry(50))
+
+        assert small[:2] == bytes((FORMAT_MSGPACK, COMPRESSION_NONE))
+        assert large[:2] == bytes((FORMAT_MSGPACK, COMPRESSION_ZLIB))
+        assert len(large) < len(JsonCodec().encode(make_entry(50)))
+
+    def test_reads_legacy_json(self):
+        """Записи старого формата читаются новым кодеком"""
+        entry = make_entry(2)
+        legacy = json.dumps(entry, ensure_ascii=False)
+
+        assert MsgpackCodec().decode(legacy) == entry
+        assert MsgpackCodec().decode(legacy.encode("utf-8")) == entry
+
+    def test_unknown_version(self):
+        """Неизвестная версия формата - ошибка, а не мусор"""
+        with pytest.raises(ValueError):
+            decode_value(b"\x09\x00payload")
+
+    def test_get_codec(self):
+        """Кодек выбирается по имени из настроек"""
+        assert get_codec("json").name == "json"
+        assert get_codec("msgpack", compression="none").compression == COMPRESSION_NONE
+        with pytest.raises(ValueError):
+            get_codec("pickle")
+
+
+class TestTwoTierCacheCodec:
+    """Бинарные записи в Redis через двухуровневый кэш"""
+
+    def test_binary_entries_with_decoding_client(self):
+        """Кэш работает с клиентом decode_responses=True и читает старые записи"""
+        fakeredis = pytest.importorskip('fakeredis')
+        redis_client = fakeredis.FakeRedis(decode_responses=True)
+        redis_client.setex("fns:legacy", 60, json.dumps({"data": 1}))
+
+        writer = TwoTierCache(TTLLRUCache(ttl=60), redis_client, MsgpackCodec(threshold=16))
+        reader = TwoTierCache(TTLLRUCache(ttl=60), redis_client, MsgpackCodec(threshold=16))
+        entry = make_entry()
+        writer.set("fns:new", entry, 3600)
+
+        assert reader.get("fns:new") == entry
+        assert reader.get("fns:legacy") == {"data": 1}
+        assert reader.get_stats()["l2"]["codec"] == "msgpack"
@@ -0,0 +1,183 @@
+"""
+Тесты лимитера запросов к API ФНС
+"""
+
+import os
+import sys
+import threading
+from datetime import date, datetime
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.services.fns_quota import (
+    PRIORITY_BACKGROUND, PRIORITY_BATCH, PRIORITY_INTERACTIVE, REASON_DAILY, REASON_RATE,
+    REASON_RESERVED, InMemoryQuotaLimiter, RedisQuotaLimiter
+)
+
+RESERVES = {PRIORITY_INTERACTIVE: 0.3, PRIORITY_BATCH: 0.1}
+
+
+class FakeClock:
+    """Управляемые часы"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestInMemoryQuotaLimiter:
+    """Тесты in-process лимитера"""
+
+    def test_daily_limit(self):
+        """Запросы сверх дневного лимита отклоняются"""
+        limiter = InMemoryQuotaLimiter(daily_limit=3)
+
+        assert [limiter.try_acquire().allowed for _ in range(4)] == [True, True, True, False]
+        assert limiter.try_acquire().reason == REASON_DAILY
+        assert limiter.remaining() == 0
+
+    def test_resets_on_new_day(self):
+        """Счётчик обнуляется со сменой даты"""
+        day = {"value": date(2026, 1, 1)}
+        limiter = InMemoryQuotaLimiter(daily_limit=1, today=lambda: day["value"])
+        limiter.try_acquire()
+        assert limiter.try_acquire().allowed is False
+
+        day["value"] = date(2026, 1, 2)
+        assert limiter.try_acquire().allowed is True
+        assert limiter.used_today() == 1
+
+    def test_rate_limit(self):
+        """Лимит в секунду пополняется со временем"""
+        clock = FakeClock()
+        limiter = InMemoryQuotaLimiter(daily_limit=100, rate_per_second=2, burst=2, clock=clock)
+
+        assert limiter.try_acquire().allowed
+        assert limiter.try_acquire().allowed
+        decision = limiter.try_acquire()
+        assert decision.allowed is False
+        assert decision.reason == REASON_RATE
+        assert decision.retry_after == pytest.approx(0.5)
+        assert limiter.used_today() == 2
+
+        clock.now += 0.5
+        assert limiter.try_acquire().allowed
+
+
+class TestPriorityReserves:
+    """Тесты резервов лимита по классам трафика"""
+
+    def test_batch_cannot_take_interactive_reserve(self):
+        """Пакетные проверки не занимают резерв регистраций"""
+        limiter = InMemoryQuotaLimiter(daily_limit=10, reserves=RESERVES)
+
+        allowed = [limiter.try_acquire(priority=PRIORITY_BATCH).allowed for _ in range(10)]
+        assert sum(allowed) == 7
+        assert limiter.try_acquire(priority=PRIORITY_BATCH).reason == REASON_RESERVED
+        assert limiter.remaining(PRIORITY_BATCH) == 0
+        assert limiter.remaining(PRIORITY_INTERACTIVE) == 3
+        assert all(limiter.try_acquire(priority=PRIORITY_INTERACTIVE).allowed for _ in range(3))
+        assert limiter.try_acquire(priority=PRIORITY_INTERACTIVE).reason == REASON_DAILY
+
+    def test_background_lowest(self):
+        """Фоновые задачи не занимают резервы регистраций и пакетных проверок"""
+        limiter = InMemoryQuotaLimiter(daily_limit=10, reserves=RESERVES)
+
+        assert limiter.remaining(PRIORITY_BACKGROUND) == 6
+        limiter.try_acquire(priority=PRIORITY_INTERACTIVE)
+        limiter.try_acquire(priority=PRIORITY_BATCH)
+        assert limiter.remaining(PRIORITY_BACKGROUND) == 6
+        assert limiter.used_by_priority() == {
+            PRIORITY_INTERACTIVE: 1, PRIORITY_BATCH: 1, PRIORITY_BACKGROUND: 0
+        }
+
+    def test_reserve_lent_late_in_day(self):
+        """После lend_from_hour резерв уменьшается к полуночи"""
+        moment = {"value": datetime(2026, 3, 1, 12, 0)}
+        limiter = InMemoryQuotaLimiter(daily_limit=100, reserves=RESERVES, lend_from_hour=18,
+                                       now=lambda: moment["value"])
+
+        assert limiter.remaining(PRIORITY_BATCH) == 70
+        moment["value"] = datetime(2026, 3, 1, 21, 0)
+        assert limiter.reserved()[PRIORITY_INTERACTIVE] == 15
+        assert limiter.remaining(PRIORITY_BATCH) == 85
+        moment["value"] = datetime(2026, 3, 1, 23, 59, 59)
+        assert limiter.remaining(PRIORITY_BACKGROUND) == 100
+
+    def test_unknown_priority(self):
+        """Неизвестный класс трафика отклоняется"""
+        limiter = InMemoryQuotaLimiter(daily_limit=10)
+        with pytest.raises(ValueError):
+            limiter.try_acquire(priority="urgent")
+
+
+class TestRedisQuotaLimiter:
+    """Тесты общего для воркеров лимитера"""
+
+    @pytest.fixture
+    def server(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        pytest.importorskip('lupa')
+        return fakeredis.FakeServer()
+
+    def make_limiter(self, server, **kwargs):
+        import fakeredis
+        client = fakeredis.FakeRedis(server=server, decode_responses=True)
+        return RedisQuotaLimiter(client, **kwargs)
+
+    def test_workers_share_limit(self, server):
+        """Несколько воркеров вместе не превышают лимит"""
+        limiters = [self.make_limiter(server, daily_limit=50) for _ in range(4)]
+        allowed = []
+        lock = threading.Lock()
+
+        def worker(limiter):
+            for _ in range(30):
+                decision = limiter.try_acquire()
+                with lock:
+                    allowed.append(decision.allowed)
+
+        threads = [threading.Thread(target=worker, args=(limiter,)) for limiter in limiters]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert sum(allowed) == 50
+        assert limiters[0].used_today() == 50
+
+    def test_day_key_expires(self, server):
+        """Счётчик дня хранится под ключом с датой и с TTL"""
+        limiter = self.make_limiter(server, daily_limit=5, today=lambda: date(2026, 3, 1))
+        limiter.try_acquire()
+
+        assert limiter.redis_client.get("fns:quota:day:2026-03-01") == "1"
+        assert limiter.redis_client.ttl("fns:quota:day:2026-03-01") > 86400
+
+    def test_rate_limit(self, server):
+        """Лимит в секунду общий для воркеров"""
+        first = self.make_limiter(server, daily_limit=100, rate_per_second=1, burst=2)
+        second = self.make_limiter(server, daily_limit=100, rate_per_second=1, burst=2)
+
+        assert first.try_acquire().allowed
+        assert second.try_acquire().allowed
+        decision = first.try_acquire()
+        assert decision.allowed is False
+        assert decision.reason == REASON_RATE
+        assert first.used_today() == 2
+
+    def test_priority_reserves_shared(self, server):
+        """Резерв регистраций соблюдается всеми воркерами"""
+        batch = self.make_limiter(server, daily_limit=10, reserves=RESERVES)
+        interactive = self.make_limiter(server, daily_limit=10, reserves=RESERVES)
+
+        assert sum(batch.try_acquire(priority=PRIORITY_BATCH).allowed for _ in range(10)) == 7
+        assert batch.try_acquire(priority=PRIORITY_BATCH).reason == REASON_RESERVED
+        assert all(interactive.try_acquire().allowed for _ in range(3))
+        assert interactive.used_by_priority()[PRIORITY_BATCH] == 7
+        assert interactive.used_today() == 10
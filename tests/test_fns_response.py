@@ -0,0 +1,195 @@
+"""
+Тесты разбора ответов API ФНС
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+from backend.services import fns_response
+from backend.services.fns_response import UNMAPPED, normalize_records, parse_records
+from backend.services.fns_service import NOT_FOUND_ERROR, FNSService
+from backend.services.fns_transport import RetryPolicy
+from tests.fns_helpers import FakeSession, make_inn
+
+INN = make_inn("770708389")
+
+LEGAL_ENTITY = {
+    "НаимЮЛ": " ООО \"Ромашка\" ",
+    "ОГРН": "1027700132195",
+    "ДатаОГРН": "2002-08-16",
+    "Статус": "Действующее",
+    "Учредители": [{"ФИО": "Иванов И.И.", "Доля": 50.5}],
+    "История": [{"Дата": f"2010-01-{day:02d}", "Изменение": "Смена адреса"} for day in range(1, 29)],
+}
+
+
+@pytest.fixture(params=["stream", "json"])
+def parser(request, monkeypatch):
+    """Разбор через ijson и через json (без ijson)"""
+    if request.param == "stream":
+        pytest.importorskip("ijson")
+    else:
+        monkeypatch.setattr(fns_response, "ijson", None)
+    return lambda payload: parse_records(json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                                         stream_min_bytes=0)
+
+
+class TestParseRecords:
+    """Тесты извлечения записей"""
+
+    def test_only_mapped_fields(self, parser):
+        """Из записи извлекаются только нужные поля, вложенные значения целиком"""
+        records = parser(LEGAL_ENTITY)
+
+        assert len(records) == 1
+        assert "История" not in records[0]
+        assert records[0]["Учредители"] == [{"ФИО": "Иванов И.И.", "Доля": 50.5}]
+
+    @pytest.mark.parametrize("payload", [{}, [], {"items": []}])
+    def test_empty(self, parser, payload):
+        """Пустой ответ - записей нет"""
+        assert parser(payload) == []
+
+    def test_list_and_items(self, parser):
+        """Списком и в обёртке items с ЮЛ/ИП"""
+        person = {"ФИО": "Петров П.П.", "ОГРНИП": "304770000000001"}
+
+        assert len(parser([LEGAL_ENTITY, person])) == 2
+        records = parser({"items": [{"ЮЛ": LEGAL_ENTITY}, {"ИП": person}]})
+        assert [record.get("ОГРН") or record.get("ОГРНИП") for record in records] == [
+            "1027700132195", "304770000000001"
+        ]
+
+    def test_unknown_format(self, parser):
+        """Запись без известных полей - только имена полей"""
+        assert parser({"name": "x", "code": 1}) == [{UNMAPPED: ["name", "code"]}]
+
+    @pytest.mark.parametrize("payload", [
+        {"items": [{"ЮЛ": LEGAL_ENTITY, "extra": 1}], "Count": 1},
+        {"Count": 2, "items": [{"ИП": {"ФИО": "Петров П.П."}}, {"ЮЛ": {}, "ИП": {"code": 1}}, {"name": "x"}, 5]},
+        {"items": {"ЮЛ": LEGAL_ENTITY}, "НаимЮЛ": "ООО"},
+        {"ЮЛ": LEGAL_ENTITY, "Count": 1},
+        [{"ЮЛ": LEGAL_ENTITY}, {"items": [LEGAL_ENTITY], "ОГРН": "1"}, {"name": "x"}],
+    ])
+    def test_stream_matches_json(self, payload):
+        """Потоковый разбор и json дают одинаковые записи для одного тела"""
+        pytest.importorskip("ijson")
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+        assert parse_records(body, stream_min_bytes=0) == parse_records(body, stream_min_bytes=len(body) + 1)
+
+    def test_invalid_json(self):
+        """Битое тело - ValueError"""
+        for stream_min_bytes in (0, 1024):
+            with pytest.raises(ValueError):
+                parse_records(b'{"\xd0\x9d\xd0\xb0\xd0\xb8\xd0\xbc', stream_min_bytes)
+
+
+class TestNormalizeRecords:
+    """Тесты выбора записи и нормализации"""
+
+    def test_legal_entity(self):
+        """Поля юр.лица переименовываются, наименование без пробелов по краям"""
+        data = normalize_records([LEGAL_ENTITY], INN)
+
+        assert data["company_name"] == "ООО \"Ромашка\""
+        assert data["ogrn"] == "1027700132195"
+        assert data["is_active"] is True
+        assert data["source"] == "api_fns"
+        assert "records_count" not in data
+
+    def test_active_latest_record_selected(self):
+        """Основная запись - действующая с самой поздней регистрацией"""
+        records = [
+            {"ФИО": "Петров П.П.", "ОГРНИП": "304770000000001", "ДатаОГРНИП": "2004-01-10",
+             "Статус": "Прекратил деятельность"},
+            {"ФИО": "Петров П.П.", "ОГРНИП": "315770000000002", "ДатаОГРНИП": "15.03.2015",
+             "Статус": "Действующий"},
+            {"ФИО": "Петров П.П.", "ОГРНИП": "319770000000003", "ДатаОГРНИП": "2019-05-20",
+             "Статус": "Прекратил деятельность"},
+        ]
+        data = normalize_records(records, "500100732259")
+
+        assert data["ogrn_ip"] == "315770000000002"
+        assert data["is_active"] is True
+        assert data["records_count"] == 3
+        assert [record["ogrn"] for record in data["other_records"]] == [
+            "304770000000001", "319770000000003"
+        ]
+
+    def test_inactive_latest_record(self):
+        """Без действующих записей основная - самая поздняя"""
+        records = [dict(LEGAL_ENTITY, Статус="Ликвидировано", ОГРН=str(year), ДатаОГРН=f"{year}-01-01")
+                   for year in (2005, 2018, 2011)]
+
+        data = normalize_records(records, INN)
+
+        assert data["ogrn"] == "2018"
+        assert data["is_active"] is False
+
+    def test_unknown_format(self):
+        """Неизвестный формат сохраняет имена полей"""
+        data = normalize_records([{UNMAPPED: ["name"]}], INN)
+
+        assert data["raw_fields"] == ["name"]
+        assert data["is_active"] is False
+
+
+class TestServiceResponse:
+    """Тесты разбора ответа в FNSService"""
+
+    def make_service(self, payload):
+        fns = FNSService()
+        fns.redis_client = None
+        fns._init_cache()
+        fns.session = FakeSession(payload=payload)
+        fns.retry_policy = RetryPolicy(max_attempts=1)
+        return fns
+
+    def test_large_response_streamed(self, monkeypatch):
+        """Большой ответ разбирается потоком, история изменений отбрасывается"""
+        pytest.importorskip("ijson")
+        streamed = []
+        iter_stream = fns_response._iter_stream
+        monkeypatch.setattr(fns_response, "_iter_stream",
+                            lambda body: streamed.append(len(body)) or iter_stream(body))
+        service = self.make_service(dict(LEGAL_ENTITY, История=LEGAL_ENTITY["История"] * 200))
+        service.stream_parse_min_bytes = 1024
+
+        result = service.check_inn(INN)
+
+        assert streamed and streamed[0] > 1024
+        assert result["data"]["ogrn"] == "1027700132195"
+        assert result["data"]["founders"] == LEGAL_ENTITY["Учредители"]
+
+    def test_multi_record_response(self):
+        """Из нескольких записей выбирается действующая"""
+        payload = [dict(LEGAL_ENTITY, Статус="Ликвидировано", ОГРН="1"),
+                   dict(LEGAL_ENTITY, ОГРН="2")]
+
+        result = self.make_service(payload).check_inn(INN)
+
+        assert result["success"] is True
+        assert result["data"]["ogrn"] == "2"
+        assert result["data"]["records_count"] == 2
+
+    def test_not_found(self):
+        """Пустой ответ - ИНН не найден"""
+        result = self.make_service({"items": []}).check_inn(INN)
+        assert result["error"] == NOT_FOUND_ERROR
+
+    def test_normalize_response_compatible(self):
+        """_normalize_response принимает запись и список записей"""
+        service = FNSService.__new__(FNSService)
+
+        assert service._normalize_response(LEGAL_ENTITY, INN)["ogrn"] == "1027700132195"
+        assert service._normalize_response([LEGAL_ENTITY], INN)["ogrn"] == "1027700132195"
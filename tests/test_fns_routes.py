@@ -0,0 +1,129 @@
+"""
+Тесты маршрутов проверки ИНН
+"""
+
+import io
+import json
+import os
+import sys
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+from flask import Flask
+
+from backend.routes import fns_routes
+from backend.routes.auth import TOKEN_HEADER
+from backend.services.fns_service import FNSService
+from backend.services.fns_transport import RetryPolicy
+from tests.fns_helpers import FakeSession, make_inn
+
+
+@pytest.fixture
+def service(monkeypatch):
+    fns = FNSService()
+    fns.redis_client = None
+    fns._init_cache()
+    fns.session = FakeSession()
+    fns.retry_policy = RetryPolicy(max_attempts=1)
+    monkeypatch.setattr(fns_routes, 'get_fns_service', lambda: fns)
+    return fns
+
+
+@pytest.fixture
+def client(service, monkeypatch):
+    monkeypatch.setenv('FNS_BULK_VERIFY_TOKEN', 'bulk-token')
+    app = Flask(__name__)
+    app.register_blueprint(fns_routes.fns_bp)
+    client = app.test_client()
+    client.environ_base['HTTP_' + TOKEN_HEADER.upper().replace('-', '_')] = 'bulk-token'
+    return client
+
+
+def read_ndjson(response):
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return lines[:-1], lines[-1]['summary']
+
+
+class TestBulkVerify:
+    """Тесты потоковой массовой проверки"""
+
+    def test_json_list(self, client):
+        """Строка NDJSON на каждый ИНН и итоговая строка"""
+        inns = [make_inn(f"44000{i:04d}") for i in range(3)] + ["123"]
+        response = client.post('/api/v1/fns/bulk-verify', json={'inns': inns})
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        results, summary = read_ndjson(response)
+        assert sorted(r['inn'] for r in results) == sorted(inns)
+        assert summary['total'] == 4
+        assert summary['successful'] == 3
+
+    def test_uploaded_csv(self, client):
+        """ИНН берутся из первой колонки файла, заголовок пропускается"""
+        inns = [make_inn(f"45000{i:04d}") for i in range(3)]
+        content = "inn;name\n" + "".join(f"{inn};ООО {i}\n" for i, inn in enumerate(inns))
+        response = client.post('/api/v1/fns/bulk-verify', data={
+            'file': (io.BytesIO(content.encode('utf-8')), 'inns.csv')
+        }, content_type='multipart/form-data')
+
+        results, summary = read_ndjson(response)
+        assert sorted(r['inn'] for r in results) == sorted(inns)
+        assert summary['total'] == 3
+
+    def test_plain_text_body(self, client):
+        """ИНН построчно в теле запроса"""
+        inns = [make_inn(f"46000{i:04d}") for i in range(2)]
+        response = client.post('/api/v1/fns/bulk-verify', data="\n".join(inns),
+                               content_type='text/plain')
+
+        results, _ = read_ndjson(response)
+        assert [r['index'] for r in sorted(results, key=lambda r: r['index'])] == [0, 1]
+
+    def test_daily_limit(self, client, service):
+        """Сверх дневного лимита ИНН в API не отправляются"""
+        service.daily_limit = 2
+        inns = [make_inn(f"47000{i:04d}") for i in range(5)]
+        response = client.post('/api/v1/fns/bulk-verify', json=inns)
+
+        results, summary = read_ndjson(response)
+        assert len(service.session.calls) == 2
+        assert sum(r.get('skipped', False) for r in results) == 3
+        assert summary['skipped_by_limit'] == 3
+        assert summary['usage_today'] == 2
+
+    def test_chunk_size_capped(self, client, service, monkeypatch):
+        """Размер пачки из запроса не больше FNS_BULK_MAX_CHUNK"""
+        monkeypatch.setenv('FNS_BULK_MAX_CHUNK', '2')
+        chunk_sizes = []
+        batch_check_iter = service.batch_check_iter
+
+        def spy(inns, chunk_size):
+            chunk_sizes.append(chunk_size)
+            return batch_check_iter(inns, chunk_size=chunk_size)
+
+        monkeypatch.setattr(service, 'batch_check_iter', spy)
+        inns = [make_inn(f"47500{i:04d}") for i in range(3)]
+        response = client.post('/api/v1/fns/bulk-verify?chunk_size=1000000', json=inns)
+
+        assert read_ndjson(response)[1]['total'] == 3
+        assert chunk_sizes == [2]
+
+    def test_requires_token(self, client, service):
+        """Без верного токена ИНН не проверяются"""
+        inns = [make_inn("476000001")]
+        response = client.post('/api/v1/fns/bulk-verify', json=inns, headers={TOKEN_HEADER: 'wrong'})
+
+        assert response.status_code == 401
+        assert service.session.calls == []
+
+    def test_invalid_payload(self, client):
+        """Некорректный JSON отклоняется"""
+        response = client.post('/api/v1/fns/bulk-verify', json={'inn': '123'})
+        assert response.status_code == 400
@@ -0,0 +1,553 @@
+"""
+Тесты сервиса проверки ИНН через API ФНС
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+from backend.services import fns_service as fns_service_module
+from backend.services.fns_quota import PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from backend.services.fns_service import FNSService, is_config_failure, is_temporary_failure
+from backend.services.fns_transport import RetryPolicy
+from tests.fns_helpers import FakeSession, age_entry, make_inn
+
+
+class TestBatchCheck:
+    """Тесты массовой проверки ИНН"""
+
+    def test_results_keep_input_order(self, service):
+        """Результаты возвращаются в порядке входного списка"""
+        inns = [make_inn(f"77070{i:04d}") for i in range(5)] + ["123"]
+        report = service.batch_check(inns)
+
+        assert [r["inn"] for r in report["results"]] == inns
+        assert report["successful"] == 5
+        assert report["failed"] == 1
+        assert all("latency_ms" in r for r in report["results"])
+        assert report["wall_time_ms"] > 0
+
+    def test_lookups_run_in_parallel(self, service):
+        """Запросы к API выполняются в пуле потоков"""
+        inns = [make_inn(f"50000{i:04d}") for i in range(8)]
+        report = service.batch_check(inns, max_workers=8)
+
+        assert service.session.max_in_flight > 1
+        assert report["wall_time_ms"] < 8 * 50
+
+    def test_cache_hits_resolved_without_api(self, service):
+        """Попадания в кэш не расходуют лимит"""
+        cached_inn = make_inn("770708389")
+        service.check_inn(cached_inn)
+        service.session.calls.clear()
+
+        report = service.batch_check([cached_inn, make_inn("100000001")])
+
+        assert report["cache_hits"] == 1
+        assert report["api_requests"] == 1
+        assert cached_inn not in service.session.calls
+
+    def test_dispatch_limited_by_quota(self, service):
+        """В API уходит не больше запросов, чем осталось в лимите"""
+        service.daily_limit = 3
+        inns = [make_inn(f"20000{i:04d}") for i in range(6)]
+        report = service.batch_check(inns)
+
+        assert len(service.session.calls) == 3
+        assert report["api_requests"] == 3
+        assert report["skipped_by_limit"] == 3
+        assert service.quota.used_today() == 3
+
+    def test_duplicates_requested_once(self, service):
+        """Повторяющиеся ИНН запрашиваются один раз"""
+        inn = make_inn("300000001")
+        report = service.batch_check([inn, inn, inn])
+
+        assert service.session.calls == [inn]
+        assert report["successful"] == 3
+
+
+class TestPriorities:
+    """Тесты классов трафика"""
+
+    def test_batch_leaves_interactive_reserve(self, service):
+        """Пакетная проверка не забирает резерв живых регистраций"""
+        service.daily_limit = 10
+        inns = [make_inn(f"60000{i:04d}") for i in range(10)]
+
+        report = service.batch_check(inns)
+
+        assert report["api_requests"] == 7
+        assert report["skipped_by_limit"] == 3
+        assert service.check_inn(make_inn("600010001"))["success"] is True
+
+    def test_reserved_error(self, service):
+        """Отказ по резерву отличается от исчерпанного лимита"""
+        service.daily_limit = 10
+        for _ in range(7):
+            service.quota.try_acquire(priority=PRIORITY_BATCH)
+
+        result = service.check_inn(make_inn("610000001"), priority=PRIORITY_BATCH)
+
+        assert result["success"] is False
+        assert "для этого типа запросов" in result["error"]
+
+    def test_usage_by_priority(self, service):
+        """Статистика показывает использование и резерв по классам"""
+        service.daily_limit = 10
+        service.check_inn(make_inn("620000001"))
+
+        stats = service.get_usage_stats()["by_priority"]
+
+        assert stats[PRIORITY_INTERACTIVE] == {"used": 1, "reserved": 3, "remaining": 9}
+        assert stats[PRIORITY_BATCH]["remaining"] == 7
+
+    def test_unknown_priority(self, service):
+        with pytest.raises(ValueError):
+            service.check_inn(make_inn("630000001"), priority="urgent")
+
+
+class TestBatchCheckIter:
+    """Тесты потоковой массовой проверки ИНН"""
+
+    def test_cache_hits_first(self, service):
+        """Ошибки формата и попадания в кэш отдаются раньше ответов API"""
+        cached_inn = make_inn("770708389")
+        service.check_inn(cached_inn)
+        inns = [make_inn("400000001"), "123", cached_inn]
+
+        results = list(service.batch_check_iter(inns))
+
+        assert [r["index"] for r in results[:2]] == [1, 2]
+        assert results[1]["cached"] is True
+        assert results[2]["inn"] == inns[0]
+        assert all("latency_ms" in r for r in results)
+
+    def test_reads_input_lazily(self, service):
+        """Вход читается частями, а не целиком"""
+        consumed = []
+
+        def source():
+            for i in range(10):
+                consumed.append(i)
+                yield make_inn(f"41000{i:04d}")
+
+        results = service.batch_check_iter(source(), chunk_size=2)
+        first = next(results)
+
+        assert len(consumed) <= 3
+        assert first["index"] in (0, 1)
+        assert len(list(results)) == 9
+
+    def test_dispatch_limited_by_quota(self, service):
+        """Сверх оставшегося лимита ИНН в API не отправляются"""
+        service.daily_limit = 3
+        inns = [make_inn(f"42000{i:04d}") for i in range(6)]
+
+        results = list(service.batch_check_iter(inns, chunk_size=4))
+
+        assert len(service.session.calls) == 3
+        assert sum(r["success"] for r in results) == 3
+        assert sorted(r["index"] for r in results) == list(range(6))
+
+    def test_duplicates_requested_once(self, service):
+        """Повторяющиеся в части ИНН запрашиваются один раз"""
+        inn = make_inn("430000001")
+        results = list(service.batch_check_iter([inn, inn]))
+
+        assert service.session.calls == [inn]
+        assert sorted(r["index"] for r in results) == [0, 1]
+
+
+def run_concurrently(fn, count):
+    """Одновременный запуск fn в count потоках"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(index):
+        barrier.wait()
+        results[index] = fn()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestSingleFlight:
+    """Тесты объединения одновременных запросов одного ИНН"""
+
+    def test_concurrent_calls_share_request(self, service):
+        """Одновременные проверки одного ИНН делают один запрос"""
+        inn = make_inn("400000001")
+        service.session.delay = 0.2
+
+        results = run_concurrently(lambda: service.check_inn(inn), 10)
+
+        assert service.session.calls == [inn]
+        assert all(r["success"] for r in results)
+        assert service.quota.used_today() == 1
+        assert service.get_usage_stats()["coalesced_requests"] == 9
+
+    def test_shared_across_workers_via_redis(self):
+        """С Redis объединение работает между воркерами"""
+        fakeredis = pytest.importorskip('fakeredis')
+        server = fakeredis.FakeServer()
+        workers = []
+        for _ in range(3):
+            fns = FNSService()
+            fns.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+            fns._init_quota(fns.daily_limit)
+            fns._init_cache()
+            fns._init_redis_single_flight()
+            fns.session = FakeSession(delay=0.2)
+            workers.append(fns)
+
+        inn = make_inn("400000002")
+        counter = iter(range(9))
+        lock = threading.Lock()
+
+        def call():
+            with lock:
+                worker = workers[next(counter) % 3]
+            return worker.check_inn(inn)
+
+        results = run_concurrently(call, 9)
+
+        assert sum(len(w.session.calls) for w in workers) == 1
+        assert all(r["success"] for r in results)
+
+
+class TestClearCache:
+    """Тесты очистки кэша"""
+
+    def test_clear_all_keeps_quota(self, service):
+        """Полная очистка удаляет старые записи и не трогает счётчик лимита"""
+        fakeredis = pytest.importorskip('fakeredis')
+        service.redis_client = fakeredis.FakeRedis(decode_responses=True)
+        service._init_quota(service.daily_limit)
+        service._init_cache()
+
+        inn = make_inn("400000003")
+        assert service.check_inn(inn)["success"]
+        service.redis_client.set("fns:" + "0" * 32, "{}")
+
+        report = service.clear_cache()
+
+        assert report["generation"] == 1
+        assert report["deleted"] == 2
+        assert service.quota.used_today() == 1
+        assert service._get_from_cache(inn) is None
+        assert service.check_inn(inn)["cached"] is False
+        assert len(service.session.calls) == 2
+
+    def test_clear_single_inn(self, service):
+        """Очистка по ИНН удаляет только его запись"""
+        first, second = make_inn("400000004"), make_inn("400000005")
+        service.check_inn(first)
+        service.check_inn(second)
+
+        service.clear_cache(first)
+
+        assert service._get_from_cache(first) is None
+        assert service._get_from_cache(second) is not None
+
+
+class FlakySession(FakeSession):
+    """Сессия, отвечающая 503 на первые failures запросов"""
+
+    def __init__(self, failures, status_code=503):
+        super().__init__()
+        self.failures = failures
+        self.error_status = status_code
+
+    def get(self, url, params=None, timeout=None):
+        response = super().get(url, params, timeout)
+        if len(self.calls) <= self.failures:
+            response.status_code = self.error_status
+        return response
+
+
+class TestRetries:
+    """Тесты повторов временных ошибок API"""
+
+    @pytest.fixture
+    def retrying(self, service):
+        service.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.02)
+        return service
+
+    def test_transient_error_retried(self, retrying):
+        """Повтор после 503 возвращает успешный ответ; каждая попытка в лимите"""
+        retrying.session = FlakySession(failures=1)
+        inn = make_inn("850000001")
+
+        result = retrying.check_inn(inn)
+
+        assert result["success"] is True
+        assert retrying.session.calls == [inn, inn]
+        assert retrying.quota.used_today() == 2
+        assert retrying.retry_stats == {'retries': 1, 'recovered': 1, 'exhausted': 0}
+
+    def test_retries_bounded(self, retrying):
+        """После max_attempts попыток возвращается временная ошибка"""
+        retrying.session = FlakySession(failures=10)
+        inn = make_inn("850000002")
+
+        result = retrying.check_inn(inn)
+
+        assert result["success"] is False
+        assert len(retrying.session.calls) == 3
+        assert retrying.retry_stats['exhausted'] == 1
+
+    def test_client_error_not_retried(self, retrying):
+        """Ошибки 4xx не повторяются"""
+        retrying.session.status_code = 404
+        retrying.check_inn(make_inn("850000003"))
+
+        assert len(retrying.session.calls) == 1
+
+    def test_retried_call_keeps_redis_lock(self, monkeypatch):
+        """Блокировка объединения не истекает, пока владелец повторяет запрос"""
+        fakeredis = pytest.importorskip('fakeredis')
+        monkeypatch.setattr(fns_service_module, 'SINGLE_FLIGHT_MARGIN', 0)
+        server = fakeredis.FakeServer()
+        workers = []
+        for _ in range(2):
+            fns = FNSService()
+            fns.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+            fns.request_timeout = 0.3
+            fns.rate_wait = 0
+            fns.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.02)
+            fns._init_quota(fns.daily_limit)
+            fns._init_cache()
+            fns._init_redis_single_flight()
+            workers.append(fns)
+        workers[0].session = FlakySession(failures=2)
+        workers[0].session.delay = 0.2
+        workers[1].session = FakeSession()
+        inn = make_inn("850000005")
+
+        first = threading.Thread(target=workers[0].check_inn, args=(inn,))
+        first.start()
+        time.sleep(0.05)
+        started_at = time.monotonic()
+        second = workers[1].check_inn(inn)
+        first.join()
+
+        # Повторы владельца дольше прежней блокировки (request_timeout + запас)
+        assert time.monotonic() - started_at > workers[1].request_timeout
+        assert workers[1].redis_single_flight.lock_ttl >= 3 * 0.3 + 0.02
+        assert second["success"] is True
+        assert workers[1].session.calls == []
+        assert len(workers[0].session.calls) == 3
+
+    def test_retry_stops_at_daily_limit(self, retrying):
+        """Повтор не выходит за дневной лимит"""
+        retrying.daily_limit = 1
+        retrying.session = FlakySession(failures=10)
+
+        result = retrying.check_inn(make_inn("850000004"))
+
+        assert len(retrying.session.calls) == 1
+        assert result["error"] == retrying._get_from_cache(make_inn("850000004"))["error"]
+
+
+class TestNegativeCache:
+    """Тесты кэширования отрицательных результатов"""
+
+    def test_not_found_cached(self, service):
+        """Отсутствующий в реестре ИНН не запрашивается повторно"""
+        service.session.payload = {}
+        inn = make_inn("800000001")
+
+        first = service.check_inn(inn)
+        second = service.check_inn(inn)
+
+        assert first["success"] is False and first["cached"] is False
+        assert second["success"] is False and second["cached"] is True
+        assert second["error"] == first["error"]
+        assert service.session.calls == [inn]
+        assert service.quota.used_today() == 1
+
+    def test_transient_error_cached_briefly(self, service):
+        """Ошибки 5xx кэшируются с коротким TTL"""
+        service.session.status_code = 503
+        inn = make_inn("800000002")
+
+        service.check_inn(inn)
+        assert service.check_inn(inn)["cached"] is True
+        assert service.session.calls == [inn]
+
+        entry = service._get_from_cache(inn)
+        assert entry["outcome"] == "error"
+        assert service.outcome_ttl["error"] < service.outcome_ttl["not_found"] < service.cache_ttl
+
+    def test_client_error_not_cached(self, service):
+        """Ошибки 4xx (кроме 429) не кэшируются"""
+        service.session.status_code = 403
+        inn = make_inn("800000003")
+
+        service.check_inn(inn)
+        service.check_inn(inn)
+        assert service.session.calls == [inn, inn]
+
+    def test_stats_by_outcome(self, service):
+        """Статистика кэша разделена по исходам"""
+        found = make_inn("800000004")
+        service.check_inn(found)
+        service.check_inn(found)
+        service.session.payload = {}
+        missing = make_inn("800000005")
+        service.check_inn(missing)
+        service.check_inn(missing)
+
+        stats = service.get_usage_stats()["cache_by_outcome"]
+        assert stats["ok"]["stores"] == 1 and stats["ok"]["hits"] == 1
+        assert stats["not_found"]["stores"] == 1 and stats["not_found"]["hits"] == 1
+        assert stats["error"]["stores"] == 0
+
+    def test_temporary_failure(self, service):
+        """Временными считаются сбои API и лимит, но не "не найден", 4xx и неверный формат"""
+        inn = make_inn("800000006")
+        service.session.status_code = 503
+        assert is_temporary_failure(service.check_inn(inn)) is True
+        # Ошибка из кэша временных ошибок остаётся временной
+        assert is_temporary_failure(service.check_inn(inn)) is True
+
+        service.daily_limit = 0
+        assert is_temporary_failure(service.check_inn(make_inn("800000007"))) is True
+
+        service.daily_limit = 100
+        service.session.status_code = 400
+        assert is_temporary_failure(service.check_inn(make_inn("800000010"))) is False
+        service.session.status_code = 403
+        forbidden = service.check_inn(make_inn("800000011"))
+        assert is_temporary_failure(forbidden) is False
+        assert is_config_failure(forbidden) is True
+
+        service.session.status_code = 200
+        assert is_temporary_failure(service.check_inn(make_inn("800000009"))) is False
+        service.session.payload = {}
+        assert is_temporary_failure(service.check_inn(make_inn("800000008"))) is False
+        assert is_temporary_failure(service.check_inn("123")) is False
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestStaleWhileRevalidate:
+    """Тесты фонового обновления устаревающих записей"""
+
+    def test_near_expiry_served_and_refreshed(self, service):
+        """Запись у границы TTL отдаётся сразу и обновляется в фоне"""
+        inn = make_inn("900000001")
+        service.check_inn(inn)
+        age_entry(service, inn, service.cache_ttl * 0.95)
+
+        result = service.check_inn(inn)
+
+        assert result["cached"] is True
+        assert wait_for(lambda: len(service.session.calls) == 2)
+        assert wait_for(lambda: service._entry_age(service._get_from_cache(inn)) < 60)
+
+    def test_stale_within_limit_served(self, service):
+        """Просроченная, но не старше max_stale запись отдаётся из кэша"""
+        inn = make_inn("900000002")
+        service.check_inn(inn)
+        age_entry(service, inn, service.cache_ttl + 60)
+
+        assert service.check_inn(inn)["cached"] is True
+
+    def test_hard_stale_fetched_synchronously(self, service):
+        """Запись старше max_stale требует синхронного запроса"""
+        inn = make_inn("900000003")
+        service.check_inn(inn)
+        age_entry(service, inn, service.cache_ttl + service.max_stale + 1)
+
+        result = service.check_inn(inn)
+        assert result["cached"] is False
+        assert len(service.session.calls) == 2
+
+    def test_refresh_respects_quota_reserve(self, service):
+        """Фоновое обновление не расходует резерв лимита"""
+        inn = make_inn("900000004")
+        service.check_inn(inn)
+        service.daily_limit = 1 + service.refresh_reserve
+        age_entry(service, inn, service.cache_ttl * 0.95)
+
+        assert service.check_inn(inn)["cached"] is True
+        assert service.refresh_stats['skipped_quota'] == 1
+        time.sleep(0.1)
+        assert len(service.session.calls) == 1
+
+    def test_failed_refresh_keeps_stale_data(self, service):
+        """Неудачное обновление не затирает пригодные данные"""
+        inn = make_inn("900000005")
+        service.check_inn(inn)
+        age_entry(service, inn, service.cache_ttl + 60)
+        service.session.status_code = 503
+
+        service.check_inn(inn)
+        assert wait_for(lambda: service.refresh_stats['failed'] == 1)
+        assert service.check_inn(inn)["success"] is True
+
+
+class TestLifecycle:
+    """Ленивое создание сервиса, деградированный режим и fork"""
+
+    def test_lazy_degraded_without_key(self, monkeypatch):
+        """Без ключа общий сервис создаётся и работает только по кэшу"""
+        from backend.services import fns_service as fns_module
+        monkeypatch.setattr(fns_module, "_service", None)
+        monkeypatch.delenv("FNS_API_KEY")
+
+        service = fns_module.get_fns_service()
+        service.session = FakeSession()
+        inn = make_inn("870000001")
+
+        assert fns_module.fns_service.available is False
+        assert service.check_inn(inn)["success"] is False
+        assert service.session.calls == []
+        assert service.get_usage_stats()["available"] is False
+
+        service._save_to_cache(inn, {"inn": inn, "company_name": "ООО Кэш"})
+        assert service.check_inn(inn)["data"]["company_name"] == "ООО Кэш"
+
+    def test_explicit_construction_requires_key(self, monkeypatch):
+        """Явное создание без ключа по-прежнему ошибка"""
+        monkeypatch.delenv("FNS_API_KEY")
+
+        with pytest.raises(ValueError):
+            FNSService()
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="нужен os.fork")
+    def test_resources_recreated_after_fork(self, service):
+        """В дочернем процессе своя HTTP-сессия и рабочий пул обновления"""
+        parent_session = id(service.session)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            ok = (id(service.session) != parent_session
+                  and service._refresh_executor.submit(lambda: 42).result(timeout=5) == 42)
+            os.write(write_fd, b"1" if ok else b"0")
+            os._exit(0)
+
+        os.close(write_fd)
+        os.waitpid(pid, 0)
+        assert os.read(read_fd, 1) == b"1"
+        os.close(read_fd)
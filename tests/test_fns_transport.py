@@ -0,0 +1,52 @@
+"""
+Тесты HTTP-транспорта API ФНС
+"""
+
+import os
+import sys
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.services.fns_transport import RetryPolicy, build_session, connection_stats
+from scripts.fake_fns_server import FakeFNSServer
+
+
+class TestSession:
+    """Тесты пула соединений"""
+
+    def test_keep_alive_reuse(self):
+        """Последовательные запросы идут по одному соединению"""
+        session = build_session(pool_maxsize=2)
+        with FakeFNSServer() as server:
+            for _ in range(5):
+                assert session.get(f"{server.base_url}/egr", params={"req": "7707083893"}).ok
+
+        assert server.connections_count == 1
+        assert connection_stats(session) == {
+            "requests": 5, "new_connections": 1, "reused": 4, "reuse_rate": 0.8
+        }
+
+    def test_adapter_does_not_retry(self):
+        """Адаптер не повторяет запросы сам"""
+        session = build_session()
+
+        assert session.get_adapter("https://api-fns.ru").max_retries.total == 0
+
+
+class TestRetryPolicy:
+    """Тесты политики повторов"""
+
+    def test_retryable_statuses(self):
+        assert RetryPolicy.is_retryable(None)
+        assert RetryPolicy.is_retryable(503)
+        assert RetryPolicy.is_retryable(429)
+        assert not RetryPolicy.is_retryable(404)
+        assert not RetryPolicy.is_retryable(200)
+
+    def test_delay_bounded(self):
+        """Задержка растёт экспоненциально, но не выше max_delay"""
+        policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+
+        assert all(0 <= policy.delay(1) <= 0.5 for _ in range(100))
+        assert all(0 <= policy.delay(10) <= 2.0 for _ in range(100))
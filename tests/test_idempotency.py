@@ -0,0 +1,222 @@
+"""
+Тесты ключей идемпотентности
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask, jsonify, request
+
+from backend.routes.idempotency import idempotent
+from backend.services.fns_service import ERROR_TEMPORARY, NOT_FOUND_ERROR, is_temporary_failure
+from backend.services.idempotency import (
+    IdempotencyConflict, IdempotencyInProgress, InMemoryIdempotencyStore, RedisIdempotencyStore,
+    StoredResponse
+)
+
+
+class FakeClock:
+    """Управляемые часы"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_handler(status=201, delay=0.0):
+    calls = []
+
+    def handler():
+        calls.append(1)
+        time.sleep(delay)
+        return StoredResponse(status=status, body=f'{{"call": {len(calls)}}}')
+
+    return handler, calls
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request):
+    """Хранилище в памяти и в Redis"""
+    if request.param == "memory":
+        return InMemoryIdempotencyStore(ttl=60, lock_ttl=5, wait_timeout=2)
+    fakeredis = pytest.importorskip('fakeredis')
+    pytest.importorskip('lupa')
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    return RedisIdempotencyStore(client, ttl=60, lock_ttl=5, wait_timeout=2, poll_interval=0.01)
+
+
+class TestIdempotencyStore:
+    """Тесты хранилища ответов"""
+
+    def test_replay(self, store):
+        """Повтор ключа получает сохранённый ответ без выполнения"""
+        handler, calls = make_handler()
+
+        first, replayed_first = store.run("k1", "fp", handler)
+        second, replayed_second = store.run("k1", "fp", handler)
+
+        assert (replayed_first, replayed_second) == (False, True)
+        assert second == first
+        assert len(calls) == 1
+
+    def test_concurrent_duplicates_wait(self, store):
+        """Одновременные повторы ждут первый запрос, а не выполняются снова"""
+        handler, calls = make_handler(delay=0.2)
+        results = []
+        lock = threading.Lock()
+
+        def worker():
+            result = store.run("k2", "fp", handler)
+            with lock:
+                results.append(result)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert len({response.body for response, _ in results}) == 1
+        assert sum(not replayed for _, replayed in results) == 1
+        stats = store.get_stats()
+        assert stats['waited'] + stats['replayed'] == 7
+
+    def test_conflict(self, store):
+        """Ключ с другим телом запроса - ошибка"""
+        handler, _ = make_handler()
+        store.run("k3", "fp-1", handler)
+
+        with pytest.raises(IdempotencyConflict):
+            store.run("k3", "fp-2", handler)
+
+    def test_server_error_not_stored(self, store):
+        """Ответ 5xx не сохраняется: повтор выполнит запрос заново"""
+        handler, calls = make_handler(status=503)
+        store.run("k4", "fp", handler)
+        store.run("k4", "fp", handler)
+
+        assert len(calls) == 2
+
+    def test_exception_releases_key(self, store):
+        """Исключение освобождает ключ"""
+        def failing():
+            raise RuntimeError("сбой")
+
+        with pytest.raises(RuntimeError):
+            store.run("k5", "fp", failing)
+        handler, calls = make_handler()
+        store.run("k5", "fp", handler)
+
+        assert len(calls) == 1
+
+    def test_in_progress_timeout(self, store):
+        """Не дождались выполняющегося запроса - IdempotencyInProgress"""
+        store.wait_timeout = 0.05
+        handler, _ = make_handler(delay=0.3)
+        thread = threading.Thread(target=store.run, args=("k6", "fp", handler))
+        thread.start()
+        time.sleep(0.05)
+
+        with pytest.raises(IdempotencyInProgress):
+            store.run("k6", "fp", handler)
+        thread.join()
+
+
+class TestInMemoryExpiry:
+    """Тесты времени жизни записей в памяти"""
+
+    def test_ttl(self):
+        """После ttl ключ выполняется заново"""
+        clock = FakeClock()
+        store = InMemoryIdempotencyStore(clock=clock, ttl=60, lock_ttl=5, wait_timeout=0)
+        handler, calls = make_handler()
+
+        store.run("k", "fp", handler)
+        clock.now += 61
+        store.run("k", "fp", handler)
+
+        assert len(calls) == 2
+
+
+class TestIdempotentRoute:
+    """Тесты заголовка Idempotency-Key в маршруте"""
+
+    @pytest.fixture
+    def client(self):
+        app = Flask(__name__)
+        store = InMemoryIdempotencyStore(ttl=60, lock_ttl=5, wait_timeout=2)
+        app.config['calls'] = []
+
+        @app.route('/register', methods=['POST'])
+        @idempotent('test:register', get_store=lambda: store)
+        def register():
+            app.config['calls'].append(request.json)
+            response = jsonify({'success': True, 'partner_code': f"P-{len(app.config['calls'])}"})
+            response.headers['Location'] = '/partners/1'
+            return response, 201
+
+        client = app.test_client()
+        client.calls = app.config['calls']
+        return client
+
+    def test_replayed_response(self, client):
+        """Повтор с ключом получает тот же ответ с пометкой"""
+        headers = {'Idempotency-Key': 'abc'}
+        first = client.post('/register', json={'inn': '1'}, headers=headers)
+        second = client.post('/register', json={'inn': '1'}, headers=headers)
+
+        assert first.status_code == second.status_code == 201
+        assert second.get_json() == first.get_json() == {'success': True, 'partner_code': 'P-1'}
+        assert second.headers['Location'] == '/partners/1'
+        assert second.headers['Idempotent-Replayed'] == 'true'
+        assert 'Idempotent-Replayed' not in first.headers
+        assert len(client.calls) == 1
+
+    def test_without_key(self, client):
+        """Без заголовка каждый запрос выполняется"""
+        client.post('/register', json={'inn': '1'})
+        client.post('/register', json={'inn': '1'})
+        assert len(client.calls) == 2
+
+    def test_other_body(self, client):
+        """Тот же ключ с другим телом - 422"""
+        client.post('/register', json={'inn': '1'}, headers={'Idempotency-Key': 'abc'})
+        response = client.post('/register', json={'inn': '2'}, headers={'Idempotency-Key': 'abc'})
+
+        assert response.status_code == 422
+        assert len(client.calls) == 1
+
+    def test_temporary_failure_not_replayed(self):
+        """Временный сбой проверки ИНН (503) не сохраняется, окончательный отказ (400) - да"""
+        app = Flask(__name__)
+        store = InMemoryIdempotencyStore(ttl=60, lock_ttl=5, wait_timeout=2)
+        results = [
+            {'success': False, 'error': 'Сервис ФНС временно недоступен. Повторите попытку позже.',
+             'error_type': ERROR_TEMPORARY, 'inn': '7707083893', 'cached': False},
+            {'success': False, 'error': NOT_FOUND_ERROR, 'inn': '7707083893', 'cached': False},
+        ]
+
+        @app.route('/register', methods=['POST'])
+        @idempotent('test:register', get_store=lambda: store)
+        def register():
+            result = results.pop(0)
+            return jsonify({'success': False, 'details': result['error']}), \
+                503 if is_temporary_failure(result) else 400
+
+        client = app.test_client()
+        headers = {'Idempotency-Key': 'abc'}
+        statuses = [client.post('/register', json={'inn': '7707083893'}, headers=headers).status_code
+                    for _ in range(3)]
+
+        assert statuses == [503, 400, 400]
+        assert results == []
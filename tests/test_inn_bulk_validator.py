@@ -0,0 +1,67 @@
+"""
+Тесты массовой проверки ИНН
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+np = pytest.importorskip('numpy')
+
+from backend.services.fns_service import FNSService
+from backend.services.inn_bulk_validator import (
+    INN_BAD_CHECKSUM, INN_BAD_CHECKSUM_2, INN_BAD_LENGTH, INN_EMPTY, INN_NOT_DIGITS, INN_OK,
+    error_messages, validate_inns_bulk
+)
+
+
+def scalar(inn):
+    return FNSService.validate_inn_format(inn)
+
+
+class TestValidateInnsBulk:
+    """Тесты векторной проверки"""
+
+    def test_matches_scalar_validation(self):
+        """Результаты совпадают с построчной проверкой"""
+        rng = random.Random(7)
+        inns = ["".join(rng.choice("0123456789") for _ in range(rng.choice([10, 12])))
+                for _ in range(20000)]
+        inns += ["7707083893", "500100732259", "", "77070838", "77O7083893", "1234567890123"]
+
+        valid, codes = validate_inns_bulk(inns)
+        expected = [scalar(inn) for inn in inns]
+
+        assert valid.tolist() == [ok for ok, _ in expected]
+        assert error_messages(inns, codes) == [message for _, message in expected]
+
+    def test_error_codes(self):
+        """Коды ошибок по типам"""
+        inns = ["7707083893", "", "12ab", "123456789", "7707083894", "500100732258", "500100732249"]
+        _, codes = validate_inns_bulk(inns)
+
+        assert codes.tolist() == [
+            INN_OK, INN_EMPTY, INN_NOT_DIGITS, INN_BAD_LENGTH,
+            INN_BAD_CHECKSUM, INN_BAD_CHECKSUM_2, INN_BAD_CHECKSUM
+        ]
+
+    def test_mixed_column(self):
+        """Колонка с пропусками и числами"""
+        column = np.array(["7707083893", None, 7707083893], dtype=object)
+        valid, codes = validate_inns_bulk(column)
+
+        assert valid.tolist() == [True, False, True]
+        assert codes[1] == INN_EMPTY
+
+    def test_empty_input(self):
+        """Пустой вход"""
+        valid, codes = validate_inns_bulk([])
+        assert len(valid) == 0 and len(codes) == 0
@@ -0,0 +1,140 @@
+"""
+Тесты кэша карточек партнёров и ETag
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask, jsonify
+
+from backend.routes.partner_cache import cached_partner_response
+from backend.services.partner_cache import PartnerCache
+
+# Пакет backend/models перекрывает модуль backend/models.py, модели берутся по пути
+_spec = importlib.util.spec_from_file_location(
+    'backend_models_db', os.path.join(os.path.dirname(__file__), '..', 'backend', 'models.py')
+)
+models = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(models)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request):
+    """Кэш в памяти и с Redis"""
+    redis_client = None
+    if request.param == "redis":
+        fakeredis = pytest.importorskip('fakeredis')
+        redis_client = fakeredis.FakeRedis(decode_responses=True)
+    cache = PartnerCache(redis_client, ttl=60, l1_ttl=0)
+    cache.track(models.db.session, models.Partner)
+    yield cache
+    cache.untrack()
+
+
+@pytest.fixture
+def app(cache):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    models.db.init_app(app)
+    app.config['queries'] = []
+
+    @app.route('/partners/<partner_code>')
+    def get_partner(partner_code):
+        response = cached_partner_response(
+            partner_code,
+            lambda code: models.Partner.query.filter_by(partner_code=code).first(),
+            lambda partner: {'success': True, 'partner': partner.to_dict()},
+            cache=cache
+        )
+        return response if response is not None else (jsonify({'success': False}), 404)
+
+    with app.app_context():
+        models.db.create_all()
+        event.listen(models.db.engine, 'before_cursor_execute',
+                     lambda *args: app.config['queries'].append(args[2]))
+        models.db.session.add(models.Partner(partner_code='P-1', company_name='ООО Тест', inn='7707083893'))
+        models.db.session.commit()
+        yield app
+
+
+def set_stage(app, stage):
+    partner = models.Partner.query.filter_by(partner_code='P-1').first()
+    partner.registration_stage = stage
+    models.db.session.commit()
+
+
+class TestCachedPartner:
+    """Тесты GET карточки партнёра"""
+
+    def test_etag_and_304(self, app):
+        """Повтор с If-None-Match - 304 без запроса к базе"""
+        client = app.test_client()
+        first = client.get('/partners/P-1')
+        etag = first.headers['ETag']
+        app.config['queries'].clear()
+
+        second = client.get('/partners/P-1', headers={'If-None-Match': etag})
+
+        assert first.status_code == 200
+        assert first.get_json()['partner']['partner_code'] == 'P-1'
+        assert first.headers['Cache-Control'] == 'no-cache'
+        assert second.status_code == 304
+        assert second.get_data() == b''
+        assert app.config['queries'] == []
+
+    def test_cached_body(self, app):
+        """Без If-None-Match тело отдаётся из кэша"""
+        client = app.test_client()
+        first = client.get('/partners/P-1')
+        app.config['queries'].clear()
+
+        second = client.get('/partners/P-1')
+
+        assert second.status_code == 200
+        assert second.get_data() == first.get_data()
+        assert app.config['queries'] == []
+
+    def test_invalidated_on_commit(self, app, cache):
+        """Изменение партнёра сбрасывает запись: новый ETag и данные"""
+        client = app.test_client()
+        etag = client.get('/partners/P-1').headers['ETag']
+        invalidations = cache.get_stats()['invalidations']
+
+        set_stage(app, 'completed')
+        response = client.get('/partners/P-1', headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert response.get_json()['partner']['registration_stage'] == 'completed'
+        assert cache.get_stats()['invalidations'] == invalidations + 1
+
+    def test_rollback_keeps_entry(self, app, cache):
+        """Откат изменений не сбрасывает запись"""
+        client = app.test_client()
+        etag = client.get('/partners/P-1').headers['ETag']
+        invalidations = cache.get_stats()['invalidations']
+
+        partner = models.Partner.query.filter_by(partner_code='P-1').first()
+        partner.registration_stage = 'completed'
+        models.db.session.flush()
+        models.db.session.rollback()
+
+        assert client.get('/partners/P-1', headers={'If-None-Match': etag}).status_code == 304
+        assert cache.get_stats()['invalidations'] == invalidations
+
+    def test_missing_not_cached(self, app):
+        """Отсутствующий партнёр не кэшируется: после регистрации виден сразу"""
+        client = app.test_client()
+        assert client.get('/partners/P-2').status_code == 404
+
+        models.db.session.add(models.Partner(partner_code='P-2', company_name='ООО Два', inn='500100732259'))
+        models.db.session.commit()
+
+        assert client.get('/partners/P-2').status_code == 200
@@ -0,0 +1,164 @@
+"""
+Тесты выдачи кодов партнёров
+"""
+
+import importlib.util
+import os
+import sys
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.services.partner_codes import (
+    DatabaseCodeAllocator, RedisCodeAllocator, count_start, create_code_allocator, format_code
+)
+
+# Пакет backend/models перекрывает модуль backend/models.py, модели берутся по пути
+_spec = importlib.util.spec_from_file_location(
+    'backend_models_db', os.path.join(os.path.dirname(__file__), '..', 'backend', 'models.py')
+)
+models = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(models)
+
+TABLE = models.CodeSequence.__table__
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'codes.db'}", connect_args={'timeout': 30})
+    TABLE.create(engine)
+    yield engine
+    engine.dispose()
+
+
+def allocate_in_parallel(allocators, threads_per_allocator=4, per_thread=50):
+    """Коды из нескольких "воркеров", в каждом - несколько потоков"""
+    codes = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(allocators) * threads_per_allocator)
+
+    def worker(allocator):
+        barrier.wait()
+        issued = [allocator.next_value() for _ in range(per_thread)]
+        with lock:
+            codes.extend(issued)
+
+    threads = [threading.Thread(target=worker, args=(allocator,))
+               for allocator in allocators for _ in range(threads_per_allocator)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return codes
+
+
+class TestDatabaseCodeAllocator:
+    """Тесты счётчика в таблице"""
+
+    def test_unique_under_parallel_load(self, engine):
+        """Воркеры с общим счётчиком не выдают одинаковых номеров"""
+        allocators = [DatabaseCodeAllocator(engine, TABLE, block_size=10) for _ in range(4)]
+
+        values = allocate_in_parallel(allocators)
+
+        assert len(values) == 800
+        assert len(set(values)) == 800
+        # Один запрос к счётчику на блок, а не на каждый код
+        assert sum(allocator.stats['blocks'] for allocator in allocators) <= 800 // 10 + len(allocators)
+
+    def test_start_used_once(self, engine):
+        """Начальный номер берётся только при создании счётчика"""
+        calls = []
+        start = lambda: calls.append(1) or 42
+        first = DatabaseCodeAllocator(engine, TABLE, block_size=5, start=start)
+        second = DatabaseCodeAllocator(engine, TABLE, block_size=5, start=start)
+
+        assert first.next_value() == 42
+        assert second.next_value() == 47
+        assert first.next_value() == 43
+        assert len(calls) == 1
+
+    def test_count_start(self, engine):
+        """Счётчик на базе с партнёрами продолжает нумерацию после них"""
+        partners = models.Partner.__table__
+        partners.create(engine)
+        with engine.begin() as conn:
+            conn.execute(partners.insert(), [{'partner_code': f'P-{i}', 'company_name': 'ООО', 'inn': str(i)}
+                                             for i in range(3)])
+
+        allocator = DatabaseCodeAllocator(engine, TABLE, block_size=5, start=count_start(engine, partners))
+
+        assert allocator.next_value() == 4
+
+    def test_block_not_reused_after_fork(self, engine):
+        """После fork дочерний процесс не выдаёт номера из блока родителя"""
+        allocator = DatabaseCodeAllocator(engine, TABLE, block_size=5)
+        assert allocator.next_value() == 1
+
+        allocator._after_fork()
+
+        assert allocator.next_value() == 6
+
+    def test_next_values(self, engine):
+        """Пачка номеров: остаток блока, затем один запрос на недостающие"""
+        allocator = DatabaseCodeAllocator(engine, TABLE, block_size=5)
+        assert allocator.next_value() == 1
+
+        assert allocator.next_values(12) == list(range(2, 14))
+        assert allocator.stats['blocks'] == 2
+        assert allocator.next_value() == 14
+
+
+class TestRedisCodeAllocator:
+    """Тесты счётчика в Redis"""
+
+    @pytest.fixture
+    def server(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        return fakeredis.FakeServer()
+
+    def make_allocator(self, server, **kwargs):
+        import fakeredis
+        return RedisCodeAllocator(fakeredis.FakeRedis(server=server, decode_responses=True), **kwargs)
+
+    def test_unique_under_parallel_load(self, server):
+        """Воркеры с общим счётчиком не выдают одинаковых номеров"""
+        allocators = [self.make_allocator(server, block_size=10) for _ in range(4)]
+
+        values = allocate_in_parallel(allocators)
+
+        assert sorted(values) == list(range(1, 801))
+
+    def test_start(self, server):
+        """Счётчик начинается со start и продолжается после перезапуска"""
+        assert self.make_allocator(server, block_size=3, start=100).next_value() == 100
+        assert self.make_allocator(server, block_size=3, start=1).next_value() == 103
+
+
+class TestPartnerCode:
+    """Тесты формата кода"""
+
+    def test_format(self):
+        """P-ГГММДД и номер не короче 4 цифр"""
+        assert format_code(7, datetime(2026, 3, 1)) == "P-2603010007"
+        assert format_code(123456, datetime(2026, 3, 1)) == "P-260301123456"
+
+    def test_next_code(self, engine):
+        """Код из даты и очередного номера"""
+        allocator = DatabaseCodeAllocator(engine, TABLE, clock=lambda: datetime(2026, 3, 1))
+        assert [allocator.next_code() for _ in range(2)] == ["P-2603010001", "P-2603010002"]
+
+    def test_backend_choice(self, engine, monkeypatch):
+        """Хранилище счётчика выбирается по PARTNER_CODE_BACKEND"""
+        monkeypatch.setenv('PARTNER_CODE_BACKEND', 'db')
+        assert isinstance(create_code_allocator(engine, TABLE), DatabaseCodeAllocator)
+        monkeypatch.setenv('PARTNER_CODE_BACKEND', 'redis')
+        assert isinstance(create_code_allocator(engine, TABLE, redis_client=object()), RedisCodeAllocator)
+        monkeypatch.setenv('PARTNER_CODE_BACKEND', 'memcached')
+        with pytest.raises(ValueError):
+            create_code_allocator(engine, TABLE)
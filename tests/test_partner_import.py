@@ -0,0 +1,198 @@
+"""
+Тесты массового импорта партнёров
+"""
+
+import importlib.util
+import io
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from backend.services.partner_codes import DatabaseCodeAllocator
+from backend.services.partner_import import (
+    FORMAT_CSV, FORMAT_JSONL, STAGE_IMPORTED, PartnerImporter, detect_format, iter_rows
+)
+from tests.fns_helpers import make_inn
+
+# Пакет backend/models перекрывает модуль backend/models.py, модели берутся по пути
+_spec = importlib.util.spec_from_file_location(
+    'backend_models_db', os.path.join(os.path.dirname(__file__), '..', 'backend', 'models.py')
+)
+models = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(models)
+
+PARTNERS = models.Partner.__table__
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'partners.db'}")
+    models.db.metadata.create_all(engine, tables=[PARTNERS, models.CodeSequence.__table__])
+    yield engine
+    engine.dispose()
+
+
+def make_importer(engine, **kwargs):
+    clock = lambda: datetime(2024, 1, 2)
+    allocator = DatabaseCodeAllocator(engine, models.CodeSequence.__table__, block_size=10, clock=clock)
+    return PartnerImporter(engine, PARTNERS, allocator, clock=clock, **kwargs)
+
+
+def rows_in_db(engine):
+    with engine.connect() as conn:
+        return [dict(row._mapping) for row in conn.execute(select(PARTNERS).order_by(PARTNERS.c.id))]
+
+
+def partner(index, **fields):
+    row = {'company_name': f'ООО Тест {index}', 'inn': make_inn(f"70000{index:04d}"),
+           'email': f'partner{index}@example.com'}
+    row.update(fields)
+    return row
+
+
+class TestRowReaders:
+    """Тесты чтения CSV и JSONL"""
+
+    def test_csv_russian_headers(self):
+        """Заголовки выгрузки CRM и разделитель ';'"""
+        source = io.StringIO("Наименование;ИНН;E-mail\nООО Ромашка;7707083893;Info@Example.com\n")
+
+        assert list(iter_rows(source)) == [
+            {'company_name': 'ООО Ромашка', 'inn': '7707083893', 'email': 'Info@Example.com'}
+        ]
+
+    def test_csv_comma(self):
+        source = io.StringIO("company_name,inn\n\"ООО \"\"Ромашка\"\", филиал\",7707083893\n")
+
+        assert list(iter_rows(source)) == [{'company_name': 'ООО "Ромашка", филиал', 'inn': '7707083893'}]
+
+    def test_jsonl_bad_line(self):
+        """Строка с ошибкой JSON становится ошибкой строки, а не всего файла"""
+        source = io.StringIO('{"inn": "1"}\n\n{oops\n[1]\n')
+
+        rows = list(iter_rows(source, FORMAT_JSONL))
+
+        assert rows[0] == {'inn': '1'}
+        assert rows[1]['_error'].startswith('Некорректный JSON')
+        assert rows[2] == {'_error': 'Ожидается объект JSON'}
+
+    def test_detect_format(self):
+        assert detect_format('crm.JSONL') == FORMAT_JSONL
+        assert detect_format('', 'application/x-ndjson') == FORMAT_JSONL
+        assert detect_format('crm.csv') == FORMAT_CSV
+
+
+class TestPartnerImporter:
+    """Тесты пакетного импорта"""
+
+    def test_import(self, engine):
+        """Строки вставляются с кодами и этапом imported"""
+        report = make_importer(engine, chunk_size=2).run([partner(1), partner(2, inn='500100732259'),
+                                                          partner(3, email='')])
+
+        assert (report.total, report.imported, report.errors) == (3, 3, [])
+        rows = rows_in_db(engine)
+        assert [row['partner_code'] for row in rows] == ['P-2401020001', 'P-2401020002', 'P-2401020003']
+        assert [row['legal_form'] for row in rows] == ['ООО', 'ИП', 'ООО']
+        assert rows[2]['email'] is None
+        assert all(row['registration_stage'] == STAGE_IMPORTED for row in rows)
+        assert all(row['registration_source'] == 'crm_import' for row in rows)
+
+    def test_row_errors(self, engine):
+        """Ошибки по строкам с номерами; остальные строки импортируются"""
+        bad_checksum = make_inn("700000002")[:-1] + str((int(make_inn("700000002")[-1]) + 1) % 10)
+        rows = [
+            partner(1),
+            partner(2, inn=bad_checksum),
+            partner(3, company_name=''),
+            partner(4, inn='12345'),
+            {'_error': 'Некорректный JSON'},
+            partner(5, phone='1' * 21),
+        ]
+
+        report = make_importer(engine).run(rows)
+
+        assert report.imported == 1
+        assert [(error['row'], error['error']) for error in report.errors] == [
+            (2, 'Неверная контрольная сумма ИНН'),
+            (3, 'Не заполнено обязательное поле: company_name'),
+            (4, 'ИНН должен содержать 10 цифр (юр.лицо) или 12 цифр (ИП)'),
+            (5, 'Некорректный JSON'),
+            (6, 'Поле phone длиннее 20 символов'),
+        ]
+
+    def test_duplicates(self, engine):
+        """Дубли ИНН и email - с базой и внутри файла"""
+        with engine.begin() as conn:
+            conn.execute(insert(PARTNERS), [{'partner_code': 'P-1', 'company_name': 'ООО', 'inn': partner(1)['inn'],
+                                             'email': 'OLD@example.com'}])
+
+        report = make_importer(engine).run([
+            partner(1), partner(2, email='old@example.com'), partner(3), partner(3, email='other@example.com'),
+            partner(4, email='Partner3@Example.com'),
+        ])
+
+        assert report.imported == 1
+        assert [(error['row'], error['error']) for error in report.errors] == [
+            (1, 'Компания с таким ИНН уже зарегистрирована'),
+            (2, 'Партнёр с таким email уже зарегистрирован'),
+            (4, 'Компания с таким ИНН уже зарегистрирована'),
+            (5, 'Партнёр с таким email уже зарегистрирован'),
+        ]
+
+    def test_dry_run(self, engine):
+        """Проверка без записи и без выдачи кодов"""
+        report = make_importer(engine, dry_run=True).run([partner(1), partner(2)])
+
+        assert report.imported == 2
+        assert rows_in_db(engine) == []
+        assert report.to_dict()['dry_run'] is True
+
+    def test_conflict_falls_back_to_rows(self, engine):
+        """Партнёр, добавленный во время импорта, отклоняет только свою строку"""
+        importer = make_importer(engine)
+        importer._load_existing = lambda: None
+        with engine.begin() as conn:
+            conn.execute(insert(PARTNERS), [{'partner_code': 'P-1', 'company_name': 'ООО', 'inn': partner(2)['inn']}])
+
+        report = importer.run([partner(1), partner(2), partner(3)])
+
+        assert report.imported == 2
+        assert [error['row'] for error in report.errors] == [2]
+
+    def test_conflict_reasons(self, engine):
+        """Дубль email назван по причине, чужой конфликт (partner_code) - внутренняя ошибка"""
+        importer = make_importer(engine)
+        importer._load_existing = lambda: None
+        with engine.begin() as conn:
+            # Код, который счётчик выдаст первым
+            conn.execute(insert(PARTNERS), [
+                {'partner_code': 'P-2401020001', 'company_name': 'ООО', 'inn': '1', 'email': None},
+                {'partner_code': 'P-1', 'company_name': 'ООО', 'inn': '2', 'email': 'partner2@example.com'},
+            ])
+
+        report = importer.run([partner(1), partner(2)])
+
+        assert report.imported == 0
+        assert [error['error'] for error in report.errors] == [
+            'Внутренняя ошибка при сохранении строки',
+            'Партнёр с таким email уже зарегистрирован',
+        ]
+
+    def test_report(self, engine):
+        """Ошибки в ответе ограничиваются, скорость считается"""
+        report = make_importer(engine).run([partner(1, inn='1'), partner(2, inn='2'), partner(3)])
+
+        result = report.to_dict(max_errors=1)
+
+        assert (result['total'], result['imported'], result['failed']) == (3, 1, 2)
+        assert len(result['errors']) == 1 and result['errors_truncated'] is True
+        assert result['rows_per_second'] > 0
+        json.dumps(result)
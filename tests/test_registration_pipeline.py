@@ -0,0 +1,251 @@
+"""
+Тесты асинхронной регистрации партнёров
+"""
+
+import importlib.util
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+from flask import Flask
+
+from backend.services.fns_service import ERROR_TEMPORARY, NOT_FOUND_ERROR
+from backend.services.registration_pipeline import (
+    OUTCOME_FAILED, OUTCOME_RETRY, OUTCOME_SKIPPED, OUTCOME_VERIFIED, STAGE_FAILED, STAGE_PENDING,
+    STAGE_VERIFIED, VERIFICATION_FAILED, VERIFICATION_VERIFIED, RegistrationPipeline
+)
+from tests.fns_helpers import make_inn
+
+# Пакет backend/models перекрывает модуль backend/models.py, модели берутся по пути
+_spec = importlib.util.spec_from_file_location(
+    'backend_models_db', os.path.join(os.path.dirname(__file__), '..', 'backend', 'models.py')
+)
+models = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(models)
+
+
+class StubVerifier:
+    """Проверка ИНН с заданными ответами по очереди"""
+
+    def __init__(self, *outcomes, delay=0.0):
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.calls = []
+
+    def check_inn(self, inn):
+        self.calls.append(inn)
+        time.sleep(self.delay)
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if outcome == 'ok':
+            return {"success": True, "inn": inn, "cached": False, "provider": "fns_api",
+                    "data": {"inn": inn, "company_name": "ООО Тест", "is_active": True}}
+        if outcome == 'not_found':
+            return {"success": False, "error": NOT_FOUND_ERROR, "inn": inn, "cached": False,
+                    "provider": "fns_api"}
+        return {"success": False, "error": "Таймаут при обращении к серверу ФНС", "error_type": ERROR_TEMPORARY,
+                "inn": inn, "cached": False, "provider": "fns_api"}
+
+
+class ManualTimer:
+    """threading.Timer, который запускается вручную"""
+
+    created = []
+
+    def __init__(self, delay, fn, args=()):
+        self.delay = delay
+        self.fn = fn
+        self.args = args
+        self.daemon = False
+        ManualTimer.created.append(self)
+
+    def start(self):
+        pass
+
+    def fire(self):
+        self.fn(*self.args)
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    # Файл, а не память: потоки пула работают через свои соединения
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'partners.db'}"
+    models.db.init_app(app)
+    with app.app_context():
+        models.db.create_all()
+    yield app
+    with app.app_context():
+        models.db.drop_all()
+
+
+def add_pending(app, inn, **fields):
+    with app.app_context():
+        partner = models.Partner(partner_code=f"P-{inn}", company_name="ООО Тест", inn=inn,
+                                 registration_stage=STAGE_PENDING, verification_status='pending', **fields)
+        models.db.session.add(partner)
+        models.db.session.commit()
+        return partner.id
+
+
+def load(app, partner_id):
+    with app.app_context():
+        partner = models.db.session.get(models.Partner, partner_id)
+        models.db.session.expunge(partner)
+        return partner
+
+
+def make_pipeline(app, verifier, **kwargs):
+    ManualTimer.created = []
+    kwargs.setdefault('retries', 2)
+    kwargs.setdefault('retry_delay', 60)
+    return RegistrationPipeline(app, models.db.session, models.Partner, verifier=verifier,
+                                timer=ManualTimer, **kwargs)
+
+
+class TestRegistrationPipeline:
+    """Тесты очереди проверки ИНН"""
+
+    def test_verified(self, app):
+        """Подтверждённый ИНН: этап inn_verified, данные проверки сохранены"""
+        partner_id = add_pending(app, make_inn("600000001"))
+        pipeline = make_pipeline(app, StubVerifier('ok'))
+
+        with app.app_context():
+            assert pipeline.verify(partner_id) == OUTCOME_VERIFIED
+
+        partner = load(app, partner_id)
+        assert partner.registration_stage == STAGE_VERIFIED
+        assert partner.verification_status == VERIFICATION_VERIFIED
+        assert partner.verification_data['company_name'] == "ООО Тест"
+        assert partner.verification_method == 'fns_api'
+
+    def test_not_found_fails_without_retry(self, app):
+        """'ИНН не найден' - окончательный отказ"""
+        partner_id = add_pending(app, make_inn("600000002"))
+        pipeline = make_pipeline(app, StubVerifier('not_found'))
+
+        with app.app_context():
+            assert pipeline.verify(partner_id) == OUTCOME_FAILED
+
+        partner = load(app, partner_id)
+        assert partner.registration_stage == STAGE_FAILED
+        assert partner.verification_status == VERIFICATION_FAILED
+        assert partner.verification_data == {'error': NOT_FOUND_ERROR}
+
+    def test_transient_error_retried(self, app):
+        """Временная ошибка повторяется с растущей задержкой, затем отказ"""
+        partner_id = add_pending(app, make_inn("600000003"))
+        verifier = StubVerifier('error')
+        pipeline = make_pipeline(app, verifier)
+
+        submitted_at = load(app, partner_id).updated_at
+        pipeline.submit(partner_id)
+        pipeline.shutdown()
+        assert load(app, partner_id).registration_stage == STAGE_PENDING
+        assert load(app, partner_id).updated_at > submitted_at
+        assert [timer.delay for timer in ManualTimer.created] == [60]
+
+        ManualTimer.created[0].fire()
+        pipeline.shutdown()
+        ManualTimer.created[1].fire()
+        pipeline.shutdown()
+
+        assert [timer.delay for timer in ManualTimer.created] == [60, 120]
+        assert len(verifier.calls) == 3
+        assert load(app, partner_id).registration_stage == STAGE_FAILED
+        stats = pipeline.get_stats()
+        assert stats[OUTCOME_RETRY] == 2
+        assert stats[OUTCOME_FAILED] == 1
+        assert stats['submitted'] == 1
+        assert stats['in_progress'] == 0
+
+    def test_submit_returns_immediately(self, app):
+        """Постановка в очередь не ждёт проверки"""
+        partner_id = add_pending(app, make_inn("600000004"))
+        pipeline = make_pipeline(app, StubVerifier('ok', delay=0.3))
+
+        started = time.perf_counter()
+        pipeline.submit(partner_id)
+        assert time.perf_counter() - started < 0.1
+
+        pipeline.shutdown()
+        assert load(app, partner_id).registration_stage == STAGE_VERIFIED
+        assert pipeline.get_stats()['latency_p99_ms'] >= 300
+
+    def test_parallel_registrations(self, app):
+        """Проверки идут параллельно в пуле"""
+        ids = [add_pending(app, make_inn(f"61000000{i}")) for i in range(8)]
+        pipeline = make_pipeline(app, StubVerifier('ok', delay=0.2), max_workers=8)
+
+        started = time.perf_counter()
+        for partner_id in ids:
+            pipeline.submit(partner_id)
+        pipeline.shutdown()
+
+        assert time.perf_counter() - started < 1.0
+        assert all(load(app, partner_id).registration_stage == STAGE_VERIFIED for partner_id in ids)
+
+    def test_skips_processed(self, app):
+        """Партнёр уже не на этапе проверки - ИНН не проверяется"""
+        partner_id = add_pending(app, make_inn("600000005"))
+        with app.app_context():
+            models.db.session.get(models.Partner, partner_id).registration_stage = STAGE_VERIFIED
+            models.db.session.commit()
+        verifier = StubVerifier('ok')
+
+        with app.app_context():
+            assert make_pipeline(app, verifier).verify(partner_id) == OUTCOME_SKIPPED
+        assert verifier.calls == []
+
+    def test_resume_pending(self, app):
+        """После рестарта подбираются только давно не обновлявшиеся проверки"""
+        stale = add_pending(app, make_inn("600000006"),
+                            updated_at=datetime.utcnow() - timedelta(minutes=30))
+        fresh = add_pending(app, make_inn("600000007"))
+        pipeline = make_pipeline(app, StubVerifier('ok'))
+
+        with app.app_context():
+            assert pipeline.resume_pending(older_than=300) == 1
+        pipeline.shutdown()
+
+        assert load(app, stale).registration_stage == STAGE_VERIFIED
+        assert load(app, fresh).registration_stage == STAGE_PENDING
+
+    def test_resume_claimed_once(self, app):
+        """Зависшую регистрацию подбирает один процесс, повторы отложенной не подбираются"""
+        stale = add_pending(app, make_inn("600000008"),
+                            updated_at=datetime.utcnow() - timedelta(minutes=30))
+        verifier = StubVerifier('ok')
+        first, second = make_pipeline(app, verifier), make_pipeline(app, verifier)
+
+        with app.app_context():
+            assert first.resume_pending(older_than=300) == 1
+            assert second.resume_pending(older_than=300) == 0
+        first.shutdown()
+
+        assert verifier.calls == [load(app, stale).inn]
+        assert make_pipeline(app, verifier, retries=3, retry_delay=60).max_retry_delay == 240
+
+    def test_resume_once_per_process(self, app, monkeypatch):
+        """resume_pending_once срабатывает один раз в каждом процессе"""
+        pipeline = make_pipeline(app, StubVerifier('ok'))
+        calls = []
+        monkeypatch.setattr(pipeline, 'resume_pending', lambda: calls.append(os.getpid()) or 0)
+
+        pipeline.resume_pending_once()
+        pipeline.resume_pending_once()
+        assert len(calls) == 1
+
+        # Дочерний процесс после fork
+        pipeline._resumed_pid = -1
+        pipeline.resume_pending_once()
+        assert len(calls) == 2
@@ -0,0 +1,260 @@
+"""
+Тесты фоновой перепроверки партнёров
+"""
+
+import importlib.util
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+os.environ.setdefault('FNS_API_KEY', 'test-key')
+os.environ.setdefault('REDIS_URL', 'redis://localhost:1')
+
+from flask import Flask
+
+from backend.services.fns_service import FNSService
+from backend.services.fns_transport import RetryPolicy
+from backend.services.reverification_scheduler import (
+    LOCK_KEY, LOCK_TTL_MARGIN, STOP_DONE, STOP_LOCKED, STOP_QUOTA, STOP_UNAVAILABLE, VERIFICATION_COMPANY_INACTIVE,
+    VERIFICATION_NOT_FOUND, ReverificationScheduler
+)
+from tests.fns_helpers import FakeResponse, FakeSession, make_inn
+
+# Пакет backend/models перекрывает модуль backend/models.py, модели берутся по пути
+_spec = importlib.util.spec_from_file_location(
+    'backend_models_db', os.path.join(os.path.dirname(__file__), '..', 'backend', 'models.py')
+)
+models = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(models)
+
+NOW = datetime(2026, 3, 1, 12, 0)
+
+
+class RegistrySession(FakeSession):
+    """API ФНС со статусами компаний по ИНН"""
+
+    def __init__(self, statuses):
+        super().__init__()
+        self.statuses = statuses
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(params['req'])
+        status = self.statuses.get(params['req'], 'Действующее')
+        if status is None:
+            return FakeResponse({})
+        if isinstance(status, int):
+            return FakeResponse({}, status_code=status)
+        return FakeResponse({"НаимЮЛ": f"ООО {params['req']}", "Статус": status})
+
+
+@pytest.fixture
+def db():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    models.db.init_app(app)
+    with app.app_context():
+        models.db.create_all()
+        yield models.db
+        models.db.session.remove()
+        models.db.drop_all()
+
+
+@pytest.fixture
+def service():
+    fns = FNSService()
+    fns.redis_client = None
+    fns._init_cache()
+    fns.session = RegistrySession({})
+    fns.retry_policy = RetryPolicy(max_attempts=1)
+    fns.daily_limit = 100
+    fns.quota.reserves = {}
+    return fns
+
+
+def add_partner(db, inn, checked_days_ago, **fields):
+    partner = models.Partner(
+        partner_code=f"P-{inn}",
+        company_name=f"ООО {inn}",
+        inn=inn,
+        created_at=NOW - timedelta(days=400),
+        verification_date=NOW - timedelta(days=checked_days_ago) if checked_days_ago is not None else None,
+        **fields
+    )
+    db.session.add(partner)
+    db.session.commit()
+    return partner
+
+
+def make_scheduler(db, service, **kwargs):
+    kwargs.setdefault('quota_reserve', 0)
+    return ReverificationScheduler(db.session, models.Partner, service=service,
+                                   log_model=models.VerificationLog, interval_days=30,
+                                   clock=lambda: NOW, **kwargs)
+
+
+class TestReverificationScheduler:
+    """Тесты планировщика перепроверки"""
+
+    def test_priority_order(self, db, service):
+        """Сначала активные и платящие, затем по давности проверки"""
+        recent = add_partner(db, make_inn("500000001"), 40)
+        oldest = add_partner(db, make_inn("500000002"), 90)
+        inactive = add_partner(db, make_inn("500000003"), 200, is_active=False)
+        paying = add_partner(db, make_inn("500000004"), 35, subscription_plan='pro',
+                             subscription_expires=NOW + timedelta(days=10))
+        never = add_partner(db, make_inn("500000005"), None)
+        add_partner(db, make_inn("500000006"), 5)
+
+        scheduler = make_scheduler(db, service)
+        due = scheduler.due_partners(10)
+
+        assert [p.id for p in due] == [paying.id, never.id, oldest.id, recent.id, inactive.id]
+        assert scheduler.backlog() == 5
+
+    def test_updates_partners(self, db, service):
+        """Ликвидированные отключаются, не найденные помечаются, данные обновляются"""
+        active = add_partner(db, make_inn("510000001"), 60)
+        liquidated = add_partner(db, make_inn("510000002"), 60, status='active')
+        missing = add_partner(db, make_inn("510000003"), 60)
+        service.session = RegistrySession({liquidated.inn: 'Ликвидировано', missing.inn: None})
+
+        run = make_scheduler(db, service).run_once()
+
+        assert run['outcomes'] == {'verified': 1, 'deactivated': 1, 'not_found': 1, 'error': 0}
+        assert active.verification_date == NOW
+        assert active.verification_data['is_active'] is True
+        assert liquidated.is_active is False
+        assert liquidated.status == 'suspended'
+        assert liquidated.verification_status == VERIFICATION_COMPANY_INACTIVE
+        assert missing.verification_status == VERIFICATION_NOT_FOUND
+        assert missing.is_active is True
+        assert models.VerificationLog.query.count() == 3
+
+    def test_failing_partner_not_repicked(self, db, service):
+        """Окончательная ошибка сдвигает дату проверки: следующий проход берёт других"""
+        failing = add_partner(db, make_inn("515000001"), 90)
+        other = add_partner(db, make_inn("515000002"), 60)
+        service.session = RegistrySession({failing.inn: 400})
+        scheduler = make_scheduler(db, service, batch_size=1)
+
+        run = scheduler.run_once()
+        assert run['outcomes']['error'] == 1
+        assert failing.verification_date == NOW
+        assert failing.verification_status != VERIFICATION_NOT_FOUND
+
+        scheduler.run_once()
+        assert service.session.calls == [failing.inn, other.inn]
+        assert other.verification_date == NOW
+        assert scheduler.backlog() == 0
+
+    def test_temporary_and_config_errors(self, db, service):
+        """Временная ошибка дату не сдвигает, отклонённый ключ API останавливает проход"""
+        flaky = add_partner(db, make_inn("516000001"), 90)
+        rejected = add_partner(db, make_inn("516000002"), 60)
+        add_partner(db, make_inn("516000003"), 45)
+        service.session = RegistrySession({flaky.inn: 503, rejected.inn: 403})
+
+        run = make_scheduler(db, service).run_once()
+
+        assert run['stop_reason'] == STOP_UNAVAILABLE
+        assert service.session.calls == [flaky.inn, rejected.inn]
+        assert flaky.verification_date == NOW - timedelta(days=90)
+        assert rejected.verification_date == NOW - timedelta(days=60)
+
+    def test_respects_quota_reserve(self, db, service):
+        """Лимит сверх резерва регистраций не расходуется"""
+        for i in range(5):
+            add_partner(db, make_inn(f"52000000{i}"), 60)
+        service.daily_limit = 10
+        for _ in range(7):
+            service.quota.try_acquire()
+
+        scheduler = make_scheduler(db, service, quota_reserve=1)
+        run = scheduler.run_once()
+
+        assert run['api_requests'] == 2
+        assert run['stop_reason'] == STOP_QUOTA
+        assert service.quota.remaining() == 1
+        assert scheduler.backlog() == 3
+
+    def test_fresh_cache_used_without_quota(self, db, service):
+        """Свежий результат из кэша не расходует лимит"""
+        partner = add_partner(db, make_inn("530000001"), 60)
+        service.check_inn(partner.inn)
+        service.session.calls.clear()
+
+        run = make_scheduler(db, service).run_once()
+
+        assert run['checked'] == 1
+        assert run['api_requests'] == 0
+        assert service.session.calls == []
+
+    def test_index_result_not_used(self, db, service, tmp_path):
+        """Запись индекса ЕГР в кэше не засчитывается как перепроверка"""
+        from backend.services.egr_index import EGRIndex, build_index
+        partner = add_partner(db, make_inn("535000001"), 60)
+        path = str(tmp_path / "egr.sqlite")
+        build_index(path, [(partner.inn, {"НаимЮЛ": "ООО Индекс", "Статус": "Действующее"})])
+        service.egr_index = EGRIndex(path)
+        assert service.check_inn(partner.inn)["data"]["source"] == "egr_index"
+
+        run = make_scheduler(db, service).run_once()
+
+        assert run['api_requests'] == 1
+        assert service.session.calls == [partner.inn]
+        assert partner.verification_data["source"] == "api_fns"
+
+    def test_stats(self, db, service):
+        """Метрики: очередь, возраст самой давней проверки, последний проход"""
+        add_partner(db, make_inn("540000001"), 60)
+        add_partner(db, make_inn("540000002"), 45)
+
+        scheduler = make_scheduler(db, service, batch_size=1)
+        assert scheduler.get_stats()['backlog'] == 2
+
+        scheduler.run_once()
+        stats = scheduler.get_stats()
+
+        assert stats['backlog'] == 1
+        assert stats['oldest_check_age_days'] == 45.0
+        assert stats['checked'] == 1
+        assert stats['last_run']['checked'] == 1
+
+    def test_lock_outlives_worst_case_pass(self, db, service):
+        """Блокировка по умолчанию живёт дольше прохода из самых долгих запросов"""
+        service.request_timeout = 15
+        service.rate_wait = 2
+        service.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=4)
+        scheduler = make_scheduler(db, service, batch_size=50)
+
+        assert scheduler.lock_ttl == 50 * (3 * 17 + 0.5 + 1) + LOCK_TTL_MARGIN
+        assert make_scheduler(db, service, lock_ttl=30).lock_ttl == 30
+
+    def test_single_pass_across_processes(self, db, service):
+        """Пока проход идёт в другом процессе, второй планировщик его пропускает"""
+        fakeredis = pytest.importorskip('fakeredis')
+        service.redis_client = fakeredis.FakeRedis(decode_responses=True)
+        add_partner(db, make_inn("550000001"), 60)
+        scheduler = make_scheduler(db, service)
+
+        service.redis_client.set(LOCK_KEY, 'other')
+        run = scheduler.run_once()
+
+        assert run['stop_reason'] == STOP_LOCKED
+        assert service.session.calls == []
+        assert scheduler.get_stats()['skipped_locked'] == 1
+        assert scheduler.get_stats()['running'] is True
+
+        service.redis_client.delete(LOCK_KEY)
+        assert scheduler.run_once()['stop_reason'] == STOP_DONE
+        assert not service.redis_client.exists(LOCK_KEY)
+
+        # Метрики веб-приложения видят проход, выполненный другим экземпляром
+        stats = make_scheduler(db, service).get_stats()
+        assert stats['running'] is False
+        assert stats['last_run']['checked'] == 1
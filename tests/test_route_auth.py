@@ -0,0 +1,47 @@
+"""
+Тесты доступа к служебным маршрутам по токену
+"""
+
+import os
+import sys
+
+import pytest
+
+# Добавляем корневую директорию в Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask, jsonify
+
+from backend.routes.auth import TOKEN_HEADER, token_required
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+
+    @app.route('/import', methods=['POST'])
+    @token_required('TEST_IMPORT_TOKEN')
+    def import_partners():
+        return jsonify({'success': True})
+
+    return app.test_client()
+
+
+class TestTokenRequired:
+    """Тесты токена в заголовке"""
+
+    def test_valid_token(self, client, monkeypatch):
+        monkeypatch.setenv('TEST_IMPORT_TOKEN', 'secret')
+        response = client.post('/import', headers={TOKEN_HEADER: 'secret'})
+        assert response.status_code == 200
+
+    def test_wrong_or_missing_token(self, client, monkeypatch):
+        """Неверный токен и запрос без заголовка - 401"""
+        monkeypatch.setenv('TEST_IMPORT_TOKEN', 'secret')
+        assert client.post('/import', headers={TOKEN_HEADER: 'other'}).status_code == 401
+        assert client.post('/import').status_code == 401
+
+    def test_closed_without_configured_token(self, client, monkeypatch):
+        """Без настроенного токена маршрут закрыт даже для запроса без заголовка"""
+        monkeypatch.delenv('TEST_IMPORT_TOKEN', raising=False)
+        assert client.post('/import').status_code == 503